@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+🩺 Estado de la conexión a la base de datos
+===================================================
+Guarda el resultado de la última comprobación de conexión y lo reutiliza durante un
+intervalo configurable. Cuando caduca, la siguiente consulta del estado lanza una
+nueva comprobación en segundo plano y devuelve la última conocida, de modo que el
+render del dashboard no espera a la base de datos en cada rerun.
+"""
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class EstadoConexion:
+    """Resultado de la última comprobación."""
+    disponible: Optional[bool]  # None: todavía sin comprobar
+    comprobado: float = 0.0  # time.time() de la comprobación
+    error: Optional[str] = None
+
+    @property
+    def antiguedad(self) -> float:
+        """Segundos desde la última comprobación."""
+        return time.time() - self.comprobado if self.comprobado else float('inf')
+
+
+class ConnectionHealth:
+    """Comprobación de conexión cacheada y refrescada en segundo plano.
+
+    Un resultado correcto se reutiliza durante `intervalo` segundos y uno fallido
+    durante `intervalo_fallo`, para detectar antes la recuperación. Solo hay una
+    comprobación en curso a la vez.
+    """
+
+    def __init__(self, probe: Callable[[], bool], intervalo: float = 30, intervalo_fallo: float = 5):
+        self._probe = probe
+        self.intervalo = intervalo
+        self.intervalo_fallo = intervalo_fallo
+        self._estado = EstadoConexion(disponible=None)
+        self._lock = threading.Lock()
+        self._comprobando: Optional[threading.Thread] = None
+
+    def estado(self) -> EstadoConexion:
+        """Último estado conocido; si ha caducado lanza una comprobación en segundo plano.
+
+        Solo bloquea la primera vez, cuando todavía no hay ningún resultado.
+        """
+        estado = self._estado
+        if estado.disponible is None:
+            return self.comprobar()
+
+        caducidad = self.intervalo if estado.disponible else self.intervalo_fallo
+        if estado.antiguedad > caducidad:
+            self._comprobar_en_segundo_plano()
+        return estado
+
+    def comprobar(self) -> EstadoConexion:
+        """Comprueba la conexión ahora y guarda el resultado."""
+        try:
+            disponible = bool(self._probe())
+            error = None if disponible else "La comprobación de conexión ha fallado"
+        except Exception as e:
+            disponible, error = False, str(e)
+
+        if not disponible:
+            logger.warning("Base de datos no disponible: %s", error)
+
+        self._estado = EstadoConexion(disponible=disponible, comprobado=time.time(), error=error)
+        return self._estado
+
+    def invalidar(self) -> None:
+        """Descarta el estado para que la siguiente consulta compruebe de nuevo."""
+        self._estado = EstadoConexion(disponible=None)
+
+    def _comprobar_en_segundo_plano(self) -> None:
+        with self._lock:
+            if self._comprobando is not None and self._comprobando.is_alive():
+                return
+            self._comprobando = threading.Thread(
+                target=self.comprobar, name='connection-health', daemon=True
+            )
+            self._comprobando.start()
+
+
+def get_connection_health(probe: Callable[[], bool]) -> ConnectionHealth:
+    """Crea el comprobador con DASHBOARD_HEALTHCHECK_TTL / DASHBOARD_HEALTHCHECK_TTL_FALLO (segundos)."""
+    return ConnectionHealth(
+        probe,
+        intervalo=float(os.getenv('DASHBOARD_HEALTHCHECK_TTL', '30')),
+        intervalo_fallo=float(os.getenv('DASHBOARD_HEALTHCHECK_TTL_FALLO', '5'))
+    )
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+🔌 Conexión MySQL del dashboard
+===================================================
+Pool de conexiones acotado y seguro entre hilos para el dashboard de Streamlit.
+Usa la misma configuración que src/lib/database.ts (DB_HOST, DB_PORT, DB_USER,
+DB_PASSWORD, MYSQL_DATABASE) y el mismo límite de conexiones por defecto.
+
+Las conexiones se validan con ping al salir del pool, se reciclan pasado
+DB_POOL_RECYCLE segundos y cada sesión limita la duración de sus SELECT con
+MAX_EXECUTION_TIME. estadisticas_pool() expone la saturación del pool.
+
+Con pyarrow instalado, execute_query_arrow devuelve el resultado como tabla Arrow
+(columna a columna, sin pasar por columnas object de pandas).
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import pymysql
+from dotenv import load_dotenv
+
+try:
+    import pyarrow as pa
+except ImportError:  # sin pyarrow solo está disponible el camino pandas
+    pa = None
+
+ARROW_DISPONIBLE = pa is not None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Límite de duración por defecto de cada SELECT (MAX_EXECUTION_TIME, en milisegundos)
+STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '30000'))
+
+# Mayor límite que puede pedir una llamada con timeout_ms; el timeout de socket de las
+# conexiones se calcula a partir de este valor para no cortar antes que MySQL
+MAX_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_MAX_STATEMENT_TIMEOUT_MS', str(max(STATEMENT_TIMEOUT_MS, 300000))))
+
+
+class PoolTimeout(Exception):
+    """No se liberó ninguna conexión del pool dentro del tiempo de espera."""
+
+
+def _crear_conexion():
+    return pymysql.connect(
+        host=os.getenv('DB_HOST'),
+        port=int(os.getenv('DB_PORT', '3306')),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        database=os.getenv('MYSQL_DATABASE'),
+        charset='utf8mb4',
+        # Sin autocommit cada conexión del pool vería siempre la misma instantánea (REPEATABLE READ)
+        autocommit=True,
+        connect_timeout=int(os.getenv('DB_CONNECT_TIMEOUT', '10')),
+        # Red de seguridad a nivel de socket, por encima del mayor límite de MySQL permitido
+        read_timeout=MAX_STATEMENT_TIMEOUT_MS / 1000 + 30 if STATEMENT_TIMEOUT_MS and MAX_STATEMENT_TIMEOUT_MS else None,
+        init_command=f"SET SESSION MAX_EXECUTION_TIME = {STATEMENT_TIMEOUT_MS}"
+    )
+
+
+class ConnectionPool:
+    """Pool de conexiones acotado, seguro entre hilos.
+
+    Como mucho `size` conexiones abiertas; si están todas en uso, quien pide una
+    espera hasta `timeout` segundos y después recibe PoolTimeout. Las conexiones
+    libres se reutilizan en orden LIFO para que las menos usadas caduquen.
+    """
+
+    def __init__(self, factory=_crear_conexion, size: int = 10, timeout: float = 30,
+                 recycle: float = 3600, pre_ping: bool = True):
+        self._factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._libres: List[Tuple[Any, float]] = []  # (conexión, creada)
+        self._abiertas = 0
+        self._en_uso = 0
+        self._cond = threading.Condition()
+        self._estadisticas = {
+            'creadas': 0,
+            'recicladas': 0,
+            'ping_fallidos': 0,
+            'descartadas': 0,
+            'esperas': 0,
+            'espera_total_s': 0.0,
+            'timeouts': 0,
+            'max_en_uso': 0,
+        }
+
+    @contextmanager
+    def connection(self):
+        """Presta una conexión validada y la devuelve al pool al salir.
+
+        Si el bloque falla por un error de conexión, la conexión se descarta.
+        """
+        with self.connections(1) as (conexion,):
+            yield conexion
+
+    @contextmanager
+    def connections(self, n: int):
+        """Presta n conexiones reservadas de una sola vez y las devuelve al salir.
+
+        Quien necesita varias a la vez (p. ej. dos cursores de servidor leídos en
+        paralelo) no retiene ninguna mientras espera el resto, así que varias
+        sesiones no pueden bloquearse entre sí con el pool lleno.
+        """
+        prestadas = self._checkout(n)
+        descartar = False
+        try:
+            yield [conexion for conexion, _ in prestadas]
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            descartar = True
+            raise
+        finally:
+            for conexion, creada in prestadas:
+                self._release(conexion, creada, descartar)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Ocupación actual y contadores acumulados del pool."""
+        with self._cond:
+            return {
+                'tamano': self.size,
+                'abiertas': self._abiertas,
+                'en_uso': self._en_uso,
+                'libres': len(self._libres),
+                'saturacion': self._en_uso / self.size if self.size else 0.0,
+                **self._estadisticas
+            }
+
+    def close(self) -> None:
+        """Cierra las conexiones libres (las prestadas se cierran al devolverse)."""
+        with self._cond:
+            libres, self._libres = self._libres, []
+            self._abiertas -= len(libres)
+            self.size = 0
+        for conexion, _ in libres:
+            self._cerrar(conexion)
+
+    def _checkout(self, n: int = 1) -> List[Tuple[Any, float]]:
+        """Reserva n conexiones a la vez: espera hasta que haya n disponibles, no una a una."""
+        if n > self.size:
+            raise ValueError(f"Se piden {n} conexiones simultáneas y el pool tiene {self.size}")
+        inicio = time.monotonic()
+        with self._cond:
+            esperado = False
+            while len(self._libres) + self.size - self._abiertas < n:
+                restante = self.timeout - (time.monotonic() - inicio)
+                if restante <= 0:
+                    self._estadisticas['timeouts'] += 1
+                    raise PoolTimeout(
+                        f"Pool de conexiones saturado: {self.size} conexiones en uso durante {self.timeout:g}s"
+                    )
+                esperado = True
+                self._cond.wait(restante)
+
+            reservadas = []
+            for _ in range(n):
+                if self._libres:
+                    reservadas.append(self._libres.pop())
+                else:
+                    # Reservar el hueco; la conexión se abre fuera del bloqueo
+                    self._abiertas += 1
+                    reservadas.append((None, 0.0))
+
+            self._en_uso += n
+            self._estadisticas['max_en_uso'] = max(self._estadisticas['max_en_uso'], self._en_uso)
+            if esperado:
+                self._estadisticas['esperas'] += 1
+                self._estadisticas['espera_total_s'] += time.monotonic() - inicio
+
+        prestadas = []
+        try:
+            for conexion, creada in reservadas:
+                prestadas.append(self._validar(conexion, creada))
+            return prestadas
+        except Exception:
+            # La que falló ya está cerrada (o no llegó a abrirse): se libera su hueco.
+            # Las validadas y las libres aún sin validar vuelven al pool.
+            sin_validar = reservadas[len(prestadas) + 1:]
+            for conexion, creada in prestadas + [r for r in sin_validar if r[0] is not None]:
+                self._release(conexion, creada, False)
+            huecos = 1 + sum(1 for conexion, _ in sin_validar if conexion is None)
+            with self._cond:
+                self._abiertas -= huecos
+                self._en_uso -= huecos
+                self._cond.notify_all()
+            raise
+
+    def _validar(self, conexion, creada: float) -> Tuple[Any, float]:
+        """Devuelve una conexión utilizable: nueva, reciclada o comprobada con ping."""
+        if conexion is not None and self.recycle and time.monotonic() - creada > self.recycle:
+            self._cerrar(conexion)
+            self._contar('recicladas')
+            conexion = None
+        elif conexion is not None and self.pre_ping:
+            try:
+                conexion.ping(reconnect=False)
+            except Exception:
+                self._cerrar(conexion)
+                self._contar('ping_fallidos')
+                conexion = None
+
+        if conexion is None:
+            conexion = self._factory()
+            creada = time.monotonic()
+            self._contar('creadas')
+        return conexion, creada
+
+    def _release(self, conexion, creada: float, descartar: bool) -> None:
+        with self._cond:
+            self._en_uso -= 1
+            # Una conexión cerrada durante el préstamo (ver _cursor) no vuelve al pool
+            if descartar or self._abiertas > self.size or not getattr(conexion, 'open', True):
+                self._abiertas -= 1
+                self._estadisticas['descartadas'] += 1
+            else:
+                self._libres.append((conexion, creada))
+                conexion = None
+            # Puede haber esperando peticiones de varias conexiones: despertar a todas
+            self._cond.notify_all()
+        if conexion is not None:
+            self._cerrar(conexion)
+
+    def _contar(self, contador: str) -> None:
+        with self._cond:
+            self._estadisticas[contador] += 1
+
+    @staticmethod
+    def _cerrar(conexion) -> None:
+        try:
+            conexion.close()
+        except Exception:
+            pass
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Pool del proceso, creado al primer uso (DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_RECYCLE)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                size=int(os.getenv('DB_POOL_SIZE', '10')),
+                timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+                recycle=float(os.getenv('DB_POOL_RECYCLE', '3600'))
+            )
+        return _pool
+
+
+def estadisticas_pool() -> Dict[str, Any]:
+    """Saturación y contadores del pool del proceso."""
+    return get_pool().estadisticas()
+
+
+def limitar_timeout(timeout_ms: int) -> int:
+    """Acota un MAX_EXECUTION_TIME pedido a MAX_STATEMENT_TIMEOUT_MS (0 es "sin límite")."""
+    if not MAX_STATEMENT_TIMEOUT_MS:
+        return int(timeout_ms)
+    if timeout_ms <= 0:
+        return MAX_STATEMENT_TIMEOUT_MS
+    return min(int(timeout_ms), MAX_STATEMENT_TIMEOUT_MS)
+
+
+@contextmanager
+def _cursor(timeout_ms: Optional[int] = None, cursor_class=None):
+    """Cursor sobre una conexión del pool, con MAX_EXECUTION_TIME propio si se indica."""
+    with get_pool().connection() as conexion:
+        with _cursor_de(conexion, timeout_ms, cursor_class) as cursor:
+            yield cursor
+
+
+@contextmanager
+def _cursor_de(conexion, timeout_ms: Optional[int] = None, cursor_class=None):
+    """Cursor sobre una conexión ya prestada, con MAX_EXECUTION_TIME propio si se indica.
+
+    El límite pedido se acota con limitar_timeout para que el timeout de socket de la
+    conexión no corte la query antes que MySQL.
+    """
+    with conexion.cursor(cursor_class) as cursor:
+        if timeout_ms is None:
+            yield cursor
+            return
+        cursor.execute("SET SESSION MAX_EXECUTION_TIME = %s", (limitar_timeout(timeout_ms),))
+        try:
+            yield cursor
+        finally:
+            try:
+                cursor.execute("SET SESSION MAX_EXECUTION_TIME = %s", (STATEMENT_TIMEOUT_MS,))
+            except Exception as e:
+                # No ocultar el error de la query: se registra y la conexión, con un
+                # límite de sesión desconocido, se cierra para que el pool la descarte
+                logger.warning("No se pudo restaurar MAX_EXECUTION_TIME; se descarta la conexión: %s", e)
+                ConnectionPool._cerrar(conexion)
+
+
+def execute_query(query: str, params: Optional[Dict] = None, timeout_ms: Optional[int] = None) -> pd.DataFrame:
+    """Ejecuta una query con parámetros %(nombre)s y devuelve el resultado como DataFrame."""
+    with _cursor(timeout_ms) as cursor:
+        cursor.execute(query, params or None)
+        filas = cursor.fetchall()
+        columnas = [columna[0] for columna in cursor.description or []]
+    return pd.DataFrame.from_records(list(filas), columns=columnas)
+
+
+def tabla_arrow(columnas: Sequence[str], filas: Sequence[Tuple], diccionario: Iterable[str] = ()) -> 'pa.Table':
+    """Construye una tabla Arrow columna a columna a partir de las filas del cursor.
+    
+    Los DECIMAL sin decimales (SUM/COUNT de MySQL) pasan a int64 y las columnas de
+    `diccionario` se codifican como diccionario, que to_pandas convierte en category.
+    """
+    diccionario = set(diccionario)
+    valores_por_columna = list(zip(*filas)) if filas else [()] * len(columnas)
+    arrays = []
+    for columna, valores in zip(columnas, valores_por_columna):
+        array = pa.array(valores, type=None if valores else pa.null())
+        if pa.types.is_decimal(array.type) and array.type.scale == 0 and array.type.precision <= 18:
+            array = array.cast(pa.int64())
+        if columna in diccionario and (pa.types.is_string(array.type) or pa.types.is_null(array.type)):
+            array = array.cast(pa.string()).dictionary_encode()
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, names=list(columnas))
+
+
+def execute_query_arrow(query: str, params: Optional[Dict] = None, timeout_ms: Optional[int] = None,
+                        diccionario: Iterable[str] = ()) -> 'pa.Table':
+    """Ejecuta una query y devuelve el resultado como tabla Arrow (requiere pyarrow).
+    
+    PyMySQL entrega filas, así que las tuplas se transponen una vez a columnas y cada
+    columna se convierte en un array Arrow tipado (ver tabla_arrow).
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow no está instalado")
+    with _cursor(timeout_ms) as cursor:
+        cursor.execute(query, params or None)
+        filas = cursor.fetchall()
+        columnas = [columna[0] for columna in cursor.description or []]
+    return tabla_arrow(columnas, filas, diccionario)
+
+
+def execute_query_list(query: str, params: Optional[Dict] = None, timeout_ms: Optional[int] = None) -> List:
+    """Ejecuta una query y devuelve los valores de su primera columna."""
+    with _cursor(timeout_ms) as cursor:
+        cursor.execute(query, params or None)
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+@contextmanager
+def iterar_queries(consultas: Sequence[Tuple[str, Optional[Dict]]], tamano_lote: int = 50000,
+                   timeout_ms: Optional[int] = None) -> Iterator[List[Iterator[pd.DataFrame]]]:
+    """Ejecuta varias queries a la vez, una conexión por query, y devuelve sus resultados por lotes.
+
+    Cada query usa un cursor de servidor (SSCursor): las filas se leen del socket a
+    medida que se consumen, así que en memoria solo hay un lote de `tamano_lote` filas
+    por query. Las conexiones se reservan de una sola vez (ConnectionPool.connections)
+    en lugar de pedir la segunda mientras se retiene la primera, y se devuelven al
+    salir del bloque aunque algún iterador no se haya agotado.
+    """
+    with get_pool().connections(len(consultas)) as conexiones, ExitStack() as pila:
+        yield [
+            _lotes(pila.enter_context(_cursor_de(conexion, timeout_ms, pymysql.cursors.SSCursor)),
+                   query, params, tamano_lote)
+            for conexion, (query, params) in zip(conexiones, consultas)
+        ]
+
+
+def _lotes(cursor, query: str, params: Optional[Dict], tamano_lote: int) -> Iterator[pd.DataFrame]:
+    cursor.execute(query, params or None)
+    columnas = [columna[0] for columna in cursor.description or []]
+    while True:
+        filas = cursor.fetchmany(tamano_lote)
+        if not filas:
+            break
+        yield pd.DataFrame.from_records(list(filas), columns=columnas)
+
+
+def test_connection() -> bool:
+    """Comprueba que la base de datos responde (SELECT 1)."""
+    try:
+        return execute_query_list("SELECT 1 as test") == [1]
+    except Exception as e:
+        logger.error("Error al conectar con la base de datos: %s", e)
+        return False
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+📈 Caché de figuras Plotly
+===================================================
+Reutiliza las figuras del dashboard entre reruns mientras no cambien sus datos ni sus
+parámetros. La clave combina el nombre del constructor, una huella del contenido de
+los DataFrames de entrada y los parámetros del gráfico; las figuras se guardan en
+memoria con un número máximo de entradas y de bytes y expulsión LRU.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Tuple
+
+import pandas as pd
+
+
+def huella_dataframe(df: pd.DataFrame) -> str:
+    """Huella del contenido de un DataFrame: columnas, tipos y valores de cada fila."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr([(str(columna), str(tipo)) for columna, tipo in df.dtypes.items()]).encode('utf-8'))
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def huella(valor) -> Hashable:
+    """Convierte un argumento de un constructor de figuras en algo comparable y barato."""
+    if isinstance(valor, pd.DataFrame):
+        return ('DataFrame', huella_dataframe(valor))
+    if isinstance(valor, pd.Series):
+        return ('Series', huella_dataframe(valor.to_frame()))
+    if isinstance(valor, dict):
+        return tuple(sorted((str(k), huella(v)) for k, v in valor.items()))
+    if isinstance(valor, (list, tuple)):
+        return tuple(huella(v) for v in valor)
+    return repr(valor)
+
+
+def tamano_figura(figura) -> int:
+    """Tamaño aproximado de una figura: longitud de su JSON (lo que se envía al navegador)."""
+    to_json = getattr(figura, 'to_json', None)
+    return len(to_json()) if to_json is not None else 0
+
+
+class FigureCache:
+    """Figuras por clave en memoria, seguras entre hilos, con expulsión LRU.
+
+    Se expulsan las menos usadas al superar `max_entradas` o `max_bytes` (tamaño del
+    JSON de cada figura, dominado por los puntos de sus trazas).
+
+    Las figuras se comparten entre sesiones y reruns: quien las recibe solo debe
+    leerlas (st.plotly_chart no las modifica).
+    """
+
+    def __init__(self, max_entradas: int = 64, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        # clave -> (figura, bytes)
+        self._figuras: 'OrderedDict[Hashable, Tuple[object, int]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def figura(self, constructor: Callable, *args, **kwargs):
+        """Devuelve constructor(*args, **kwargs), construyéndola solo si no está guardada."""
+        clave = (constructor.__module__, constructor.__qualname__, huella(args), huella(kwargs))
+        with self._lock:
+            if clave in self._figuras:
+                self._figuras.move_to_end(clave)
+                self.aciertos += 1
+                return self._figuras[clave][0]
+            self.fallos += 1
+
+        figura = constructor(*args, **kwargs)
+        tamano = tamano_figura(figura)
+
+        with self._lock:
+            self._quitar(clave)
+            self._figuras[clave] = (figura, tamano)
+            self._bytes += tamano
+            while self._figuras and (len(self._figuras) > self.max_entradas or self._bytes > self.max_bytes):
+                self._quitar(next(iter(self._figuras)))
+        return figura
+
+    def clear(self) -> None:
+        with self._lock:
+            self._figuras.clear()
+            self._bytes = 0
+
+    def _quitar(self, clave: Hashable) -> None:
+        guardada = self._figuras.pop(clave, None)
+        if guardada is not None:
+            self._bytes -= guardada[1]
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+📆 Caché de ventanas de fechas por días
+===================================================
+Guarda los resultados del dashboard partidos por día, bajo una clave con los filtros.
+Cada día guarda además su propia versión (MAX(updated_at) de ese día), así que los
+datos nuevos de hoy solo invalidan el día de hoy. Para un rango pedido calcula qué
+días faltan o han cambiado, de modo que solo esos se consultan y el resto se arma con
+las particiones ya guardadas: mover fecha_fin un día o abrir "los últimos 30 días"
+al día siguiente reutiliza casi todo.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+
+def dias_del_rango(fecha_inicio: date, fecha_fin: date) -> Iterator[date]:
+    """Días de fecha_inicio a fecha_fin, ambos incluidos."""
+    for desplazamiento in range((fecha_fin - fecha_inicio).days + 1):
+        yield fecha_inicio + timedelta(days=desplazamiento)
+
+
+def tramos_consecutivos(dias: List[date]) -> List[Tuple[date, date]]:
+    """Agrupa días ordenados en tramos (inicio, fin) sin huecos, para consultarlos de una vez."""
+    tramos = []
+    for dia in dias:
+        if tramos and dia == tramos[-1][1] + timedelta(days=1):
+            tramos[-1] = (tramos[-1][0], dia)
+        else:
+            tramos.append((dia, dia))
+    return tramos
+
+
+class DayPartitionCache:
+    """Particiones diarias en memoria, seguras entre hilos, con TTL y expulsión LRU.
+
+    Cada partición es el DataFrame de un día (columna fecha) para una clave, con la
+    versión de ese día; los días sin datos se guardan vacíos para no volver a
+    consultarlos. Se expulsan las menos usadas cuando se superan `max_particiones`
+    días o `max_bytes` (memoria de los DataFrames sin contar los objetos Python de
+    columnas object: las particiones del dashboard son categorías y enteros).
+    """
+
+    def __init__(self, ttl: float = 3600, max_particiones: int = 20000, max_bytes: int = 256 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_particiones = max_particiones
+        self.max_bytes = max_bytes
+        # (clave, día) -> (instante, versión, df, bytes)
+        self._particiones: 'OrderedDict[Tuple[Hashable, date], Tuple[float, Optional[str], pd.DataFrame, int]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def dias_pendientes(self, clave: Hashable, fecha_inicio: date, fecha_fin: date,
+                        versiones: Optional[Dict[date, str]] = None) -> List[date]:
+        """Días del rango que no están guardados, han caducado o cambiaron de versión.
+
+        `versiones` da la versión actual de cada día (sin entrada: día sin datos); si
+        es None solo se comprueban presencia y TTL.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            return [
+                dia for dia in dias_del_rango(fecha_inicio, fecha_fin)
+                if not self._vigente((clave, dia), ahora)
+                or (versiones is not None and self._particiones[(clave, dia)][1] != versiones.get(dia))
+            ]
+
+    def guardar(self, clave: Hashable, fecha_inicio: date, fecha_fin: date, df: pd.DataFrame,
+                versiones: Optional[Dict[date, str]] = None) -> None:
+        """Parte df por su columna fecha y guarda un día por partición, incluidos los vacíos."""
+        grupos = {}
+        if not df.empty:
+            # Un solo recorrido del DataFrame para todos los días
+            dias = pd.to_datetime(df['fecha']).dt.normalize()
+            grupos = {marca.date(): grupo for marca, grupo in df.groupby(dias, sort=False)}
+        vacio = df.iloc[0:0]
+        versiones = versiones or {}
+
+        ahora = time.monotonic()
+        with self._lock:
+            for dia in dias_del_rango(fecha_inicio, fecha_fin):
+                parte = grupos.get(dia, vacio)
+                tamano = int(parte.memory_usage(index=True).sum())
+                self._quitar((clave, dia))
+                self._particiones[(clave, dia)] = (ahora, versiones.get(dia), parte, tamano)
+                self._bytes += tamano
+            while self._particiones and (
+                len(self._particiones) > self.max_particiones or self._bytes > self.max_bytes
+            ):
+                self._quitar(next(iter(self._particiones)))
+
+    def leer(self, clave: Hashable, fecha_inicio: date, fecha_fin: date) -> Optional[pd.DataFrame]:
+        """Une las particiones del rango, o None si falta alguno de sus días.
+
+        Un día puede faltar aunque se acabe de guardar si la expulsión lo ha sacado
+        (rango mayor que el presupuesto, o escrituras de otras sesiones).
+        """
+        ahora = time.monotonic()
+        partes = []
+        with self._lock:
+            for dia in dias_del_rango(fecha_inicio, fecha_fin):
+                if not self._vigente((clave, dia), ahora):
+                    return None
+                self._particiones.move_to_end((clave, dia))
+                partes.append(self._particiones[(clave, dia)][2])
+
+        con_filas = [parte for parte in partes if not parte.empty]
+        if not con_filas:
+            return partes[0] if partes else pd.DataFrame()
+        return pd.concat(con_filas, ignore_index=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._particiones.clear()
+            self._bytes = 0
+
+    def _quitar(self, entrada: Tuple[Hashable, date]) -> None:
+        guardada = self._particiones.pop(entrada, None)
+        if guardada is not None:
+            self._bytes -= guardada[3]
+
+    def _vigente(self, entrada: Tuple[Hashable, date], ahora: float) -> bool:
+        guardada = self._particiones.get(entrada)
+        if guardada is None:
+            return False
+        if ahora - guardada[0] > self.ttl:
+            self._quitar(entrada)
+            return False
+        return True
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+💾 Caché de resultados compartida
+===================================================
+Backends intercambiables para guardar los resultados de las consultas del dashboard
+fuera del proceso de Streamlit. El backend en disco escribe un fichero Arrow IPC por
+resultado en un directorio local, de modo que todas las réplicas de un mismo host
+y los reinicios reutilizan lo ya consultado.
+"""
+
+import hashlib
+from abc import ABC, abstractmethod
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # sin pyarrow la caché en disco queda desactivada
+    pa = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(*partes) -> str:
+    """Genera una clave estable a partir de la consulta y sus filtros normalizados."""
+    def normalizar(valor):
+        if isinstance(valor, (date, datetime)):
+            return valor.isoformat()
+        if isinstance(valor, str):
+            # Ignorar diferencias de indentación/espacios en el texto SQL
+            return " ".join(valor.split())
+        if isinstance(valor, dict):
+            return {str(k): normalizar(v) for k, v in sorted(valor.items())}
+        if isinstance(valor, (list, tuple)):
+            return [normalizar(v) for v in valor]
+        return valor
+
+    serializado = json.dumps([normalizar(p) for p in partes], sort_keys=True, default=str)
+    return hashlib.sha256(serializado.encode('utf-8')).hexdigest()
+
+
+class ResultCache(ABC):
+    """Interfaz de los backends: guardan y devuelven DataFrames por clave."""
+
+    def __init__(self):
+        self._en_curso: Dict[str, Future] = {}
+        self._en_curso_lock = threading.Lock()
+
+    def get_or_load(self, key: str, loader: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """Devuelve la entrada o la carga con loader.
+
+        Los fallos simultáneos sobre la misma clave se agrupan: solo el primero
+        ejecuta loader y el resto espera su resultado (o su excepción).
+        """
+        df = self.get(key)
+        if df is not None:
+            return df
+
+        with self._en_curso_lock:
+            futuro = self._en_curso.get(key)
+            propietario = futuro is None
+            if propietario:
+                futuro = self._en_curso[key] = Future()
+
+        if not propietario:
+            return futuro.result()
+
+        try:
+            with self._exclusivo(key):
+                # Otro proceso puede haberla guardado mientras esperábamos el bloqueo
+                df = self.get(key)
+                if df is None:
+                    df = loader()
+                    self.set(key, df)
+            futuro.set_result(df)
+            return df
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        finally:
+            with self._en_curso_lock:
+                self._en_curso.pop(key, None)
+
+    def _exclusivo(self, key: str):
+        """Bloqueo entre procesos para una clave; por defecto no hay."""
+        return nullcontext()
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Devuelve la entrada vigente de la clave o None."""
+
+    @abstractmethod
+    def set(self, key: str, df: pd.DataFrame) -> None:
+        """Guarda df bajo la clave."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Borra todas las entradas."""
+
+
+class NullCache(ResultCache):
+    """Backend vacío: no guarda nada, pero sigue agrupando peticiones simultáneas."""
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        return None
+
+    def set(self, key: str, df: pd.DataFrame) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+
+class DiskCache(ResultCache):
+    """Caché en un directorio local compartido, con TTL y expulsión LRU por tamaño.
+
+    La fecha de modificación de cada fichero marca cuándo se escribió (TTL) y la de
+    acceso cuándo se leyó por última vez (LRU). Las escrituras son atómicas
+    (fichero temporal + os.replace), así que varios procesos pueden compartir el
+    directorio sin bloqueos.
+
+    Los ficheros son Arrow IPC: guardar y leer no codifica ni decodifica columnas
+    (a diferencia de Parquet), solo comprime los buffers si `compresion` lo indica, y
+    las columnas category se guardan como diccionarios y vuelven como category.
+    """
+
+    EXTENSION = '.arrow'
+
+    def __init__(self, directory, ttl: int = 300, max_bytes: int = 512 * 1024 * 1024,
+                 compresion: Optional[str] = 'lz4'):
+        super().__init__()
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.compresion = compresion
+        # Restos del formato anterior (Parquet), que ya no se leen ni se expulsan
+        for path in self.directory.glob("*.parquet"):
+            path.unlink(missing_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}{self.EXTENSION}"
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        path = self._path(key)
+        try:
+            stat = path.stat()
+            ahora = time.time()
+            if ahora - stat.st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                return None
+            with pa.OSFile(str(path), 'rb') as f:
+                tabla = pa.ipc.open_file(f).read_all()
+            # split_blocks evita consolidar las columnas en bloques (una copia menos)
+            df = tabla.to_pandas(split_blocks=True)
+            # Registrar el acceso para la expulsión LRU sin tocar la fecha de escritura
+            os.utime(path, (ahora, stat.st_mtime))
+            return df
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Entrada de caché ilegible %s: %s", path.name, e)
+            path.unlink(missing_ok=True)
+            return None
+
+    @contextmanager
+    def _exclusivo(self, key: str):
+        """flock sobre <clave>.lock para que solo un proceso del host ejecute la consulta."""
+        if fcntl is None:
+            yield
+            return
+        path = self.directory / f"{key}.lock"
+        while True:
+            f = open(path, 'a')
+            fcntl.flock(f, fcntl.LOCK_EX)
+            # Si mientras esperábamos se borró el fichero (ver _borrar_lock), el bloqueo
+            # obtenido es sobre un inodo huérfano: hay que volver a abrir la ruta
+            if self._mismo_inodo(f, path):
+                break
+            f.close()
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+            f.close()
+
+    @staticmethod
+    def _mismo_inodo(f, path: Path) -> bool:
+        try:
+            return os.fstat(f.fileno()).st_ino == os.stat(path).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _borrar_lock(self, path: Path) -> None:
+        """Borra un fichero .lock solo si nadie lo tiene ni lo espera en este momento.
+        
+        Se borra con el bloqueo tomado; quien lo estuviera esperando detecta en
+        _exclusivo que el inodo ya no es el de la ruta y abre el nuevo.
+        """
+        if fcntl is None:
+            path.unlink(missing_ok=True)
+            return
+        try:
+            f = open(path, 'a')
+        except FileNotFoundError:
+            return
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return  # en uso: se limpiará en otra expulsión
+            try:
+                if self._mismo_inodo(f, path):
+                    path.unlink(missing_ok=True)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def set(self, key: str, df: pd.DataFrame) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            tabla = pa.Table.from_pandas(df, preserve_index=False)
+            opciones = pa.ipc.IpcWriteOptions(compression=self.compresion)
+            with os.fdopen(fd, 'wb') as f, pa.ipc.new_file(f, tabla.schema, options=opciones) as writer:
+                writer.write_table(tabla)
+            os.replace(tmp, self._path(key))
+        except Exception as e:
+            logger.warning("No se pudo guardar la entrada de caché: %s", e)
+            Path(tmp).unlink(missing_ok=True)
+            return
+        self._evict()
+
+    def clear(self) -> None:
+        for path in self.directory.glob(f"*{self.EXTENSION}"):
+            path.unlink(missing_ok=True)
+        for path in self.directory.glob("*.lock"):
+            self._borrar_lock(path)
+
+    def _evict(self) -> None:
+        """Borra entradas caducadas y, si se supera max_bytes, las menos usadas."""
+        ahora = time.time()
+        entradas = []
+        total = 0
+        for path in self.directory.glob(f"*{self.EXTENSION}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if ahora - stat.st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                self._borrar_lock(path.with_suffix('.lock'))
+                continue
+            entradas.append((stat.st_atime, stat.st_size, path))
+            total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        # Dejar margen para no expulsar en cada escritura
+        objetivo = self.max_bytes * 0.9
+        for _, size, path in sorted(entradas, key=lambda e: e[0]):
+            if total <= objetivo:
+                break
+            path.unlink(missing_ok=True)
+            self._borrar_lock(path.with_suffix('.lock'))
+            total -= size
+
+
+# Únicos códecs que admite el formato IPC
+CODECS_IPC = frozenset({'lz4', 'zstd'})
+
+
+def _compresion_ipc(nombre: str) -> Optional[str]:
+    """Códec de los buffers IPC; sin compresión si es 'none', no es válido en IPC o pyarrow no lo incluye."""
+    nombre = nombre.lower()
+    if nombre in ('', 'none'):
+        return None
+    # pa.Codec admite también gzip, brotli o snappy, pero IpcWriteOptions los rechaza
+    if nombre not in CODECS_IPC:
+        logger.warning("Compresión '%s' no válida para Arrow IPC (%s): caché sin comprimir",
+                       nombre, ', '.join(sorted(CODECS_IPC)))
+        return None
+    if not pa.Codec.is_available(nombre):
+        logger.warning("Compresión '%s' no disponible en pyarrow: caché sin comprimir", nombre)
+        return None
+    return nombre
+
+
+def _disk_cache_from_env() -> ResultCache:
+    if pa is None:
+        logger.warning("pyarrow no está instalado: caché compartida en disco desactivada")
+        return NullCache()
+
+    directory = os.getenv('DASHBOARD_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'outbound_dashboard_cache'))
+    return DiskCache(
+        directory,
+        ttl=int(os.getenv('DASHBOARD_CACHE_TTL', '300')),
+        max_bytes=int(os.getenv('DASHBOARD_CACHE_MAX_MB', '512')) * 1024 * 1024,
+        # lz4 (por defecto), zstd o none
+        compresion=_compresion_ipc(os.getenv('DASHBOARD_CACHE_COMPRESION', 'lz4'))
+    )
+
+
+# Backends disponibles por nombre; se pueden registrar otros (p. ej. Redis) con register_backend
+BACKENDS: Dict[str, Callable[[], ResultCache]] = {
+    'disk': _disk_cache_from_env,
+    'none': NullCache,
+}
+
+
+def register_backend(nombre: str, factory: Callable[[], ResultCache]) -> None:
+    """Registra un backend adicional seleccionable con DASHBOARD_CACHE_BACKEND."""
+    BACKENDS[nombre] = factory
+
+
+def get_result_cache(nombre: Optional[str] = None) -> ResultCache:
+    """Crea el backend indicado (por defecto DASHBOARD_CACHE_BACKEND, 'disk')."""
+    nombre = nombre or os.getenv('DASHBOARD_CACHE_BACKEND', 'disk')
+    factory = BACKENDS.get(nombre)
+    if factory is None:
+        logger.warning("Backend de caché desconocido '%s': caché compartida desactivada", nombre)
+        return NullCache()
+    return factory()
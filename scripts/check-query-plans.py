@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+🔍 Verificación de planes de ejecución del dashboard
+===================================================
+Ejecuta EXPLAIN sobre cada query del dashboard de Streamlit con varias combinaciones
+de filtros y termina con error si alguna recorre entera stats_envios, stats_respuestas
+o resumen_diario (tabla o índice completos) o necesita un filesort.
+
+Pensado para un MySQL local (p. ej. un contenedor con las migraciones aplicadas y un
+volumen de datos representativo: con tablas casi vacías MySQL prefiere el recorrido
+completo aunque exista el índice):
+
+    python scripts/check-query-plans.py
+"""
+
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import streamlit_dashboard as dashboard  # noqa: E402
+from database_connection import execute_query  # noqa: E402
+
+# Alias usados en las queries del dashboard -> tabla vigilada
+TABLAS_VIGILADAS = {
+    'e': 'stats_envios',
+    'r': 'stats_respuestas',
+    'stats_envios': 'stats_envios',
+    'stats_respuestas': 'stats_respuestas',
+    'resumen_diario': 'resumen_diario',
+}
+
+
+def problemas_plan(plan) -> List[str]:
+    """Devuelve los problemas de un EXPLAIN tradicional sobre las tablas vigiladas."""
+    problemas = []
+    for fila in plan.to_dict('records'):
+        tabla = TABLAS_VIGILADAS.get(fila.get('table'))
+        if not tabla:
+            continue
+        extra = fila.get('Extra') or ''
+        if fila.get('type') == 'ALL':
+            problemas.append(f"{tabla}: recorrido completo de la tabla")
+        elif fila.get('type') == 'index':
+            problemas.append(f"{tabla}: recorrido completo del índice {fila.get('key')}")
+        if 'Using filesort' in extra:
+            problemas.append(f"{tabla}: filesort")
+    return problemas
+
+
+def valores_de_ejemplo() -> Dict[str, str]:
+    """Toma un cliente, funnel, vía y alias reales para construir los escenarios."""
+    valores = {}
+    df = execute_query(
+        "SELECT cuenta, funnel, tipo_via, identificador_via FROM stats_envios ORDER BY fecha DESC LIMIT 1", {}
+    )
+    if not df.empty:
+        fila = df.iloc[0]
+        valores.update(
+            cliente=fila['cuenta'],
+            funnel=fila['funnel'],
+            origen_sin_alias=f"{fila['tipo_via']} - {fila['identificador_via']}"
+        )
+    df = execute_query("SELECT alias FROM vias_alias WHERE activo = TRUE LIMIT 1", {})
+    if not df.empty:
+        valores['origen_con_alias'] = df.iloc[0]['alias']
+    return valores
+
+
+def consultas_a_revisar() -> List[Tuple[str, str, Dict]]:
+    """Genera (descripción, query, params) para todas las queries del dashboard."""
+    valores = valores_de_ejemplo()
+    cliente = valores.get('cliente')
+    funnel = valores.get('funnel')
+
+    query, params = dashboard.construir_consulta_alias()
+    indice_alias = dashboard.construir_indice_alias(execute_query(query, params))
+
+    fecha_fin = date.today()
+    fecha_inicio = fecha_fin - timedelta(days=90)
+
+    escenarios = [('sin filtros', {})]
+    if cliente:
+        escenarios += [
+            ('cliente', {'cliente': cliente}),
+            ('cliente + funnel', {'cliente': cliente, 'funnel': funnel}),
+            ('funnel', {'funnel': funnel}),
+            ('origen sin alias', {'origen': valores['origen_sin_alias']}),
+            ('cliente + origen sin alias', {'cliente': cliente, 'origen': valores['origen_sin_alias']}),
+        ]
+    if 'origen_con_alias' in valores:
+        escenarios.append(('origen con alias', {'origen': valores['origen_con_alias']}))
+
+    consultas = []
+    for nombre, filtros in escenarios:
+        for tipo, (query, params) in dashboard.construir_consultas_dashboard(
+            fecha_inicio, fecha_fin, indice_alias=indice_alias, **filtros
+        ).items():
+            consultas.append((f"{tipo} [{nombre}]", query, params))
+        if 'origen' not in filtros:
+            # Lectura por lotes: el ORDER BY fecha debe salir del índice, sin filesort
+            for tipo, (query, params) in dashboard.construir_consultas_dashboard(
+                fecha_inicio, fecha_fin, indice_alias=indice_alias, ordenar_por_fecha=True, **filtros
+            ).items():
+                consultas.append((f"{tipo} por lotes [{nombre}]", query, params))
+        query, params = dashboard.construir_consulta_resumen_diario(fecha_inicio, fecha_fin, **filtros)
+        consultas.append((f"resumen_diario [{nombre}]", query, params))
+        for fuente, tablas in dashboard.TABLAS_POR_FUENTE.items():
+            query, params = dashboard.construir_consulta_versiones_diarias(
+                fecha_inicio, fecha_fin, tablas, filtros.get('cliente')
+            )
+            consultas.append((f"versiones diarias {fuente} [{nombre}]", query, params))
+
+    consultas.append(('opciones de filtro',) + dashboard.construir_consulta_opciones())
+
+    tablas = dashboard.TABLAS_VERSIONADAS + ['resumen_diario']
+    consultas.append(('versiones de datos',) + dashboard.construir_consulta_versiones(tablas))
+    return consultas
+
+
+def main() -> int:
+    print('🔍 Revisando planes de ejecución de las queries del dashboard...')
+    fallos = 0
+    for nombre, query, params in consultas_a_revisar():
+        try:
+            problemas = problemas_plan(execute_query(f"EXPLAIN {query}", params))
+        except Exception as e:
+            problemas = [f"EXPLAIN falló: {e}"]
+        if problemas:
+            fallos += 1
+            print(f"  ❌ {nombre}")
+            for problema in problemas:
+                print(f"      - {problema}")
+        else:
+            print(f"  ✅ {nombre}")
+
+    if fallos:
+        print(f"\n❌ {fallos} queries con planes degradados")
+        return 1
+    print('\n✅ Todas las queries usan índices sin filesort')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+const mysql = require('mysql2/promise');
+require('dotenv').config();
+
+const dbConfig = {
+  host: process.env.DB_HOST,
+  port: parseInt(process.env.DB_PORT || '3306'),
+  user: process.env.DB_USER,
+  password: process.env.DB_PASSWORD,
+  database: process.env.MYSQL_DATABASE,
+  // Mantener los TIMESTAMP como texto para reutilizar la marca de agua sin conversiones de zona horaria
+  dateStrings: true
+};
+
+// node scripts/refresh-daily-summary.js --completo reconstruye todo el resumen
+const RECONSTRUIR = process.argv.includes('--completo');
+
+const MARCA_INICIAL = '1970-01-01 00:00:00';
+
+// Mayor updated_at de las tablas que alimentan el resumen
+const NUEVA_MARCA_SQL = `
+  SELECT GREATEST(
+    COALESCE((SELECT MAX(updated_at) FROM stats_envios), '${MARCA_INICIAL}'),
+    COALESCE((SELECT MAX(updated_at) FROM stats_respuestas), '${MARCA_INICIAL}'),
+    COALESCE((SELECT MAX(updated_at) FROM vias_alias), '${MARCA_INICIAL}')
+  ) AS marca_agua
+`;
+
+// Días (fecha, cuenta) con cambios posteriores a la marca de agua
+const MARCAR_PENDIENTES_SQL = [
+  `INSERT IGNORE INTO resumen_diario_pendientes (fecha, cuenta)
+   SELECT DISTINCT fecha, cuenta FROM stats_envios WHERE updated_at > ?`,
+  `INSERT IGNORE INTO resumen_diario_pendientes (fecha, cuenta)
+   SELECT DISTINCT fecha, cuenta FROM stats_respuestas WHERE updated_at > ?`,
+  // Un alias modificado cambia el origen de todos los días de esa vía
+  `INSERT IGNORE INTO resumen_diario_pendientes (fecha, cuenta)
+   SELECT DISTINCT e.fecha, e.cuenta
+   FROM stats_envios e
+   JOIN vias_alias v ON (
+     e.cuenta = v.cuenta AND
+     e.tipo_via = v.tipo_via AND
+     e.identificador_via = v.identificador
+   )
+   WHERE v.updated_at > ?`
+];
+
+// Misma agregación que vista_resumen_diario, limitada a los días pendientes
+const RECALCULAR_SQL = `
+  INSERT INTO resumen_diario (
+    fecha, cuenta, funnel, origen, tipo_via, tipo_actividad,
+    enviados, fallidos, limite_alcanzado,
+    total_respuestas, cualificados, interesados, agendados
+  )
+  WITH envios AS (
+    SELECT
+      e.fecha,
+      e.cuenta,
+      e.funnel,
+      e.tipo_via,
+      e.identificador_via,
+      e.tipo_actividad,
+      SUM(e.enviados) AS enviados,
+      SUM(e.fallidos) AS fallidos,
+      SUM(e.limite_alcanzado) AS limite_alcanzado,
+      ROW_NUMBER() OVER (
+        PARTITION BY e.fecha, e.cuenta, e.funnel, e.tipo_via, e.identificador_via
+        ORDER BY SUM(e.enviados) DESC, e.tipo_actividad
+      ) AS orden_actividad
+    FROM stats_envios e
+    JOIN resumen_diario_pendientes p ON (e.fecha = p.fecha AND e.cuenta = p.cuenta)
+    GROUP BY e.fecha, e.cuenta, e.funnel, e.tipo_via, e.identificador_via, e.tipo_actividad
+  ),
+  respuestas AS (
+    SELECT
+      r.fecha,
+      r.cuenta,
+      r.funnel,
+      r.tipo_via,
+      r.identificador_via,
+      SUM(r.total_respuestas) AS total_respuestas,
+      SUM(r.cualificados) AS cualificados,
+      SUM(r.interesados) AS interesados,
+      SUM(r.agendados) AS agendados
+    FROM stats_respuestas r
+    JOIN resumen_diario_pendientes p ON (r.fecha = p.fecha AND r.cuenta = p.cuenta)
+    GROUP BY r.fecha, r.cuenta, r.funnel, r.tipo_via, r.identificador_via
+  )
+  SELECT
+    e.fecha,
+    e.cuenta,
+    e.funnel,
+    COALESCE(v.alias, CONCAT(e.tipo_via, ' - ', e.identificador_via)) AS origen,
+    e.tipo_via,
+    e.tipo_actividad,
+    COALESCE(SUM(e.enviados), 0),
+    COALESCE(SUM(e.fallidos), 0),
+    COALESCE(SUM(e.limite_alcanzado), 0),
+    COALESCE(SUM(r.total_respuestas), 0),
+    COALESCE(SUM(r.cualificados), 0),
+    COALESCE(SUM(r.interesados), 0),
+    COALESCE(SUM(r.agendados), 0)
+  FROM envios e
+  LEFT JOIN vias_alias v ON (
+    e.cuenta = v.cuenta AND
+    e.tipo_via = v.tipo_via AND
+    e.identificador_via = v.identificador AND
+    v.activo = TRUE
+  )
+  LEFT JOIN respuestas r ON (
+    e.fecha = r.fecha AND
+    e.cuenta = r.cuenta AND
+    e.funnel = r.funnel AND
+    e.tipo_via = r.tipo_via AND
+    e.identificador_via = r.identificador_via AND
+    e.orden_actividad = 1
+  )
+  GROUP BY e.fecha, e.cuenta, e.funnel, COALESCE(v.alias, CONCAT(e.tipo_via, ' - ', e.identificador_via)), e.tipo_via, e.tipo_actividad
+`;
+
+async function refreshDailySummary() {
+  const connection = await mysql.createConnection(dbConfig);
+
+  try {
+    console.log('🔄 Actualizando resumen diario...');
+
+    // Evitar dos refrescos simultáneos sobre resumen_diario_pendientes
+    const [[lock]] = await connection.query("SELECT GET_LOCK('resumen_diario', 0) AS obtenido");
+    if (!lock.obtenido) {
+      console.log('⏳ Ya hay otro refresco en curso, se omite esta ejecución');
+      return;
+    }
+
+    const [[control]] = await connection.query('SELECT marca_agua FROM resumen_diario_control WHERE id = 1');
+    const completo = RECONSTRUIR || !control || !control.marca_agua;
+    const desde = completo ? MARCA_INICIAL : control.marca_agua;
+
+    // Leer la nueva marca antes de buscar cambios: lo que llegue después se procesa en la siguiente ejecución
+    const [[{ marca_agua: nuevaMarca }]] = await connection.query(NUEVA_MARCA_SQL);
+
+    console.log(`📝 ${completo ? 'Reconstrucción completa' : `Cambios desde ${desde}`}`);
+
+    await connection.beginTransaction();
+
+    await connection.query('DELETE FROM resumen_diario_pendientes');
+    for (const sql of MARCAR_PENDIENTES_SQL) {
+      await connection.query(sql, [desde]);
+    }
+
+    const [[{ total: diasPendientes }]] = await connection.query('SELECT COUNT(*) AS total FROM resumen_diario_pendientes');
+
+    if (completo) {
+      await connection.query('DELETE FROM resumen_diario');
+    } else {
+      await connection.query(`
+        DELETE d FROM resumen_diario d
+        JOIN resumen_diario_pendientes p ON (d.fecha = p.fecha AND d.cuenta = p.cuenta)
+      `);
+    }
+
+    const [resultado] = await connection.query(RECALCULAR_SQL);
+
+    await connection.query(
+      `INSERT INTO resumen_diario_control (id, marca_agua, ultima_ejecucion) VALUES (1, ?, NOW())
+       ON DUPLICATE KEY UPDATE marca_agua = VALUES(marca_agua), ultima_ejecucion = VALUES(ultima_ejecucion)`,
+      [nuevaMarca]
+    );
+
+    await connection.query('DELETE FROM resumen_diario_pendientes');
+    await connection.commit();
+
+    console.log(`✅ ${diasPendientes} días recalculados (${resultado.affectedRows} filas en resumen_diario)`);
+  } catch (error) {
+    await connection.rollback();
+    console.error('❌ Error actualizando el resumen diario:', error.message);
+    process.exitCode = 1;
+  } finally {
+    await connection.query("DO RELEASE_LOCK('resumen_diario')");
+    await connection.end();
+  }
+}
+
+refreshDailySummary();
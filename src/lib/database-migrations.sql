@@ -158,7 +158,41 @@ ON DUPLICATE KEY UPDATE
     alias = VALUES(alias);
 
 -- Crear vistas útiles para análisis
+-- stats_respuestas no tiene tipo_actividad: cada día/cuenta/funnel/vía se pre-agrega por
+-- separado y sus respuestas se atribuyen solo a la actividad principal (la de más enviados),
+-- de modo que el cruce no multiplica las respuestas por el número de actividades
 CREATE OR REPLACE VIEW vista_resumen_diario AS
+WITH envios AS (
+    SELECT 
+        fecha,
+        cuenta,
+        funnel,
+        tipo_via,
+        identificador_via,
+        tipo_actividad,
+        SUM(enviados) as enviados,
+        SUM(fallidos) as fallidos,
+        SUM(limite_alcanzado) as limite_alcanzado,
+        ROW_NUMBER() OVER (
+            PARTITION BY fecha, cuenta, funnel, tipo_via, identificador_via
+            ORDER BY SUM(enviados) DESC, tipo_actividad
+        ) as orden_actividad
+    FROM stats_envios
+    GROUP BY fecha, cuenta, funnel, tipo_via, identificador_via, tipo_actividad
+),
+respuestas AS (
+    SELECT 
+        fecha,
+        cuenta,
+        funnel,
+        tipo_via,
+        identificador_via,
+        SUM(total_respuestas) as total_respuestas,
+        SUM(cualificados) as cualificados,
+        SUM(agendados) as agendados
+    FROM stats_respuestas
+    GROUP BY fecha, cuenta, funnel, tipo_via, identificador_via
+)
 SELECT 
     e.fecha,
     e.cuenta,
@@ -166,39 +200,153 @@ SELECT
     COALESCE(va.alias, CONCAT(e.tipo_via, ' - ', e.identificador_via)) as origen,
     e.tipo_via,
     e.tipo_actividad,
-    SUM(e.enviados) as total_enviados,
-    SUM(e.fallidos) as total_fallidos,
-    SUM(e.limite_alcanzado) as limites_alcanzados,
-    COALESCE(SUM(r.total_respuestas), 0) as total_respuestas,
-    COALESCE(SUM(r.cualificados), 0) as total_cualificados,
-    COALESCE(SUM(r.agendados), 0) as total_agendados,
+    e.orden_actividad = 1 as actividad_principal,
+    e.enviados as total_enviados,
+    e.fallidos as total_fallidos,
+    e.limite_alcanzado as limites_alcanzados,
+    COALESCE(r.total_respuestas, 0) as total_respuestas,
+    COALESCE(r.cualificados, 0) as total_cualificados,
+    COALESCE(r.agendados, 0) as total_agendados,
     CASE 
-        WHEN SUM(e.enviados) > 0 THEN 
-            ROUND((COALESCE(SUM(r.total_respuestas), 0) / SUM(e.enviados)) * 100, 2)
+        WHEN e.enviados > 0 THEN 
+            ROUND((COALESCE(r.total_respuestas, 0) / e.enviados) * 100, 2)
         ELSE 0 
     END as tasa_respuesta,
     CASE 
-        WHEN SUM(e.enviados) > 0 THEN 
-            ROUND((COALESCE(SUM(r.agendados), 0) / SUM(e.enviados)) * 100, 2)
+        WHEN e.enviados > 0 THEN 
+            ROUND((COALESCE(r.agendados, 0) / e.enviados) * 100, 2)
         ELSE 0 
     END as tasa_conversion,
     CASE 
-        WHEN SUM(e.enviados) > 0 THEN 
-            ROUND(((SUM(e.enviados) - SUM(e.fallidos)) / SUM(e.enviados)) * 100, 2)
+        WHEN e.enviados > 0 THEN 
+            ROUND(((e.enviados - e.fallidos) / e.enviados) * 100, 2)
         ELSE 0 
     END as tasa_entrega
-FROM stats_envios e
+FROM envios e
 LEFT JOIN vias_alias va ON (
     e.cuenta = va.cuenta AND 
     e.tipo_via = va.tipo_via AND 
     e.identificador_via = va.identificador AND 
     va.activo = TRUE
 )
-LEFT JOIN stats_respuestas r ON (
+LEFT JOIN respuestas r ON (
     e.fecha = r.fecha AND 
     e.cuenta = r.cuenta AND 
     e.funnel = r.funnel AND 
     e.tipo_via = r.tipo_via AND 
-    e.identificador_via = r.identificador_via
-)
-GROUP BY e.fecha, e.cuenta, e.funnel, e.tipo_via, e.identificador_via, e.tipo_actividad, va.alias; 
\ No newline at end of file
+    e.identificador_via = r.identificador_via AND 
+    e.orden_actividad = 1
+);
+
+-- MySQL no admite ADD INDEX IF NOT EXISTS: los índices añadidos a tablas ya existentes
+-- pasan por este procedimiento, que solo crea el índice si information_schema no lo tiene,
+-- para que la migración se pueda ejecutar varias veces
+DROP PROCEDURE IF EXISTS agregar_indice_si_no_existe;
+CREATE PROCEDURE agregar_indice_si_no_existe(IN tabla VARCHAR(64), IN indice VARCHAR(64), IN columnas VARCHAR(1000))
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = tabla AND index_name = indice
+    ) THEN
+        SET @sentencia = CONCAT('ALTER TABLE ', tabla, ' ADD INDEX ', indice, ' (', columnas, ')');
+        PREPARE sentencia FROM @sentencia;
+        EXECUTE sentencia;
+        DEALLOCATE PREPARE sentencia;
+    END IF;
+END;
+
+-- Equivalente para DROP INDEX (tampoco admite IF EXISTS en MySQL)
+DROP PROCEDURE IF EXISTS eliminar_indice_si_existe;
+CREATE PROCEDURE eliminar_indice_si_existe(IN tabla VARCHAR(64), IN indice VARCHAR(64))
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = tabla AND index_name = indice
+    ) THEN
+        SET @sentencia = CONCAT('ALTER TABLE ', tabla, ' DROP INDEX ', indice);
+        PREPARE sentencia FROM @sentencia;
+        EXECUTE sentencia;
+        DEALLOCATE PREPARE sentencia;
+    END IF;
+END;
+
+-- Índice para detectar cambios en la actualización incremental del resumen diario
+CALL agregar_indice_si_no_existe('stats_envios', 'idx_updated_at', 'updated_at');
+CALL agregar_indice_si_no_existe('stats_respuestas', 'idx_updated_at', 'updated_at');
+
+-- Resumen diario materializado para el dashboard: una fila por día y dimensión, con el alias
+-- ya resuelto y las respuestas atribuidas a la actividad principal (como vista_resumen_diario).
+-- Lo mantiene scripts/refresh-daily-summary.js recalculando solo los días con cambios.
+CREATE TABLE IF NOT EXISTS resumen_diario (
+    fecha DATE NOT NULL,
+    cuenta VARCHAR(100) NOT NULL,
+    funnel VARCHAR(100) NOT NULL,
+    origen VARCHAR(310) NOT NULL,
+    tipo_via VARCHAR(50) NOT NULL,
+    tipo_actividad VARCHAR(50) NOT NULL,
+    enviados INT DEFAULT 0,
+    fallidos INT DEFAULT 0,
+    limite_alcanzado INT DEFAULT 0,
+    total_respuestas INT DEFAULT 0,
+    cualificados INT DEFAULT 0,
+    interesados INT DEFAULT 0,
+    agendados INT DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    
+    -- tipo_via forma parte de la clave porque el dashboard agrega también por canal
+    PRIMARY KEY (fecha, cuenta, funnel, origen, tipo_via, tipo_actividad),
+    INDEX idx_cuenta_fecha (cuenta, fecha)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Días (fecha, cuenta) a recalcular en la ejecución en curso del refresco
+CREATE TABLE IF NOT EXISTS resumen_diario_pendientes (
+    fecha DATE NOT NULL,
+    cuenta VARCHAR(100) NOT NULL,
+    
+    PRIMARY KEY (fecha, cuenta)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Marca de agua del refresco: mayor updated_at ya procesado de las tablas de origen
+CREATE TABLE IF NOT EXISTS resumen_diario_control (
+    id TINYINT PRIMARY KEY,
+    marca_agua TIMESTAMP NULL,
+    ultima_ejecucion TIMESTAMP NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT IGNORE INTO resumen_diario_control (id, marca_agua) VALUES (1, NULL);
+
+-- Versión de los datos por cuenta (MAX(updated_at) ... GROUP BY cuenta) con las que el
+-- dashboard invalida solo las entradas de caché afectadas; resuelto con loose index scan
+CALL agregar_indice_si_no_existe('stats_envios', 'idx_cuenta_updated_at', 'cuenta, updated_at');
+CALL agregar_indice_si_no_existe('stats_respuestas', 'idx_cuenta_updated_at', 'cuenta, updated_at');
+CALL agregar_indice_si_no_existe('vias_alias', 'idx_cuenta_updated_at', 'cuenta, updated_at');
+CALL agregar_indice_si_no_existe('resumen_diario', 'idx_cuenta_updated_at', 'cuenta, updated_at');
+
+-- Versión por día (MAX(updated_at) ... WHERE fecha BETWEEN ... GROUP BY fecha) con la que el
+-- dashboard invalida solo los días cambiados de su caché de particiones diarias
+CALL agregar_indice_si_no_existe('stats_envios', 'idx_version_dia', 'fecha, cuenta, updated_at');
+CALL agregar_indice_si_no_existe('stats_respuestas', 'idx_version_dia', 'fecha, cuenta, updated_at');
+CALL agregar_indice_si_no_existe('resumen_diario', 'idx_version_dia', 'fecha, cuenta, updated_at');
+
+-- Índices compuestos para las queries del dashboard de Streamlit (construir_consulta*).
+-- Incluyen los contadores leídos para que las queries se resuelvan solo con el índice.
+-- Todos los clientes: rango por fecha
+CALL agregar_indice_si_no_existe('stats_envios', 'idx_dashboard_fecha', 'fecha, cuenta, funnel, tipo_via, identificador_via, tipo_actividad, enviados, fallidos, limite_alcanzado');
+CALL agregar_indice_si_no_existe('stats_respuestas', 'idx_dashboard_fecha', 'fecha, cuenta, funnel, tipo_via, identificador_via, total_respuestas, cualificados, interesados, agendados');
+
+-- Un cliente: igualdad por cuenta y rango por fecha; el funnel se filtra dentro del índice
+CALL agregar_indice_si_no_existe('stats_envios', 'idx_dashboard_cuenta', 'cuenta, fecha, funnel, tipo_via, identificador_via, tipo_actividad, enviados, fallidos, limite_alcanzado');
+CALL agregar_indice_si_no_existe('stats_respuestas', 'idx_dashboard_cuenta', 'cuenta, fecha, funnel, tipo_via, identificador_via, total_respuestas, cualificados, interesados, agendados');
+
+-- Filtro por origen resuelto a vías concretas (tipo_via, identificador_via[, cuenta])
+CALL agregar_indice_si_no_existe('stats_envios', 'idx_dashboard_via', 'tipo_via, identificador_via, cuenta, fecha');
+CALL agregar_indice_si_no_existe('stats_respuestas', 'idx_dashboard_via', 'tipo_via, identificador_via, cuenta, fecha');
+
+-- idx_fecha e idx_cuenta quedan cubiertos como prefijo de los índices anteriores
+CALL eliminar_indice_si_existe('stats_envios', 'idx_fecha');
+CALL eliminar_indice_si_existe('stats_envios', 'idx_cuenta');
+CALL eliminar_indice_si_existe('stats_respuestas', 'idx_fecha');
+CALL eliminar_indice_si_existe('stats_respuestas', 'idx_cuenta');
+
+DROP PROCEDURE IF EXISTS agregar_indice_si_no_existe;
+DROP PROCEDURE IF EXISTS eliminar_indice_si_existe;
@@ -18,8 +18,17 @@ from datetime import datetime, date, timedelta
 from dotenv import load_dotenv
 import logging
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from typing import Dict, List, Optional, Tuple
-from database_connection import test_connection, execute_query, execute_query_list
+from database_connection import (
+    ARROW_DISPONIBLE, test_connection, execute_query, execute_query_arrow, execute_query_list, iterar_queries,
+    estadisticas_pool
+)
+from result_cache import cache_key, get_result_cache
+from partition_cache import DayPartitionCache, tramos_consecutivos
+from figure_cache import FigureCache, huella_dataframe
+from connection_health import EstadoConexion, get_connection_health
 
 # Configurar página
 st.set_page_config(
@@ -265,6 +274,13 @@ def load_professional_css():
     }
     
     /* Métricas mejoradas */
+    /* Rejilla de tarjetas emitida en un solo bloque HTML */
+    .metric-grid {
+        display: grid;
+        gap: 10px;
+        margin: 10px 0;
+    }
+    
     .metric-enhanced {
         background: rgba(255, 255, 255, 0.95);
         padding: 15px;
@@ -412,6 +428,7 @@ def load_professional_css():
         .metric-value { font-size: 1.8rem; }
         .section-title { font-size: 1.2rem; }
         .hierarchy-metrics { flex-direction: column; }
+        .metric-grid { grid-template-columns: repeat(2, 1fr) !important; }
     }
     </style>
     """, unsafe_allow_html=True)
@@ -419,216 +436,830 @@ def load_professional_css():
 # Cargar configuración
 load_dotenv()
 
+@st.cache_resource
+def obtener_cache_resultados():
+    """Backend de caché compartido por todas las sesiones y procesos del host (DASHBOARD_CACHE_BACKEND)."""
+    return get_result_cache()
+
+@st.cache_resource
+def obtener_cache_particiones():
+    """Particiones diarias de métricas compartidas por todas las sesiones del proceso.
+    
+    Cada día guarda su versión (MAX(updated_at) del día), así que el TTL
+    (DASHBOARD_PARTICIONES_TTL) solo limita cuánto se tarda en ver borrados que no
+    cambian updated_at. Tamaño acotado por DASHBOARD_PARTICIONES_MAX (días) y
+    DASHBOARD_PARTICIONES_MAX_MB.
+    """
+    return DayPartitionCache(
+        ttl=float(os.getenv('DASHBOARD_PARTICIONES_TTL', '3600')),
+        max_particiones=int(os.getenv('DASHBOARD_PARTICIONES_MAX', '20000')),
+        max_bytes=int(os.getenv('DASHBOARD_PARTICIONES_MAX_MB', '256')) * 1024 * 1024
+    )
+
+@st.cache_resource
+def obtener_cache_figuras():
+    """Figuras Plotly reutilizadas entre reruns y sesiones.
+    
+    Tamaño acotado por DASHBOARD_FIGURAS_MAX (entradas) y DASHBOARD_FIGURAS_MAX_BYTES
+    (JSON de las figuras).
+    """
+    return FigureCache(
+        max_entradas=int(os.getenv('DASHBOARD_FIGURAS_MAX', '64')),
+        max_bytes=int(os.getenv('DASHBOARD_FIGURAS_MAX_BYTES', str(64 * 1024 * 1024)))
+    )
+
+def figura_cacheada(constructor, *args, **kwargs):
+    """Figura de constructor(*args, **kwargs), reutilizada mientras no cambien sus datos ni parámetros."""
+    return obtener_cache_figuras().figura(constructor, *args, **kwargs)
+
+@st.cache_resource
+def obtener_salud_conexion():
+    """Comprobación de conexión compartida por todas las sesiones (ver connection_health)."""
+    return get_connection_health(test_connection)
+
+# Camino Arrow (DASHBOARD_ARROW=0 lo desactiva): el resultado se arma columna a columna
+# y se convierte a pandas una sola vez, con las dimensiones ya como category
+USAR_ARROW = ARROW_DISPONIBLE and os.getenv('DASHBOARD_ARROW', '1') != '0'
+
+def cargar_resultado(query: str, params: Optional[Dict] = None) -> pd.DataFrame:
+    """Ejecuta la query y devuelve un DataFrame, pasando por Arrow si está disponible."""
+    if not USAR_ARROW:
+        return execute_query(query, params or {})
+    tabla = execute_query_arrow(query, params or {}, diccionario=DIMENSIONES_CATEGORICAS)
+    df = tabla.to_pandas(split_blocks=True)
+    # Los diccionarios de Arrow siguen el orden de aparición; se ordenan como haría
+    # astype('category') para que ordenar por una dimensión siga siendo alfabético
+    for columna in df.select_dtypes('category').columns:
+        df[columna] = df[columna].cat.reorder_categories(sorted(df[columna].cat.categories))
+    return df
+
+def consultar(query: str, params: Optional[Dict] = None, version: str = '') -> pd.DataFrame:
+    """execute_query con la caché compartida delante, por texto de la query, filtros y versión de datos."""
+    clave = cache_key('query', query, params, version)
+    return obtener_cache_resultados().get_or_load(clave, lambda: cargar_resultado(query, params))
+
+def consultar_lista(query: str, params: Optional[Dict] = None, version: str = '') -> List:
+    """execute_query_list con la caché compartida delante."""
+    clave = cache_key('lista', query, params, version)
+    df = obtener_cache_resultados().get_or_load(
+        clave, lambda: pd.DataFrame({'valor': execute_query_list(query, params or {})})
+    )
+    return df['valor'].tolist()
+
+# Tablas cuya versión (MAX(updated_at) por cuenta) forma parte de las claves de caché
+TABLAS_VERSIONADAS = ['stats_envios', 'stats_respuestas', 'vias_alias']
+
+def construir_consulta_versiones(tablas: List[str]) -> Tuple[str, Dict]:
+    """Construye la query de MAX(updated_at) por tabla y cuenta."""
+    query = " UNION ALL ".join(
+        f"SELECT '{tabla}' as tabla, cuenta, MAX(updated_at) as version FROM {tabla} GROUP BY cuenta"
+        for tabla in tablas
+    )
+    return query, {}
+
+@st.cache_data(ttl=60)
+def obtener_versiones_datos() -> Dict[Tuple[str, str], str]:
+    """Obtiene MAX(updated_at) por tabla y cuenta; solo cambia cuando cambian los datos de esa cuenta."""
+    tablas = TABLAS_VERSIONADAS + (['resumen_diario'] if resumen_diario_disponible() else [])
+    query, params = construir_consulta_versiones(tablas)
+    try:
+        df = execute_query(query, params)
+        return {(fila.tabla, fila.cuenta): str(fila.version) for fila in df.itertuples(index=False)}
+    except Exception:
+        # Sin versiones las entradas solo caducan por TTL
+        return {}
+
+def version_datos(cliente=None, tablas: Optional[List[str]] = None) -> str:
+    """Huella de las versiones de los datos de un cliente (o de todos si no hay filtro).
+    
+    Con `tablas` solo cuentan las versiones de esas tablas.
+    """
+    versiones = obtener_versiones_datos()
+    relevantes = sorted(
+        (tabla, cuenta, version) for (tabla, cuenta), version in versiones.items()
+        if (cliente is None or cuenta == cliente) and (tablas is None or tabla in tablas)
+    )
+    return cache_key(relevantes)
+
+# Tablas de las que salen las métricas diarias según la fuente (ver obtener_datos_dashboard)
+TABLAS_POR_FUENTE = {
+    'resumen_diario': ['resumen_diario'],
+    'tablas': ['stats_envios', 'stats_respuestas'],
+}
+
+def construir_consulta_versiones_diarias(fecha_inicio: date, fecha_fin: date, tablas: List[str],
+                                         cliente=None) -> Tuple[str, Dict]:
+    """Construye la query de MAX(updated_at) por tabla y día del rango (de un cliente si se indica)."""
+    params = {
+        'fecha_inicio': fecha_inicio,
+        'fecha_fin': fecha_fin
+    }
+    filtro_cliente = ''
+    if cliente:
+        params['cliente'] = cliente
+        filtro_cliente = " AND cuenta = %(cliente)s"
+    
+    query = " UNION ALL ".join(
+        f"SELECT '{tabla}' as tabla, fecha, MAX(updated_at) as version FROM {tabla} "
+        f"WHERE fecha BETWEEN %(fecha_inicio)s AND %(fecha_fin)s{filtro_cliente} GROUP BY fecha"
+        for tabla in tablas
+    )
+    return query, params
+
+@st.cache_data(ttl=60)
+def obtener_versiones_por_dia(fecha_inicio: date, fecha_fin: date, cliente=None,
+                              fuente: str = 'tablas') -> Optional[Dict[date, str]]:
+    """Versión de cada día del rango: MAX(updated_at) de sus tablas de origen.
+    
+    Los días sin datos no aparecen. Devuelve None si la query falla: entonces las
+    particiones diarias solo caducan por TTL.
+    """
+    query, params = construir_consulta_versiones_diarias(fecha_inicio, fecha_fin, TABLAS_POR_FUENTE[fuente], cliente)
+    try:
+        df = execute_query(query, params)
+    except Exception:
+        return None
+    
+    versiones: Dict[date, str] = {}
+    for fila in df.sort_values('tabla').itertuples(index=False):
+        dia = pd.Timestamp(fila.fecha).date()
+        versiones[dia] = f"{versiones.get(dia, '')}{fila.tabla}={fila.version};"
+    return versiones
+
+# Ejecución concurrente de las queries del dashboard (DASHBOARD_CONSULTAS_CONCURRENTES=0 la desactiva)
+CONSULTAS_CONCURRENTES = os.getenv('DASHBOARD_CONSULTAS_CONCURRENTES', '1') != '0'
+MAX_CONSULTAS_CONCURRENTES = int(os.getenv('DASHBOARD_MAX_CONSULTAS_CONCURRENTES', '4'))
+
+def ejecutar_consultas(consultas: Dict[str, Tuple[str, Dict]], version: str = '') -> Dict[str, pd.DataFrame]:
+    """Ejecuta consultas independientes (en paralelo si está activado) y devuelve sus DataFrames por nombre."""
+    if not CONSULTAS_CONCURRENTES or len(consultas) < 2:
+        return {nombre: consultar(query, params, version) for nombre, (query, params) in consultas.items()}
+    
+    # Cada hilo pide su propia conexión; los errores se propagan al llamar a result()
+    with ThreadPoolExecutor(max_workers=min(len(consultas), MAX_CONSULTAS_CONCURRENTES)) as executor:
+        futuros = {
+            nombre: executor.submit(consultar, query, params, version)
+            for nombre, (query, params) in consultas.items()
+        }
+        return {nombre: futuro.result() for nombre, futuro in futuros.items()}
+
+# Días hacia atrás que cubre el índice de opciones de filtro
+DIAS_INDICE_OPCIONES = int(os.getenv('DASHBOARD_DIAS_INDICE_OPCIONES', '90'))
+
+# Dimensiones de los selectores del sidebar y su opción "sin filtro"
+ETIQUETAS_TODOS = {
+    'cliente': "Todos los clientes",
+    'origen': "Todos los orígenes",
+    'funnel': "Todos los funnels",
+}
+
+# Opciones de los filtros: una sola query agrupada por día, cuenta, origen y funnel
+# alimenta los tres selectores. No lleva ORDER BY: el orden por volumen se aplica en
+# pandas y MySQL se ahorra el filesort
+def inicio_indice_opciones() -> date:
+    """Primer día de la ventana del índice de opciones.
+    
+    Se calcula en Python (no con CURRENT_DATE de MySQL, que puede ir en otra zona
+    horaria) para que la query y indice_cubre_rango usen la misma fecha. Un índice
+    cacheado desde un día anterior empieza antes, así que sigue cubriendo la ventana.
+    """
+    return date.today() - timedelta(days=DIAS_INDICE_OPCIONES)
+
+def construir_consulta_opciones(desde: Optional[date] = None) -> Tuple[str, Dict]:
+    """Construye la query de coocurrencias fecha/cuenta/origen/funnel con su volumen de envíos."""
+    query = """
+    SELECT 
+        e.fecha,
+        e.cuenta as cliente,
+        COALESCE(v.alias, CONCAT(e.tipo_via, ' - ', e.identificador_via)) as origen,
+        e.funnel,
+        COUNT(*) as total_envios
+    FROM stats_envios e
+    LEFT JOIN vias_alias v ON (
+        e.cuenta = v.cuenta AND 
+        e.tipo_via = v.tipo_via AND 
+        e.identificador_via = v.identificador AND 
+        v.activo = TRUE
+    )
+    WHERE e.fecha >= %(desde)s
+    GROUP BY e.fecha, e.cuenta, e.funnel, e.tipo_via, e.identificador_via, v.alias
+    """
+    return query, {'desde': desde or inicio_indice_opciones()}
+
+def construir_indice_opciones(df_opciones: pd.DataFrame) -> pd.DataFrame:
+    """Índice de coocurrencias (fecha, cliente, origen, funnel) -> total_envios en tipos compactos."""
+    df = pd.DataFrame(df_opciones, columns=['fecha'] + list(ETIQUETAS_TODOS) + ['total_envios'])
+    df['fecha'] = pd.to_datetime(df['fecha'])
+    for dimension in ETIQUETAS_TODOS:
+        df[dimension] = df[dimension].astype('category')
+    df['total_envios'] = pd.to_numeric(df['total_envios']).fillna(0).astype('int32')
+    return df
+
+def mascara_indice(indice: pd.DataFrame, fecha_inicio, fecha_fin, filtros: Dict) -> pd.Series:
+    """Filas del índice compatibles con los filtros y el rango de fechas.
+    
+    Si el rango empieza antes de la ventana del índice no se filtra por fecha: el
+    índice no sabe qué hubo antes y sus listas serían incompletas.
+    """
+    mascara = pd.Series(True, index=indice.index)
+    if indice_cubre_rango(fecha_inicio):
+        mascara &= indice['fecha'].between(pd.Timestamp(fecha_inicio), pd.Timestamp(fecha_fin))
+    for dimension, valor in filtros.items():
+        if valor is not None:
+            mascara &= indice[dimension] == valor
+    return mascara
+
+def indice_cubre_rango(fecha_inicio) -> bool:
+    """Indica si el rango empieza dentro de la ventana de DIAS_INDICE_OPCIONES días del índice."""
+    return fecha_inicio >= inicio_indice_opciones()
+
+def ordenar_por_volumen(df: pd.DataFrame, columna: str) -> List:
+    """Valores de una columna ordenados por total_envios descendente (empates por nombre)."""
+    totales = df.groupby(columna, observed=True)['total_envios'].sum().reset_index()
+    return totales.sort_values(['total_envios', columna], ascending=[False, True])[columna].tolist()
+
+def opciones_filtro(indice: pd.DataFrame, dimension: str, fecha_inicio, fecha_fin, filtros: Dict) -> List:
+    """Valores de una dimensión que aparecen junto al resto de filtros en el rango, por volumen."""
+    otros = {d: v for d, v in filtros.items() if d != dimension}
+    return ordenar_por_volumen(indice[mascara_indice(indice, fecha_inicio, fecha_fin, otros)], dimension)
+
+def hay_datos_en_indice(indice: pd.DataFrame, fecha_inicio, fecha_fin, filtros: Dict) -> bool:
+    """False solo si el índice cubre el rango y ninguna fila combina con los filtros."""
+    if not indice_cubre_rango(fecha_inicio):
+        return True
+    return bool(mascara_indice(indice, fecha_inicio, fecha_fin, filtros).any())
+
 # Funciones de datos optimizadas
 @st.cache_data(ttl=300)
-def obtener_clientes_disponibles():
-    """Obtiene lista de clientes/cuentas disponibles."""
+def obtener_indice_opciones(version: str = '') -> pd.DataFrame:
+    """Índice de opciones de filtro de todos los clientes, cargado con una sola query."""
     try:
-        query = """
-        SELECT DISTINCT cuenta as cliente, COUNT(*) as total_envios
-        FROM stats_envios 
-        WHERE fecha >= DATE_SUB(CURRENT_DATE, INTERVAL 90 DAY)
-        GROUP BY cuenta 
-        ORDER BY total_envios DESC, cuenta
-        """
-        return execute_query_list(query)
+        query, params = construir_consulta_opciones()
+        return construir_indice_opciones(consultar(query, params, version))
     except Exception as e:
-        st.error(f"Error obteniendo clientes: {e}")
-        return []
+        st.error(f"Error obteniendo opciones de filtro: {e}")
+        return construir_indice_opciones(pd.DataFrame())
+
+# Clave de cruce entre stats_envios y stats_respuestas
+CLAVE_CRUCE = ['fecha', 'cliente', 'funnel', 'tipo_via', 'identificador_via']
+
+# Dimensiones de df_metricas
+DIMENSIONES_METRICAS = ['cliente', 'origen', 'funnel', 'tipo_via', 'tipo_actividad']
+
+CONTADORES_METRICAS = [
+    'total_enviados', 'total_fallidos', 'limites_alcanzados',
+    'total_respuestas', 'total_cualificados', 'total_interesados', 'total_agendados'
+]
+
+# Orden de las tasas en las tablas por cliente y por origen
+COLUMNAS_TASAS = ['tasa_entrega', 'tasa_respuesta', 'tasa_conversion']
+
+COLUMNAS_METRICAS = DIMENSIONES_METRICAS + CONTADORES_METRICAS + ['tasa_respuesta', 'tasa_conversion', 'tasa_entrega']
+
+# Métricas por día: la atribución de respuestas nunca cruza días, así que sumar días da
+# las mismas métricas que calcularlas sobre el rango completo
+DIMENSIONES_DIARIAS = ['fecha'] + DIMENSIONES_METRICAS
+
+def calcular_tasas(df: pd.DataFrame) -> pd.DataFrame:
+    """Añade tasa_respuesta, tasa_conversion y tasa_entrega (0 cuando no hay envíos)."""
+    enviados = df['total_enviados'].astype(float)
+    con_envios = enviados > 0
+    divisor = enviados.where(con_envios, 1.0)
+    
+    df['tasa_respuesta'] = np.where(con_envios, (df['total_respuestas'] / divisor * 100).round(2), 0.0)
+    df['tasa_conversion'] = np.where(con_envios, (df['total_agendados'] / divisor * 100).round(2), 0.0)
+    df['tasa_entrega'] = np.where(con_envios, ((enviados - df['total_fallidos']) / divisor * 100).round(2), 0.0)
+    return df
+
+COLUMNAS_RESPUESTAS_METRICAS = ['total_respuestas', 'cualificados', 'interesados', 'agendados']
+
+def marcar_actividad_principal(df_envios: pd.DataFrame) -> pd.Series:
+    """Marca, por cada clave de cruce, la actividad con más enviados (empate: orden alfabético)."""
+    orden = df_envios.sort_values(['enviados', 'tipo_actividad'], ascending=[False, True], kind='stable')
+    return ~orden.duplicated(CLAVE_CRUCE).reindex(df_envios.index)
+
+def construir_metricas(df_envios: pd.DataFrame, df_respuestas: pd.DataFrame,
+                       dimensiones: List[str] = DIMENSIONES_METRICAS) -> pd.DataFrame:
+    """Construye df_metricas en memoria a partir de las filas de envíos y respuestas.
+    
+    stats_respuestas no distingue tipo_actividad, así que cada respuesta se atribuye
+    una sola vez, a la actividad principal de su clave, en lugar de repetirse por
+    cada actividad del día.
+    """
+    if df_envios.empty:
+        return pd.DataFrame(columns=dimensiones + COLUMNAS_METRICAS[len(DIMENSIONES_METRICAS):])
+    
+    envios = df_envios.assign(actividad_principal=marcar_actividad_principal(df_envios))
+    
+    if df_respuestas.empty:
+        cruce = envios.assign(**{columna: 0 for columna in COLUMNAS_RESPUESTAS_METRICAS})
+    else:
+        # Pre-agregar respuestas a la clave de cruce y unirlas solo a la actividad principal
+        respuestas = df_respuestas.groupby(CLAVE_CRUCE, sort=False, dropna=False, observed=True)[COLUMNAS_RESPUESTAS_METRICAS].sum().reset_index()
+        respuestas['actividad_principal'] = True
+        cruce = envios.merge(respuestas, on=CLAVE_CRUCE + ['actividad_principal'], how='left')
+        cruce[COLUMNAS_RESPUESTAS_METRICAS] = cruce[COLUMNAS_RESPUESTAS_METRICAS].fillna(0)
+    
+    return agregar_metricas(cruce, dimensiones)
+
+def agregar_metricas(cruce: pd.DataFrame, dimensiones: List[str] = DIMENSIONES_METRICAS) -> pd.DataFrame:
+    """Suma envíos y respuestas ya atribuidas por las dimensiones de df_metricas y calcula las tasas."""
+    metricas = cruce.groupby(dimensiones, sort=False, dropna=False, observed=True).agg(
+        total_enviados=('enviados', 'sum'),
+        total_fallidos=('fallidos', 'sum'),
+        limites_alcanzados=('limite_alcanzado', 'sum'),
+        total_respuestas=('total_respuestas', 'sum'),
+        total_cualificados=('cualificados', 'sum'),
+        total_interesados=('interesados', 'sum'),
+        total_agendados=('agendados', 'sum')
+    ).reset_index()
+    
+    metricas[CONTADORES_METRICAS] = metricas[CONTADORES_METRICAS].astype('int64')
+    
+    return calcular_tasas(metricas)
+
+def reagregar_metricas(df_diario: pd.DataFrame) -> pd.DataFrame:
+    """Suma métricas diarias (DIMENSIONES_DIARIAS) a las dimensiones de df_metricas y recalcula las tasas."""
+    if df_diario.empty:
+        return pd.DataFrame(columns=COLUMNAS_METRICAS)
+    
+    metricas = df_diario.groupby(DIMENSIONES_METRICAS, sort=False, dropna=False, observed=True)[CONTADORES_METRICAS].sum().reset_index()
+    metricas[CONTADORES_METRICAS] = metricas[CONTADORES_METRICAS].astype('int64')
+    return calcular_tasas(metricas)
+
+# Dimensiones con pocos valores distintos: se guardan como category
+DIMENSIONES_CATEGORICAS = ['cliente', 'funnel', 'tipo_via', 'origen', 'tipo_actividad']
+
+CONTADORES_COMPACTABLES = (
+    ['enviados', 'fallidos', 'limite_alcanzado'] + COLUMNAS_RESPUESTAS_METRICAS + CONTADORES_METRICAS
+)
+
+def compactar_tipos(df: pd.DataFrame) -> pd.DataFrame:
+    """Reduce la memoria de un DataFrame del dashboard.
+    
+    Dimensiones a category, fecha a datetime64 y contadores a int32 cuando caben
+    (las sumas agregadas se dejan en int64 si no).
+    """
+    if df.empty:
+        return df
+    
+    df = df.copy()
+    for columna in df.columns:
+        if columna in DIMENSIONES_CATEGORICAS:
+            df[columna] = df[columna].astype('category')
+        elif columna == 'fecha':
+            df[columna] = pd.to_datetime(df[columna])
+        elif columna in CONTADORES_COMPACTABLES:
+            # SUM() de MySQL llega como DECIMAL
+            valores = pd.to_numeric(df[columna]).fillna(0)
+            if valores.abs().max() <= np.iinfo(np.int32).max:
+                df[columna] = valores.astype('int32')
+            else:
+                df[columna] = valores.astype('int64')
+    return df
+
+# Lectura desde la tabla resumen_diario (DASHBOARD_USAR_RESUMEN_DIARIO=0 la desactiva)
+USAR_RESUMEN_DIARIO = os.getenv('DASHBOARD_USAR_RESUMEN_DIARIO', '1') != '0'
 
 @st.cache_data(ttl=300)
-def obtener_origenes_disponibles(cliente=None):
-    """Obtiene lista de orígenes disponibles."""
+def resumen_diario_disponible() -> bool:
+    """Indica si resumen_diario existe y ha sido poblado por scripts/refresh-daily-summary.js."""
+    if not USAR_RESUMEN_DIARIO:
+        return False
     try:
-        query = """
-        SELECT 
-            COALESCE(v.alias, CONCAT(e.tipo_via, ' - ', e.identificador_via)) as origen,
-            COUNT(*) as total_envios
-        FROM stats_envios e
-        LEFT JOIN vias_alias v ON (
-            e.cuenta = v.cuenta AND 
-            e.tipo_via = v.tipo_via AND 
-            e.identificador_via = v.identificador AND 
-            v.activo = TRUE
-        )
-        WHERE e.fecha >= DATE_SUB(CURRENT_DATE, INTERVAL 90 DAY)
-        """
-        
-        params = {}
-        if cliente:
-            query += " AND e.cuenta = %(cliente)s"
-            params['cliente'] = cliente
+        query = "SELECT marca_agua FROM resumen_diario_control WHERE id = 1 AND marca_agua IS NOT NULL"
+        return len(execute_query_list(query)) > 0
+    except Exception:
+        return False
+
+def construir_filtros_resumen(params: Dict, cliente=None, origen=None, funnel=None) -> str:
+    """Condiciones " AND ..." de cliente, origen y funnel sobre resumen_diario."""
+    filtros = []
+    if cliente:
+        filtros.append("cuenta = %(cliente)s")
+        params['cliente'] = cliente
+    if origen:
+        filtros.append("origen = %(origen)s")
+        params['origen'] = origen
+    if funnel:
+        filtros.append("funnel = %(funnel)s")
+        params['funnel'] = funnel
+    
+    return " AND " + " AND ".join(filtros) if filtros else ""
+
+def construir_consulta_resumen_diario(fecha_inicio: date, fecha_fin: date, cliente=None, origen=None, funnel=None) -> Tuple[str, Dict]:
+    """Construye la query sobre resumen_diario para los filtros dados."""
+    params = {
+        'fecha_inicio': fecha_inicio,
+        'fecha_fin': fecha_fin
+    }
+    where = construir_filtros_resumen(params, cliente, origen, funnel)
+    
+    query = f"""
+    SELECT 
+        fecha,
+        cuenta as cliente,
+        funnel,
+        tipo_via,
+        origen,
+        tipo_actividad,
+        enviados,
+        fallidos,
+        limite_alcanzado,
+        total_respuestas,
+        cualificados,
+        interesados,
+        agendados
+    FROM resumen_diario
+    WHERE fecha BETWEEN %(fecha_inicio)s AND %(fecha_fin)s{where}
+    """
+    return query, params
+
+def construir_consulta_alias() -> Tuple[str, Dict]:
+    """Construye la query de los alias activos."""
+    return "SELECT alias, cuenta, tipo_via, identificador FROM vias_alias WHERE activo = TRUE", {}
+
+def construir_indice_alias(df_alias: pd.DataFrame) -> Dict[str, List[Tuple[str, str, str]]]:
+    """Agrupa los alias activos en un índice alias -> vías (cuenta, tipo_via, identificador)."""
+    indice = {}
+    for fila in df_alias.itertuples(index=False):
+        indice.setdefault(fila.alias, []).append((fila.cuenta, fila.tipo_via, fila.identificador))
+    return indice
+
+@st.cache_data(ttl=300)
+def obtener_indice_alias(version: str = '') -> Dict[str, List[Tuple[str, str, str]]]:
+    """Índice en memoria alias -> vías (cuenta, tipo_via, identificador) con alias activo."""
+    query, params = construir_consulta_alias()
+    return construir_indice_alias(consultar(query, params, version))
+
+def resolver_filtro_origen(origen: str, tabla: str, indice_alias: Dict[str, List[Tuple[str, str, str]]], params: Dict, cliente=None) -> str:
+    """Traduce un origen a condiciones sobre (cuenta, tipo_via, identificador_via) de la tabla indicada.
+    
+    Equivale a COALESCE(v.alias, CONCAT(tipo_via, ' - ', identificador_via)) = origen:
+    las vías cuyo alias activo es el origen, más la vía "tipo_via - identificador"
+    en las cuentas donde no tiene alias.
+    """
+    condiciones = []
+    
+    vias = [via for via in indice_alias.get(origen, []) if cliente is None or via[0] == cliente]
+    if vias:
+        tuplas = []
+        for i, (cuenta, tipo_via, identificador) in enumerate(vias):
+            params[f'origen_cuenta_{i}'] = cuenta
+            params[f'origen_tipo_via_{i}'] = tipo_via
+            params[f'origen_identificador_{i}'] = identificador
+            tuplas.append(f"(%(origen_cuenta_{i})s, %(origen_tipo_via_{i})s, %(origen_identificador_{i})s)")
+        condiciones.append(f"({tabla}.cuenta, {tabla}.tipo_via, {tabla}.identificador_via) IN ({', '.join(tuplas)})")
+    
+    if ' - ' in origen:
+        tipo_via, identificador = origen.split(' - ', 1)
+        params['origen_tipo_via'] = tipo_via
+        params['origen_identificador'] = identificador
+        condicion = f"{tabla}.tipo_via = %(origen_tipo_via)s AND {tabla}.identificador_via = %(origen_identificador)s"
         
-        query += " GROUP BY e.tipo_via, e.identificador_via, v.alias ORDER BY total_envios DESC"
+        # Las cuentas donde esa vía tiene alias activo se muestran con el alias, no con este nombre
+        cuentas_con_alias = sorted({
+            cuenta for vias_alias in indice_alias.values()
+            for cuenta, via_tipo, via_identificador in vias_alias
+            if via_tipo == tipo_via and via_identificador == identificador
+        })
+        if cuentas_con_alias:
+            marcadores = []
+            for i, cuenta in enumerate(cuentas_con_alias):
+                params[f'origen_excluida_{i}'] = cuenta
+                marcadores.append(f"%(origen_excluida_{i})s")
+            condicion += f" AND {tabla}.cuenta NOT IN ({', '.join(marcadores)})"
+        condiciones.append(f"({condicion})")
+    
+    if not condiciones:
+        return "1 = 0"
+    return "(" + " OR ".join(condiciones) + ")"
+
+def construir_filtros(tabla: str, params: Dict, cliente=None, origen=None, funnel=None, indice_alias=None) -> str:
+    """Condiciones " AND ..." de cliente, origen y funnel sobre stats_envios/stats_respuestas (alias tabla)."""
+    filtros = []
+    
+    if cliente:
+        filtros.append(f"{tabla}.cuenta = %(cliente)s")
+        params['cliente'] = cliente
+    
+    if origen:
+        # Filtrar por columnas indexadas en lugar de por la expresión COALESCE del alias
+        filtros.append(resolver_filtro_origen(origen, tabla, indice_alias or {}, params, cliente))
+    
+    if funnel:
+        filtros.append(f"{tabla}.funnel = %(funnel)s")
+        params['funnel'] = funnel
+    
+    return " AND " + " AND ".join(filtros) if filtros else ""
+
+def construir_consultas_dashboard(fecha_inicio: date, fecha_fin: date, cliente=None, origen=None, funnel=None, indice_alias=None,
+                                  ordenar_por_fecha: bool = False) -> Dict[str, Tuple[str, Dict]]:
+    """Construye las queries de envíos y respuestas para los filtros dados.
+    
+    indice_alias (ver obtener_indice_alias) solo hace falta cuando se filtra por origen.
+    ordenar_por_fecha añade ORDER BY fecha para la lectura por lotes (sin filtro de
+    origen lo resuelve el orden de idx_dashboard_fecha / idx_dashboard_cuenta).
+    """
+    # Construir parámetros con formato SQLAlchemy
+    params = {
+        'fecha_inicio': fecha_inicio,
+        'fecha_fin': fecha_fin
+    }
+    
+    # Construir filtros adicionales
+    where_envios = construir_filtros('e', params, cliente, origen, funnel, indice_alias)
+    where_respuestas = construir_filtros('r', params, cliente, origen, funnel, indice_alias)
+    
+    orden_envios = "\n    ORDER BY e.fecha" if ordenar_por_fecha else ""
+    orden_respuestas = "\n    ORDER BY r.fecha" if ordenar_por_fecha else ""
+    
+    # Query principal para envíos
+    query_envios = f"""
+    SELECT 
+        e.fecha,
+        e.cuenta as cliente,
+        e.funnel,
+        e.tipo_via,
+        e.identificador_via,
+        COALESCE(v.alias, CONCAT(e.tipo_via, ' - ', e.identificador_via)) as origen,
+        e.tipo_actividad,
+        e.enviados,
+        e.fallidos,
+        e.limite_alcanzado
+    FROM stats_envios e
+    LEFT JOIN vias_alias v ON (
+        e.cuenta = v.cuenta AND 
+        e.tipo_via = v.tipo_via AND 
+        e.identificador_via = v.identificador AND 
+        v.activo = TRUE
+    )
+    WHERE e.fecha BETWEEN %(fecha_inicio)s AND %(fecha_fin)s{where_envios}{orden_envios}
+    """
+    
+    # Query para respuestas
+    query_respuestas = f"""
+    SELECT 
+        r.fecha,
+        r.cuenta as cliente,
+        r.funnel,
+        r.tipo_via,
+        r.identificador_via,
+        COALESCE(v.alias, CONCAT(r.tipo_via, ' - ', r.identificador_via)) as origen,
+        r.total_respuestas,
+        r.cualificados,
+        r.interesados,
+        r.agendados
+    FROM stats_respuestas r
+    LEFT JOIN vias_alias v ON (
+        r.cuenta = v.cuenta AND 
+        r.tipo_via = v.tipo_via AND 
+        r.identificador_via = v.identificador AND 
+        v.activo = TRUE
+    )
+    WHERE r.fecha BETWEEN %(fecha_inicio)s AND %(fecha_fin)s{where_respuestas}{orden_respuestas}
+    """
+    
+    return {
+        'envios': (query_envios, params),
+        'respuestas': (query_respuestas, params)
+    }
+
+# Serie temporal: granularidad -> periodo de pandas con el que se agrupa la serie diaria
+# (semanas de lunes a domingo y meses naturales, etiquetados por su primer día)
+GRANULARIDADES_SERIE = {
+    'dia': 'D',
+    'semana': 'W-SUN',
+    'mes': 'M',
+}
+
+COLUMNAS_SERIE_TEMPORAL = ['fecha', 'enviados', 'fallidos', 'total_respuestas', 'cualificados', 'agendados']
+
+def granularidad_automatica(fecha_inicio: date, fecha_fin: date) -> str:
+    """Día hasta ~3 meses, semana hasta 2 años y mes a partir de ahí."""
+    dias = (fecha_fin - fecha_inicio).days + 1
+    if dias <= 92:
+        return 'dia'
+    if dias <= 731:
+        return 'semana'
+    return 'mes'
+
+def construir_serie_temporal(serie_envios: pd.DataFrame, serie_respuestas: pd.DataFrame,
+                             granularidad: str = 'dia') -> pd.DataFrame:
+    """Serie temporal por periodo a partir de las series diarias de obtener_datos_dashboard.
+    
+    Reutiliza lo ya cargado en lugar de volver a consultar MySQL; como sale de las
+    métricas, las respuestas son las mismas atribuidas en el resto del dashboard.
+    """
+    if serie_envios.empty:
+        return pd.DataFrame(columns=COLUMNAS_SERIE_TEMPORAL)
+    
+    diaria = serie_envios.merge(serie_respuestas, on='fecha', how='left') if not serie_respuestas.empty else serie_envios
+    diaria = diaria.reindex(columns=COLUMNAS_SERIE_TEMPORAL)
+    periodo = pd.to_datetime(diaria['fecha']).dt.to_period(GRANULARIDADES_SERIE[granularidad]).dt.start_time
+    serie = diaria.drop(columns='fecha').fillna(0).groupby(periodo.rename('fecha')).sum().reset_index()
+    return compactar_tipos(serie)
+
+# Puntos máximos por trazo en los gráficos temporales; por encima se reduce con LTTB
+MAX_PUNTOS_SERIE = int(os.getenv('DASHBOARD_MAX_PUNTOS_SERIE', '400'))
+
+# Por encima de estos puntos los trazos se dibujan sin marcadores
+MAX_PUNTOS_CON_MARCADORES = 120
+
+def indices_lttb(x: np.ndarray, y: np.ndarray, umbral: int) -> np.ndarray:
+    """Índices de los puntos que conserva Largest-Triangle-Three-Buckets.
+    
+    Mantiene el primero y el último y, de cada tramo intermedio, el punto que forma
+    el triángulo de mayor área con el elegido antes y la media del tramo siguiente,
+    de modo que los picos y valles se conservan.
+    """
+    n = len(x)
+    if umbral >= n or umbral < 3:
+        return np.arange(n)
+    
+    x = x.astype(float)
+    y = y.astype(float)
+    limites = np.linspace(1, n - 1, umbral - 1).astype(int)
+    elegidos = np.empty(umbral, dtype=int)
+    elegidos[0], elegidos[-1] = 0, n - 1
+    
+    a = 0
+    for i in range(umbral - 2):
+        inicio, fin = limites[i], limites[i + 1]
+        siguiente_fin = limites[i + 2] if i + 2 < len(limites) else n
+        media_x = x[fin:siguiente_fin].mean() if siguiente_fin > fin else x[-1]
+        media_y = y[fin:siguiente_fin].mean() if siguiente_fin > fin else y[-1]
         
-        df = execute_query(query, params)
-        return df['origen'].tolist() if not df.empty else []
-    except Exception as e:
-        st.error(f"Error obteniendo orígenes: {e}")
-        return []
+        areas = np.abs(
+            (x[a] - media_x) * (y[inicio:fin] - y[a]) - (x[a] - x[inicio:fin]) * (media_y - y[a])
+        )
+        a = inicio + int(np.argmax(areas))
+        elegidos[i + 1] = a
+    return elegidos
 
-@st.cache_data(ttl=300)
-def obtener_funnels_disponibles(cliente=None):
-    """Obtiene lista de funnels disponibles."""
-    try:
-        query = """
-        SELECT DISTINCT funnel
-        FROM stats_envios 
-        WHERE fecha >= DATE_SUB(CURRENT_DATE, INTERVAL 90 DAY)
-        """
+def reducir_serie(df_serie: pd.DataFrame, columna: str, max_puntos: int = MAX_PUNTOS_SERIE) -> Tuple[pd.Series, pd.Series]:
+    """(x, y) de una columna de la serie temporal, reducida con LTTB si supera max_puntos."""
+    if len(df_serie) <= max_puntos:
+        return df_serie['fecha'], df_serie[columna]
+    
+    x = pd.to_datetime(df_serie['fecha']).to_numpy().astype('datetime64[s]').astype(np.int64)
+    indices = indices_lttb(x, df_serie[columna].to_numpy(), max_puntos)
+    return df_serie['fecha'].iloc[indices], df_serie[columna].iloc[indices]
+
+# Lectura por lotes de ventanas largas sin resumen_diario (DASHBOARD_DIAS_LECTURA_POR_LOTES=0 la desactiva)
+DIAS_LECTURA_POR_LOTES = int(os.getenv('DASHBOARD_DIAS_LECTURA_POR_LOTES', '90'))
+TAMANO_LOTE = int(os.getenv('DASHBOARD_TAMANO_LOTE', '50000'))
+
+# Series diarias de envíos y respuestas que devuelve obtener_datos_dashboard, a partir de las métricas
+SERIE_ENVIOS = {'total_enviados': 'enviados', 'total_fallidos': 'fallidos', 'limites_alcanzados': 'limite_alcanzado'}
+SERIE_RESPUESTAS = {
+    'total_respuestas': 'total_respuestas', 'total_cualificados': 'cualificados',
+    'total_interesados': 'interesados', 'total_agendados': 'agendados'
+}
+
+def usar_lectura_por_lotes(fecha_inicio: date, fecha_fin: date, origen=None) -> bool:
+    """Ventanas de más de DIAS_LECTURA_POR_LOTES días sin filtro de origen (con él hay pocas filas)."""
+    dias = (fecha_fin - fecha_inicio).days + 1
+    return bool(DIAS_LECTURA_POR_LOTES) and origen is None and dias > DIAS_LECTURA_POR_LOTES
+
+def dias_completos(lotes):
+    """Reagrupa lotes ordenados por fecha en bloques que solo contienen días completos.
+    
+    El último día de cada lote puede continuar en el siguiente, así que se retiene
+    hasta que llega un lote con una fecha posterior.
+    """
+    pendiente = None
+    for lote in lotes:
+        if pendiente is not None:
+            lote = pd.concat([pendiente, lote], ignore_index=True)
+        completo = (lote['fecha'] != lote['fecha'].iloc[-1]).to_numpy()
+        pendiente = lote[~completo]
+        if completo.any():
+            yield lote[completo]
+    if pendiente is not None and not pendiente.empty:
+        yield pendiente
+
+def plegar(acumulado: Optional[pd.DataFrame], parcial: pd.DataFrame, claves: List[str], columnas: List[str]) -> pd.DataFrame:
+    """Suma un agregado parcial al acumulado por las claves dadas."""
+    parcial = parcial.groupby(claves, sort=False, dropna=False, observed=True)[columnas].sum().reset_index()
+    if acumulado is None:
+        return parcial
+    return pd.concat([acumulado, parcial], ignore_index=True).groupby(
+        claves, sort=False, dropna=False, observed=True
+    )[columnas].sum().reset_index()
+
+def obtener_metricas_por_lotes(consultas: Dict[str, Tuple[str, Dict]], dimensiones: List[str] = DIMENSIONES_METRICAS) -> pd.DataFrame:
+    """Lee envíos y respuestas ordenados por fecha con cursores de servidor y los pliega día a día.
+    
+    La atribución de respuestas solo cruza filas del mismo día, así que cada bloque de
+    días completos se convierte en métricas parciales que se suman a las acumuladas.
+    En memoria solo quedan un lote y los agregados por dimensión.
+    """
+    # Las dos conexiones del pool se reservan a la vez (ver iterar_queries)
+    with iterar_queries([consultas['envios'], consultas['respuestas']], tamano_lote=TAMANO_LOTE) as (envios, respuestas):
+        metricas = plegar_por_dias(dias_completos(envios), dias_completos(respuestas), dimensiones)
+    
+    if metricas is None:
+        return construir_metricas(pd.DataFrame(), pd.DataFrame(), dimensiones)
+    metricas[CONTADORES_METRICAS] = metricas[CONTADORES_METRICAS].astype('int64')
+    return calcular_tasas(metricas)
+
+def plegar_por_dias(lotes_envios, lotes_respuestas, dimensiones: List[str]) -> Optional[pd.DataFrame]:
+    """Avanza los dos flujos de días completos a la par y acumula sus métricas parciales."""
+    metricas = None
+    respuestas = pd.DataFrame()
+    respuestas_agotadas = False
+    
+    for envios in lotes_envios:
+        hasta = envios['fecha'].iloc[-1]
         
-        params = {}
-        if cliente:
-            query += " AND cuenta = %(cliente)s"
-            params['cliente'] = cliente
+        # Avanzar las respuestas hasta cubrir los mismos días que el bloque de envíos
+        while not respuestas_agotadas and (respuestas.empty or respuestas['fecha'].iloc[-1] <= hasta):
+            siguiente = next(lotes_respuestas, None)
+            if siguiente is None:
+                respuestas_agotadas = True
+            else:
+                respuestas = pd.concat([respuestas, siguiente], ignore_index=True)
         
-        query += " GROUP BY funnel ORDER BY COUNT(*) DESC"
+        if respuestas.empty:
+            bloque_respuestas = respuestas
+        else:
+            en_bloque = (respuestas['fecha'] <= hasta).to_numpy()
+            bloque_respuestas, respuestas = respuestas[en_bloque], respuestas[~en_bloque]
         
-        return execute_query_list(query, params)
-    except Exception as e:
-        st.error(f"Error obteniendo funnels: {e}")
-        return []
+        parcial = construir_metricas(envios, bloque_respuestas, dimensiones)
+        if not parcial.empty:
+            metricas = plegar(metricas, parcial, dimensiones, CONTADORES_METRICAS)
+    
+    # Las respuestas de días sin envíos no se atribuyen: el cursor se cierra al salir
+    return metricas
+
+def cargar_metricas_diarias(fecha_inicio: date, fecha_fin: date, cliente=None, origen=None, funnel=None,
+                            version: str = '') -> pd.DataFrame:
+    """Métricas por día (DIMENSIONES_DIARIAS) de un tramo de fechas, desde resumen_diario o las tablas base."""
+    if resumen_diario_disponible():
+        query, params = construir_consulta_resumen_diario(fecha_inicio, fecha_fin, cliente, origen, funnel)
+        df_resumen = consultar(query, params, version)
+        # Las respuestas del resumen ya vienen atribuidas a la actividad principal
+        if df_resumen.empty:
+            return construir_metricas(df_resumen, df_resumen, DIMENSIONES_DIARIAS)
+        return agregar_metricas(df_resumen, DIMENSIONES_DIARIAS)
+    
+    indice_alias = obtener_indice_alias(version) if origen else {}
+    por_lotes = usar_lectura_por_lotes(fecha_inicio, fecha_fin, origen)
+    consultas = construir_consultas_dashboard(
+        fecha_inicio, fecha_fin, cliente, origen, funnel, indice_alias, ordenar_por_fecha=por_lotes
+    )
+    
+    if por_lotes:
+        # Tramos largos: memoria acotada por los agregados, no por las filas leídas
+        return obtener_metricas_por_lotes(consultas, DIMENSIONES_DIARIAS)
+    
+    # Una lectura por tabla, en paralelo; las métricas se agregan en memoria
+    resultados = ejecutar_consultas(consultas, version)
+    return construir_metricas(resultados['envios'], resultados['respuestas'], DIMENSIONES_DIARIAS)
+
+def serie_diaria(df_diario: pd.DataFrame, columnas: Dict[str, str]) -> pd.DataFrame:
+    """Suma por fecha las columnas indicadas de las métricas diarias, con los nombres de la serie."""
+    if df_diario.empty:
+        return pd.DataFrame()
+    return df_diario.groupby('fecha', observed=True)[list(columnas)].sum().rename(columns=columnas).reset_index()
 
 @st.cache_data(ttl=300)
-def obtener_datos_dashboard(fecha_inicio: date, fecha_fin: date, cliente=None, origen=None, funnel=None):
-    """Obtiene todos los datos necesarios para el dashboard."""
+def obtener_datos_dashboard(fecha_inicio: date, fecha_fin: date, cliente=None, origen=None, funnel=None, version: str = ''):
+    """Obtiene todos los datos necesarios para el dashboard.
+    
+    version (ver version_datos) forma parte de la clave de caché: cuando cambian los
+    datos del cliente la entrada deja de usarse sin tocar el resto.
+    
+    Las métricas se guardan por día en la caché de particiones: solo se consultan los
+    días del rango que no estén ya guardados para los mismos filtros o cuya versión
+    diaria (obtener_versiones_por_dia) haya cambiado. La versión del cliente no forma
+    parte de la clave de las particiones: la carga de hoy solo invalida el día de hoy.
+    Devuelve las series diarias de envíos y respuestas y df_metricas.
+    """
     
     try:
-        # Construir parámetros con formato SQLAlchemy
-        params = {
-            'fecha_inicio': fecha_inicio,
-            'fecha_fin': fecha_fin
-        }
-        
-        # Construir filtros adicionales
-        filtros_envios = []
-        filtros_respuestas = []
-        
-        if cliente:
-            filtros_envios.append("e.cuenta = %(cliente)s")
-            filtros_respuestas.append("r.cuenta = %(cliente)s")
-            params['cliente'] = cliente
+        particiones = obtener_cache_particiones()
+        fuente = 'resumen_diario' if resumen_diario_disponible() else 'tablas'
+        # Los alias cambian el origen de todos los días: su versión sí va en la clave
+        clave = cache_key('metricas_diarias', fuente, cliente, origen, funnel, version_datos(cliente, ['vias_alias']))
+        versiones = obtener_versiones_por_dia(fecha_inicio, fecha_fin, cliente, fuente)
         
-        if origen:
-            filtros_envios.append("COALESCE(v.alias, CONCAT(e.tipo_via, ' - ', e.identificador_via)) = %(origen)s")
-            filtros_respuestas.append("COALESCE(v.alias, CONCAT(r.tipo_via, ' - ', r.identificador_via)) = %(origen)s")
-            params['origen'] = origen
+        # Un solo tramo por hueco: un rango nuevo entero es una única consulta
+        for inicio, fin in tramos_consecutivos(particiones.dias_pendientes(clave, fecha_inicio, fecha_fin, versiones)):
+            df_tramo = compactar_tipos(cargar_metricas_diarias(inicio, fin, cliente, origen, funnel, version))
+            particiones.guardar(clave, inicio, fin, df_tramo, versiones)
         
-        if funnel:
-            filtros_envios.append("e.funnel = %(funnel)s")
-            filtros_respuestas.append("r.funnel = %(funnel)s")
-            params['funnel'] = funnel
-        
-        where_envios = " AND " + " AND ".join(filtros_envios) if filtros_envios else ""
-        where_respuestas = " AND " + " AND ".join(filtros_respuestas) if filtros_respuestas else ""
-        
-        # Query principal para envíos
-        query_envios = f"""
-        SELECT 
-            e.fecha,
-            e.cuenta as cliente,
-            e.funnel,
-            e.tipo_via,
-            e.identificador_via,
-            COALESCE(v.alias, CONCAT(e.tipo_via, ' - ', e.identificador_via)) as origen,
-            e.tipo_actividad,
-            e.enviados,
-            e.fallidos,
-            e.limite_alcanzado,
-            e.ultimo_envio
-        FROM stats_envios e
-        LEFT JOIN vias_alias v ON (
-            e.cuenta = v.cuenta AND 
-            e.tipo_via = v.tipo_via AND 
-            e.identificador_via = v.identificador AND 
-            v.activo = TRUE
+        df_diario = particiones.leer(clave, fecha_inicio, fecha_fin)
+        if df_diario is None:
+            # Días expulsados antes de leerlos (rango mayor que el presupuesto de la caché)
+            df_diario = compactar_tipos(cargar_metricas_diarias(fecha_inicio, fecha_fin, cliente, origen, funnel, version))
+        return (
+            compactar_tipos(serie_diaria(df_diario, SERIE_ENVIOS)),
+            compactar_tipos(serie_diaria(df_diario, SERIE_RESPUESTAS)),
+            compactar_tipos(reagregar_metricas(df_diario))
         )
-        WHERE e.fecha BETWEEN %(fecha_inicio)s AND %(fecha_fin)s{where_envios}
-        ORDER BY e.fecha DESC
-        """
-        
-        # Query para respuestas
-        query_respuestas = f"""
-        SELECT 
-            r.fecha,
-            r.cuenta as cliente,
-            r.funnel,
-            r.tipo_via,
-            r.identificador_via,
-            COALESCE(v.alias, CONCAT(r.tipo_via, ' - ', r.identificador_via)) as origen,
-            r.total_respuestas,
-            r.cualificados,
-            r.interesados,
-            r.no_interesados,
-            r.agendados,
-            r.no_cualifica,
-            r.respuestas_automaticas,
-            r.otros
-        FROM stats_respuestas r
-        LEFT JOIN vias_alias v ON (
-            r.cuenta = v.cuenta AND 
-            r.tipo_via = v.tipo_via AND 
-            r.identificador_via = v.identificador AND 
-            v.activo = TRUE
-        )
-        WHERE r.fecha BETWEEN %(fecha_inicio)s AND %(fecha_fin)s{where_respuestas}
-        ORDER BY r.fecha DESC
-        """
-        
-        # Query para métricas agregadas
-        query_metricas = f"""
-        SELECT 
-            e.cuenta as cliente,
-            COALESCE(v.alias, CONCAT(e.tipo_via, ' - ', e.identificador_via)) as origen,
-            e.funnel,
-            e.tipo_via,
-            e.tipo_actividad,
-            SUM(e.enviados) as total_enviados,
-            SUM(e.fallidos) as total_fallidos,
-            SUM(e.limite_alcanzado) as limites_alcanzados,
-            COALESCE(SUM(r.total_respuestas), 0) as total_respuestas,
-            COALESCE(SUM(r.cualificados), 0) as total_cualificados,
-            COALESCE(SUM(r.interesados), 0) as total_interesados,
-            COALESCE(SUM(r.agendados), 0) as total_agendados,
-            CASE 
-                WHEN SUM(e.enviados) > 0 THEN 
-                    ROUND((COALESCE(SUM(r.total_respuestas), 0) / SUM(e.enviados)) * 100, 2)
-                ELSE 0 
-            END as tasa_respuesta,
-            CASE 
-                WHEN SUM(e.enviados) > 0 THEN 
-                    ROUND((COALESCE(SUM(r.agendados), 0) / SUM(e.enviados)) * 100, 2)
-                ELSE 0 
-            END as tasa_conversion,
-            CASE 
-                WHEN SUM(e.enviados) > 0 THEN 
-                    ROUND(((SUM(e.enviados) - SUM(e.fallidos)) / SUM(e.enviados)) * 100, 2)
-                ELSE 0 
-            END as tasa_entrega
-        FROM stats_envios e
-        LEFT JOIN vias_alias v ON (
-            e.cuenta = v.cuenta AND 
-            e.tipo_via = v.tipo_via AND 
-            e.identificador_via = v.identificador AND 
-            v.activo = TRUE
-        )
-        LEFT JOIN stats_respuestas r ON (
-            e.fecha = r.fecha AND 
-            e.cuenta = r.cuenta AND 
-            e.funnel = r.funnel AND 
-            e.tipo_via = r.tipo_via AND 
-            e.identificador_via = r.identificador_via
-        )
-        WHERE e.fecha BETWEEN %(fecha_inicio)s AND %(fecha_fin)s{where_envios}
-        GROUP BY e.cuenta, COALESCE(v.alias, CONCAT(e.tipo_via, ' - ', e.identificador_via)), e.funnel, e.tipo_via, e.tipo_actividad
-        """
-        
-        # Ejecutar queries usando SQLAlchemy
-        df_envios = execute_query(query_envios, params)
-        df_respuestas = execute_query(query_respuestas, params)
-        df_metricas = execute_query(query_metricas, params)
-        
-        return df_envios, df_respuestas, df_metricas
         
     except Exception as e:
         st.error(f"Error obteniendo datos del dashboard: {e}")
@@ -678,32 +1309,52 @@ def render_advanced_filters():
     # Filtros de segmentación
     st.sidebar.markdown("### 🎯 Segmentación")
     
+    # Las tres listas salen del mismo índice de coocurrencias (versión global de los
+    # datos): cada selector se acota con los demás y con el rango de fechas en memoria,
+    # así que cambiar un filtro no consulta la base de datos
+    indice = obtener_indice_opciones(version_datos())
+    
+    # Valores de la ejecución anterior; los que ya no combinan con el resto vuelven a "Todos"
+    filtros = {}
+    for dimension, todos in ETIQUETAS_TODOS.items():
+        valor = st.session_state.get(f"filtro_{dimension}", todos)
+        filtros[dimension] = None if valor == todos else valor
+    for dimension, todos in ETIQUETAS_TODOS.items():
+        if filtros[dimension] is not None and filtros[dimension] not in opciones_filtro(
+            indice, dimension, fecha_inicio, fecha_fin, filtros
+        ):
+            filtros[dimension] = None
+            st.session_state[f"filtro_{dimension}"] = todos
+    
     # Filtro de cliente
-    clientes = obtener_clientes_disponibles()
+    clientes = opciones_filtro(indice, 'cliente', fecha_inicio, fecha_fin, filtros)
     cliente_seleccionado = st.sidebar.selectbox(
         "👤 Cliente",
-        ["Todos los clientes"] + clientes,
+        [ETIQUETAS_TODOS['cliente']] + clientes,
+        key="filtro_cliente",
         help="Filtra por cliente específico"
     )
-    cliente = None if cliente_seleccionado == "Todos los clientes" else cliente_seleccionado
+    cliente = None if cliente_seleccionado == ETIQUETAS_TODOS['cliente'] else cliente_seleccionado
     
-    # Filtro de origen (dependiente del cliente)
-    origenes = obtener_origenes_disponibles(cliente)
+    # Filtro de origen (dependiente del cliente y del funnel)
+    origenes = opciones_filtro(indice, 'origen', fecha_inicio, fecha_fin, filtros)
     origen_seleccionado = st.sidebar.selectbox(
         "📍 Origen",
-        ["Todos los orígenes"] + origenes,
+        [ETIQUETAS_TODOS['origen']] + origenes,
+        key="filtro_origen",
         help="Filtra por origen específico (email, LinkedIn, etc.)"
     )
-    origen = None if origen_seleccionado == "Todos los orígenes" else origen_seleccionado
+    origen = None if origen_seleccionado == ETIQUETAS_TODOS['origen'] else origen_seleccionado
     
-    # Filtro de funnel
-    funnels = obtener_funnels_disponibles(cliente)
+    # Filtro de funnel (dependiente del cliente y del origen)
+    funnels = opciones_filtro(indice, 'funnel', fecha_inicio, fecha_fin, filtros)
     funnel_seleccionado = st.sidebar.selectbox(
         "🎯 Funnel",
-        ["Todos los funnels"] + funnels,
+        [ETIQUETAS_TODOS['funnel']] + funnels,
+        key="filtro_funnel",
         help="Filtra por funnel/campaña específica"
     )
-    funnel = None if funnel_seleccionado == "Todos los funnels" else funnel_seleccionado
+    funnel = None if funnel_seleccionado == ETIQUETAS_TODOS['funnel'] else funnel_seleccionado
     
     # Información del filtro activo
     st.sidebar.markdown("---")
@@ -720,181 +1371,328 @@ def render_advanced_filters():
     **Días**: {(fecha_fin - fecha_inicio).days + 1}
     """)
     
-    # Botón de actualización
+    # Botón de actualización: relee las versiones de los datos, así que solo se
+    # recargan las combinaciones de filtros cuyos datos han cambiado
     if st.sidebar.button("🔄 Actualizar Dashboard", type="primary"):
-        st.cache_data.clear()
+        obtener_versiones_datos.clear()
+        obtener_salud_conexion().invalidar()
         st.rerun()
     
     return fecha_inicio, fecha_fin, cliente, origen, funnel
 
+def render_connection_status(estado: EstadoConexion):
+    """Muestra en el sidebar el último estado conocido de la conexión y la ocupación del pool."""
+    if estado.disponible:
+        icono, texto = "🟢", "Base de datos conectada"
+    else:
+        icono, texto = "🔴", "Base de datos no disponible"
+    st.sidebar.caption(f"{icono} {texto} · comprobado hace {int(estado.antiguedad)} s")
+    
+    pool = estadisticas_pool()
+    aviso = f" · ⚠️ {pool['timeouts']} esperas agotadas" if pool['timeouts'] else ""
+    st.sidebar.caption(f"🔌 Pool: {pool['en_uso']}/{pool['tamano']} en uso (máx. {pool['max_en_uso']}){aviso}")
+
+def render_reintento_conexion():
+    """Botón del sidebar que descarta el estado de conexión y vuelve a comprobarlo al momento."""
+    if st.sidebar.button("🔄 Reintentar conexión", type="primary", key="reintentar_conexion"):
+        obtener_salud_conexion().invalidar()
+        st.rerun()
+
+# Umbrales (excelente, buena) de cada tasa para los indicadores de rendimiento
+UMBRALES_RENDIMIENTO = {
+    'tasa_respuesta': (10, 5),
+    'tasa_conversion': (3, 1),
+    'tasa_entrega': (95, 90),
+    'tasa_cualificacion': (30, 20),
+}
+
+# Por nivel (0 excelente, 1 buena, 2 mejorable): clase CSS y texto
+CLASES_RENDIMIENTO = np.array(['good', 'warning', 'danger'])
+TEXTOS_RENDIMIENTO = np.array(['🟢 Excelente', '🟡 Buena', '🔴 Mejorable'])
+INDICADORES_RENDIMIENTO = np.array([
+    f'<span class="performance-indicator performance-{clase}">{texto}</span>'
+    for clase, texto in zip(CLASES_RENDIMIENTO, TEXTOS_RENDIMIENTO)
+])
+
+def niveles_rendimiento(valores, metric_type) -> np.ndarray:
+    """Nivel de rendimiento de cada valor de una tasa, clasificado de una vez con np.select."""
+    excelente, buena = UMBRALES_RENDIMIENTO[metric_type]
+    valores = np.asarray(valores, dtype=float)
+    return np.select([valores > excelente, valores > buena], [0, 1], default=2)
+
 def get_performance_indicator(value, metric_type):
     """Devuelve un indicador de rendimiento basado en el valor y tipo de métrica."""
-    if metric_type == "tasa_respuesta":
-        if value > 10:
-            return '<span class="performance-indicator performance-good">🟢 Excelente</span>'
-        elif value > 5:
-            return '<span class="performance-indicator performance-warning">🟡 Buena</span>'
-        else:
-            return '<span class="performance-indicator performance-danger">🔴 Mejorable</span>'
-    elif metric_type == "tasa_conversion":
-        if value > 3:
-            return '<span class="performance-indicator performance-good">🟢 Excelente</span>'
-        elif value > 1:
-            return '<span class="performance-indicator performance-warning">🟡 Buena</span>'
-        else:
-            return '<span class="performance-indicator performance-danger">🔴 Mejorable</span>'
-    elif metric_type == "tasa_entrega":
-        if value > 95:
-            return '<span class="performance-indicator performance-good">🟢 Excelente</span>'
-        elif value > 90:
-            return '<span class="performance-indicator performance-warning">🟡 Buena</span>'
-        else:
-            return '<span class="performance-indicator performance-danger">🔴 Mejorable</span>'
-    return ""
+    if metric_type not in UMBRALES_RENDIMIENTO:
+        return ""
+    return str(INDICADORES_RENDIMIENTO[niveles_rendimiento([value], metric_type)[0]])
+
+def anotar_indicadores(df: pd.DataFrame) -> pd.DataFrame:
+    """Añade indicador_<tasa> (HTML) para tasa_respuesta, tasa_conversion y tasa_entrega."""
+    for tasa in COLUMNAS_TASAS:
+        df[f'indicador_{tasa}'] = INDICADORES_RENDIMIENTO[niveles_rendimiento(df[tasa], tasa)]
+    return df
+
+def tarjeta_html(valor: str, etiqueta: str, estilo: str = '', pie: str = '', clase: str = 'metric-enhanced') -> str:
+    """Una tarjeta de métrica (valor, etiqueta y pie opcional) en una línea de HTML."""
+    atributo_estilo = f' style="{estilo}"' if estilo else ''
+    return (
+        f'<div class="{clase}"><div class="metric-value"{atributo_estilo}>{valor}</div>'
+        f'<div class="metric-label">{etiqueta}</div>{pie}</div>'
+    )
+
+def rejilla_html(tarjetas: List[str], columnas: Optional[int] = None) -> str:
+    """Coloca las tarjetas en una rejilla CSS (por defecto una fila)."""
+    columnas = columnas or len(tarjetas)
+    return f'<div class="metric-grid" style="grid-template-columns: repeat({columnas}, 1fr);">{"".join(tarjetas)}</div>'
+
+def color_limites(limites) -> str:
+    return "color: #dc3545;" if limites > 0 else "color: #28a745;"
+
+def html_tasas(fila: Dict) -> str:
+    """Tarjetas de tasa de entrega, respuesta y conversión de un nodo de la jerarquía."""
+    return rejilla_html([
+        tarjeta_html(f"{fila['tasa_entrega']:.1f}%", "📊 Tasa Entrega"),
+        tarjeta_html(f"{fila['tasa_respuesta']:.1f}%", "📊 Tasa Respuesta"),
+        tarjeta_html(f"{fila['tasa_conversion']:.1f}%", "📊 Tasa Conversión"),
+    ])
+
+def html_resumen(titulo: str, fila: Dict, con_tasas: bool = True) -> str:
+    """Resumen de cliente u origen: título con indicadores, contadores y, si se pide, tasas."""
+    indicadores = " ".join(fila[f'indicador_{tasa}'] for tasa in ['tasa_respuesta', 'tasa_conversion', 'tasa_entrega'])
+    contadores = rejilla_html([
+        tarjeta_html(f"{fila['total_enviados']:,}", "📤 Enviados"),
+        tarjeta_html(f"{fila['total_respuestas']:,}", "💬 Respuestas"),
+        tarjeta_html(f"{fila['total_cualificados']:,}", "🎯 Cualificados"),
+        tarjeta_html(f"{fila['total_agendados']:,}", "🗓️ Agendados"),
+        tarjeta_html(f"{fila['limites_alcanzados']:,}", "⚠️ Límites", color_limites(fila['limites_alcanzados'])),
+    ])
+    return (
+        f'<div class="summary-container"><div class="summary-title">{titulo}<br>'
+        f'<small style="font-size: 0.9rem; color: #666;">{indicadores}</small></div>'
+        f'{contadores}{html_tasas(fila) if con_tasas else ""}</div>'
+    )
+
+def html_origen(fila: Dict, con_indicadores: bool = True) -> str:
+    """Contenido del desplegable de un origen: indicadores y contadores principales."""
+    bloques = []
+    if con_indicadores:
+        bloques.append(
+            f'<div class="context-info"><strong>📊 Rendimiento:</strong> '
+            f'{fila["indicador_tasa_respuesta"]} {fila["indicador_tasa_conversion"]}</div>'
+        )
+    bloques.append(rejilla_html([
+        tarjeta_html(f"{fila['total_enviados']:,}", "📤 Enviados"),
+        tarjeta_html(f"{fila['total_respuestas']:,}", "💬 Respuestas"),
+        tarjeta_html(f"{fila['total_agendados']:,}", "🗓️ Agendados"),
+        tarjeta_html(f"{fila['limites_alcanzados']:,}", "⚠️ Límites", color_limites(fila['limites_alcanzados'])),
+    ]))
+    return "".join(bloques)
+
+def html_actividad(fila: Dict, con_indicadores: bool = True) -> str:
+    """Contenido del desplegable de una actividad: indicadores, contadores y tasas."""
+    bloques = []
+    if con_indicadores:
+        bloques.append(
+            f'<div class="context-info"><strong>📊 Rendimiento:</strong> {fila["indicador_tasa_respuesta"]} '
+            f'{fila["indicador_tasa_conversion"]} {fila["indicador_tasa_entrega"]}</div>'
+        )
+    bloques.append(rejilla_html([
+        tarjeta_html(f"{fila['total_enviados']:,}", "📤 Enviados"),
+        tarjeta_html(f"{fila['total_fallidos']:,}", "❌ Fallidos", "color: #dc3545;"),
+        tarjeta_html(f"{fila['total_respuestas']:,}", "💬 Respuestas"),
+        tarjeta_html(f"{fila['total_cualificados']:,}", "🎯 Cualificados"),
+        tarjeta_html(f"{fila['total_agendados']:,}", "🗓️ Agendados", "color: #28a745;"),
+        tarjeta_html(f"{fila['limites_alcanzados']:,}", "⚠️ Límites", color_limites(fila['limites_alcanzados'])),
+    ]))
+    bloques.append('<div class="visual-divider"></div>')
+    bloques.append(html_tasas(fila))
+    return "".join(bloques)
+
+def html_actividad_unica(fila: Dict) -> str:
+    """Aviso de actividad única de un origen, con sus indicadores y tasas."""
+    return (
+        f'<div class="context-info"><strong>🎯 Actividad única:</strong> {fila["tipo_actividad"]}<br>'
+        f'<strong>📊 Rendimiento:</strong> {fila["indicador_tasa_respuesta"]} '
+        f'{fila["indicador_tasa_conversion"]} {fila["indicador_tasa_entrega"]}</div>'
+        f'{html_tasas(fila)}'
+    )
+
+def titulo_nodo(icono: str, nombre: str, fila: Dict) -> str:
+    """Título del desplegable de un origen o actividad."""
+    return (
+        f"{icono} **{nombre}** - {fila['total_enviados']:,} enviados | "
+        f"{fila['tasa_respuesta']:.1f}% respuesta | {fila['tasa_conversion']:.1f}% conversión"
+    )
 
-def render_hierarchical_view(df_metricas):
-    """Renderiza vista jerárquica desplegable: Cuenta > Origen > Actividad."""
+# Niveles de la vista jerárquica: Cuenta > Origen > Actividad
+NIVELES_JERARQUIA = ['cliente', 'origen', 'tipo_actividad']
+
+CONTADORES_JERARQUIA = [
+    'total_enviados', 'total_fallidos', 'total_respuestas',
+    'total_cualificados', 'total_agendados', 'limites_alcanzados'
+]
+
+def construir_jerarquia(df_metricas: pd.DataFrame) -> Dict[str, Dict]:
+    """Calcula los totales de los tres niveles de la vista jerárquica en una pasada.
+    
+    Equivale a GROUPING SETS ((cliente, origen, tipo_actividad), (cliente, origen), (cliente)):
+    el nivel actividad se agrupa desde df_metricas y cada nivel superior se suma desde
+    el anterior. Devuelve diccionarios (en orden alfabético) para consultar cada nodo
+    sin volver a filtrar: clientes[cliente], origenes[cliente][origen] y
+    actividades[(cliente, origen)][tipo_actividad].
+    """
+    actividades = df_metricas.groupby(NIVELES_JERARQUIA, observed=True).agg({
+        **{columna: 'sum' for columna in CONTADORES_JERARQUIA},
+        'tasa_respuesta': 'mean',
+        'tasa_conversion': 'mean',
+        'tasa_entrega': 'mean'
+    }).reset_index()
+    origenes = calcular_tasas(
+        actividades.groupby(NIVELES_JERARQUIA[:2], observed=True)[CONTADORES_JERARQUIA].sum().reset_index()
+    )
+    clientes = calcular_tasas(
+        origenes.groupby('cliente', observed=True)[CONTADORES_JERARQUIA].sum().reset_index()
+    )
+    
+    # Indicadores de rendimiento de todos los nodos, clasificados por columnas
+    for nivel in (actividades, origenes, clientes):
+        anotar_indicadores(nivel)
+    
+    jerarquia = {'clientes': {}, 'origenes': {}, 'actividades': {}}
+    for fila in clientes.to_dict('records'):
+        jerarquia['clientes'][fila['cliente']] = fila
+        jerarquia['origenes'][fila['cliente']] = {}
+    for fila in origenes.to_dict('records'):
+        jerarquia['origenes'][fila['cliente']][fila['origen']] = fila
+        jerarquia['actividades'][(fila['cliente'], fila['origen'])] = {}
+    for fila in actividades.to_dict('records'):
+        jerarquia['actividades'][(fila['cliente'], fila['origen'])][fila['tipo_actividad']] = fila
+    return jerarquia
+
+@dataclass(frozen=True)
+class ContextoMetricas:
+    """Agregados de df_metricas que comparten las secciones del dashboard."""
+    df_metricas: pd.DataFrame
+    totales: Dict[str, float]  # contadores globales, total_entregados y tasas
+    por_cliente: pd.DataFrame  # CONTADORES_JERARQUIA, tasas y tasa_conversion_media
+    por_origen: pd.DataFrame  # por (origen, tipo_via)
+    por_tipo_via: pd.DataFrame
+    jerarquia: Dict[str, Dict]  # ver construir_jerarquia
+
+def agregar_por(df: pd.DataFrame, dimensiones: List[str]) -> pd.DataFrame:
+    """Suma CONTADORES_JERARQUIA por las dimensiones, calcula las tasas y ordena por volumen."""
+    agregado = calcular_tasas(df.groupby(dimensiones, observed=True)[CONTADORES_JERARQUIA].sum().reset_index())
+    return agregado.sort_values('total_enviados', ascending=False)
+
+def calcular_totales(df_metricas: pd.DataFrame) -> Dict[str, float]:
+    """Contadores globales de df_metricas y sus tasas (0 cuando el divisor es 0)."""
+    totales = {columna: int(df_metricas[columna].sum()) for columna in CONTADORES_JERARQUIA}
+    enviados = totales['total_enviados']
+    respuestas = totales['total_respuestas']
+    totales['total_entregados'] = enviados - totales['total_fallidos']
+    totales['tasa_entrega'] = (totales['total_entregados'] / enviados * 100) if enviados > 0 else 0
+    totales['tasa_respuesta'] = (respuestas / enviados * 100) if enviados > 0 else 0
+    totales['tasa_cualificacion'] = (totales['total_cualificados'] / respuestas * 100) if respuestas > 0 else 0
+    totales['tasa_conversion'] = (totales['total_agendados'] / enviados * 100) if enviados > 0 else 0
+    return totales
+
+def construir_contexto_metricas(df_metricas: pd.DataFrame) -> ContextoMetricas:
+    """Calcula de una vez los totales y agregados que leen los render_*."""
+    por_cliente = agregar_por(df_metricas, ['cliente'])
+    # Las alertas comparan clientes por la media de las tasas de sus filas
+    por_cliente['tasa_conversion_media'] = por_cliente['cliente'].map(
+        df_metricas.groupby('cliente', observed=True)['tasa_conversion'].mean()
+    ).astype(float)
+    por_origen = agregar_por(df_metricas, ['origen', 'tipo_via'])
+    
+    return ContextoMetricas(
+        df_metricas=df_metricas,
+        totales=calcular_totales(df_metricas),
+        por_cliente=por_cliente,
+        por_origen=por_origen,
+        por_tipo_via=agregar_por(por_origen, ['tipo_via']),
+        jerarquia=construir_jerarquia(df_metricas)
+    )
+
+@st.cache_resource(max_entries=16)
+def _contexto_metricas(huella: str, _df_metricas: pd.DataFrame) -> ContextoMetricas:
+    # Clave: solo la huella (los argumentos con "_" no se hashean)
+    return construir_contexto_metricas(_df_metricas)
+
+def obtener_contexto_metricas(df_metricas: pd.DataFrame) -> ContextoMetricas:
+    """Contexto de métricas memoizado por huella de contenido de df_metricas."""
+    return _contexto_metricas(huella_dataframe(df_metricas), df_metricas)
+
+def contenedor_abierto(contenedor) -> bool:
+    """Indica si hay que rellenar un st.tabs/st.expander creado con on_change="rerun".
+    
+    Los contenedores con estado exponen .open; el contenido de los cerrados no se
+    calcula hasta que el usuario los abre. Si no hay estado (.open es None) se
+    rellenan siempre.
+    """
+    return getattr(contenedor, 'open', None) is not False
+
+def render_origenes(cliente: str, origenes_cliente: Dict[str, Dict], con_indicadores: bool = True):
+    """Un desplegable por origen; solo se rellena (con un único bloque HTML) el que está abierto."""
+    for origen, origen_fila in origenes_cliente.items():
+        expander = st.expander(titulo_nodo("📍", origen, origen_fila), expanded=False, key=f"jerarquia_{cliente}_{origen}", on_change="rerun")
+        if not contenedor_abierto(expander):
+            continue
+        with expander:
+            st.markdown(html_origen(origen_fila, con_indicadores), unsafe_allow_html=True)
+
+def render_actividades(cliente: str, origen: str, origen_data: Dict[str, Dict], con_indicadores: bool = True):
+    """Un desplegable por actividad del origen, o el detalle directo si solo hay una."""
+    if len(origen_data) == 1:
+        st.markdown(html_actividad_unica(next(iter(origen_data.values()))), unsafe_allow_html=True)
+        return
+    
+    for actividad, actividad_data in origen_data.items():
+        expander = st.expander(titulo_nodo("🎯", actividad, actividad_data), expanded=False, key=f"jerarquia_{cliente}_{origen}_{actividad}", on_change="rerun")
+        if not contenedor_abierto(expander):
+            continue
+        with expander:
+            st.markdown(html_actividad(actividad_data, con_indicadores), unsafe_allow_html=True)
+
+@st.fragment
+def render_hierarchical_view(contexto: ContextoMetricas):
+    """Renderiza vista jerárquica desplegable: Cuenta > Origen > Actividad.
+    
+    Cada bloque (resumen, contenido de un desplegable) sale de los helpers html_* como
+    un único st.markdown, con los indicadores ya calculados en construir_jerarquia.
+    """
     st.markdown('<div class="hierarchy-section">', unsafe_allow_html=True)
     st.markdown('<h2 class="hierarchy-title">📊 Vista Jerárquica - Cuenta → Origen → Actividad</h2>', unsafe_allow_html=True)
     
-    if df_metricas.empty:
+    if contexto.df_metricas.empty:
         st.warning("⚠️ No hay datos disponibles para mostrar la vista jerárquica")
         st.markdown('</div>', unsafe_allow_html=True)
         return
     
-    # Agrupar datos por jerarquía
-    hierarchical_data = df_metricas.groupby(['cliente', 'origen', 'tipo_actividad']).agg({
-        'total_enviados': 'sum',
-        'total_fallidos': 'sum',
-        'total_respuestas': 'sum',
-        'total_cualificados': 'sum',
-        'total_agendados': 'sum',
-        'limites_alcanzados': 'sum',
-        'tasa_respuesta': 'mean',
-        'tasa_conversion': 'mean',
-        'tasa_entrega': 'mean'
-    }).reset_index()
+    # Totales de los tres niveles precalculados: cada nodo se consulta en un diccionario
+    jerarquia = contexto.jerarquia
     
     # Crear tabs para cada cliente (Nivel 1)
-    clientes = hierarchical_data['cliente'].unique()
+    clientes = list(jerarquia['clientes'])
     if len(clientes) > 1:
-        tab_clientes = st.tabs([f"👤 {cliente}" for cliente in clientes])
+        # Pestañas con estado: solo se rellena la seleccionada, el resto queda vacía hasta abrirla
+        tab_clientes = st.tabs([f"👤 {cliente}" for cliente in clientes], key="jerarquia_cliente", on_change="rerun")
         
         for idx, cliente in enumerate(clientes):
+            if not contenedor_abierto(tab_clientes[idx]):
+                continue
             with tab_clientes[idx]:
-                cliente_data = hierarchical_data[hierarchical_data['cliente'] == cliente]
-                
-                # Calcular totales por cliente
-                cliente_totales = {
-                    'enviados': cliente_data['total_enviados'].sum(),
-                    'fallidos': cliente_data['total_fallidos'].sum(),
-                    'respuestas': cliente_data['total_respuestas'].sum(),
-                    'cualificados': cliente_data['total_cualificados'].sum(),
-                    'agendados': cliente_data['total_agendados'].sum(),
-                    'limites': cliente_data['limites_alcanzados'].sum()
-                }
-                
-                # Calcular tasas por cliente
-                cliente_tasa_entrega = ((cliente_totales['enviados'] - cliente_totales['fallidos']) / cliente_totales['enviados'] * 100) if cliente_totales['enviados'] > 0 else 0
-                cliente_tasa_respuesta = (cliente_totales['respuestas'] / cliente_totales['enviados'] * 100) if cliente_totales['enviados'] > 0 else 0
-                cliente_tasa_conversion = (cliente_totales['agendados'] / cliente_totales['enviados'] * 100) if cliente_totales['enviados'] > 0 else 0
-                
-                # Contenedor de resumen con estilo mejorado
-                st.markdown('<div class="summary-container">', unsafe_allow_html=True)
-                
-                # Título del resumen con indicadores de rendimiento
-                respuesta_indicator = get_performance_indicator(cliente_tasa_respuesta, "tasa_respuesta")
-                conversion_indicator = get_performance_indicator(cliente_tasa_conversion, "tasa_conversion")
-                entrega_indicator = get_performance_indicator(cliente_tasa_entrega, "tasa_entrega")
-                
-                st.markdown(f'''
-                <div class="summary-title">
-                    📊 Resumen General - {cliente}
-                    <br>
-                    <small style="font-size: 0.9rem; color: #666;">
-                        {respuesta_indicator} {conversion_indicator} {entrega_indicator}
-                    </small>
-                </div>
-                ''', unsafe_allow_html=True)
-                
-                # Métricas del cliente con estilo mejorado
-                col1, col2, col3, col4, col5 = st.columns(5)
-                
-                with col1:
-                    st.markdown(f'''
-                    <div class="metric-enhanced">
-                        <div class="metric-value">{cliente_totales['enviados']:,}</div>
-                        <div class="metric-label">📤 Enviados</div>
-                    </div>
-                    ''', unsafe_allow_html=True)
+                origenes_cliente = jerarquia['origenes'][cliente]
                 
-                with col2:
-                    st.markdown(f'''
-                    <div class="metric-enhanced">
-                        <div class="metric-value">{cliente_totales['respuestas']:,}</div>
-                        <div class="metric-label">💬 Respuestas</div>
-                    </div>
-                    ''', unsafe_allow_html=True)
-                
-                with col3:
-                    st.markdown(f'''
-                    <div class="metric-enhanced">
-                        <div class="metric-value">{cliente_totales['cualificados']:,}</div>
-                        <div class="metric-label">🎯 Cualificados</div>
-                    </div>
-                    ''', unsafe_allow_html=True)
-                
-                with col4:
-                    st.markdown(f'''
-                    <div class="metric-enhanced">
-                        <div class="metric-value">{cliente_totales['agendados']:,}</div>
-                        <div class="metric-label">🗓️ Agendados</div>
-                    </div>
-                    ''', unsafe_allow_html=True)
-                
-                with col5:
-                    limites_color = "color: #dc3545;" if cliente_totales['limites'] > 0 else "color: #28a745;"
-                    st.markdown(f'''
-                    <div class="metric-enhanced">
-                        <div class="metric-value" style="{limites_color}">{cliente_totales['limites']:,}</div>
-                        <div class="metric-label">⚠️ Límites</div>
-                    </div>
-                    ''', unsafe_allow_html=True)
-                
-                # Tasas de rendimiento del cliente con estilo mejorado
-                col1, col2, col3 = st.columns(3)
-                
-                with col1:
-                    st.markdown(f'''
-                    <div class="metric-enhanced">
-                        <div class="metric-value">{cliente_tasa_entrega:.1f}%</div>
-                        <div class="metric-label">📊 Tasa Entrega</div>
-                    </div>
-                    ''', unsafe_allow_html=True)
-                
-                with col2:
-                    st.markdown(f'''
-                    <div class="metric-enhanced">
-                        <div class="metric-value">{cliente_tasa_respuesta:.1f}%</div>
-                        <div class="metric-label">📊 Tasa Respuesta</div>
-                    </div>
-                    ''', unsafe_allow_html=True)
-                
-                with col3:
-                    st.markdown(f'''
-                    <div class="metric-enhanced">
-                        <div class="metric-value">{cliente_tasa_conversion:.1f}%</div>
-                        <div class="metric-label">📊 Tasa Conversión</div>
-                    </div>
-                    ''', unsafe_allow_html=True)
-                
-                st.markdown('</div>', unsafe_allow_html=True)
-                
-                # Divisor visual
-                st.markdown('<div class="visual-divider"></div>', unsafe_allow_html=True)
+                # Resumen del cliente y divisor en un solo bloque
+                st.markdown(
+                    html_resumen(f"📊 Resumen General - {cliente}", jerarquia['clientes'][cliente])
+                    + '<div class="visual-divider"></div>',
+                    unsafe_allow_html=True
+                )
                 
                 # Selectbox para elegir origen (Nivel 2)
-                origenes = cliente_data['origen'].unique()
+                origenes = list(origenes_cliente)
                 if len(origenes) > 1:
                     origen_seleccionado = st.selectbox(
                         "📍 Selecciona un origen para ver detalles:",
@@ -903,349 +1701,34 @@ def render_hierarchical_view(df_metricas):
                     )
                     
                     if origen_seleccionado == "📊 Ver todos los orígenes":
-                        # Mostrar resumen de todos los orígenes
-                        st.markdown('<div class="activities-container">', unsafe_allow_html=True)
                         st.markdown('<div class="activities-title">📍 Resumen por Origen</div>', unsafe_allow_html=True)
-                        
-                        for origen in origenes:
-                            origen_data = cliente_data[cliente_data['origen'] == origen]
-                            
-                            # Calcular totales por origen
-                            origen_totales = {
-                                'enviados': origen_data['total_enviados'].sum(),
-                                'respuestas': origen_data['total_respuestas'].sum(),
-                                'agendados': origen_data['total_agendados'].sum(),
-                                'limites': origen_data['limites_alcanzados'].sum()
-                            }
-                            
-                            # Calcular tasas por origen
-                            origen_tasa_respuesta = (origen_totales['respuestas'] / origen_totales['enviados'] * 100) if origen_totales['enviados'] > 0 else 0
-                            origen_tasa_conversion = (origen_totales['agendados'] / origen_totales['enviados'] * 100) if origen_totales['enviados'] > 0 else 0
-                            
-                            # Indicadores de rendimiento
-                            respuesta_indicator = get_performance_indicator(origen_tasa_respuesta, "tasa_respuesta")
-                            conversion_indicator = get_performance_indicator(origen_tasa_conversion, "tasa_conversion")
-                            
-                            # Mostrar en expander con estilo mejorado
-                            expander_title = f"📍 **{origen}** - {origen_totales['enviados']:,} enviados | {origen_tasa_respuesta:.1f}% respuesta | {origen_tasa_conversion:.1f}% conversión"
-                            
-                            with st.expander(expander_title, expanded=False):
-                                # Mostrar indicadores de rendimiento
-                                st.markdown(f'''
-                                <div class="context-info">
-                                    <strong>📊 Rendimiento:</strong> {respuesta_indicator} {conversion_indicator}
-                                </div>
-                                ''', unsafe_allow_html=True)
-                                
-                                col1, col2, col3, col4 = st.columns(4)
-                                with col1:
-                                    st.markdown(f'''
-                                    <div class="metric-enhanced">
-                                        <div class="metric-value">{origen_totales['enviados']:,}</div>
-                                        <div class="metric-label">📤 Enviados</div>
-                                    </div>
-                                    ''', unsafe_allow_html=True)
-                                with col2:
-                                    st.markdown(f'''
-                                    <div class="metric-enhanced">
-                                        <div class="metric-value">{origen_totales['respuestas']:,}</div>
-                                        <div class="metric-label">💬 Respuestas</div>
-                                    </div>
-                                    ''', unsafe_allow_html=True)
-                                with col3:
-                                    st.markdown(f'''
-                                    <div class="metric-enhanced">
-                                        <div class="metric-value">{origen_totales['agendados']:,}</div>
-                                        <div class="metric-label">🗓️ Agendados</div>
-                                    </div>
-                                    ''', unsafe_allow_html=True)
-                                with col4:
-                                    limites_color = "color: #dc3545;" if origen_totales['limites'] > 0 else "color: #28a745;"
-                                    st.markdown(f'''
-                                    <div class="metric-enhanced">
-                                        <div class="metric-value" style="{limites_color}">{origen_totales['limites']:,}</div>
-                                        <div class="metric-label">⚠️ Límites</div>
-                                    </div>
-                                    ''', unsafe_allow_html=True)
-                        
-                        st.markdown('</div>', unsafe_allow_html=True)
+                        render_origenes(cliente, origenes_cliente)
                     else:
-                        # Mostrar origen específico
-                        origen_data = cliente_data[cliente_data['origen'] == origen_seleccionado]
-                        
-                        # Calcular totales por origen
-                        origen_totales = {
-                            'enviados': origen_data['total_enviados'].sum(),
-                            'fallidos': origen_data['total_fallidos'].sum(),
-                            'respuestas': origen_data['total_respuestas'].sum(),
-                            'cualificados': origen_data['total_cualificados'].sum(),
-                            'agendados': origen_data['total_agendados'].sum(),
-                            'limites': origen_data['limites_alcanzados'].sum()
-                        }
-                        
-                        # Calcular tasas para el origen específico
-                        origen_tasa_entrega = ((origen_totales['enviados'] - origen_totales['fallidos']) / origen_totales['enviados'] * 100) if origen_totales['enviados'] > 0 else 0
-                        origen_tasa_respuesta = (origen_totales['respuestas'] / origen_totales['enviados'] * 100) if origen_totales['enviados'] > 0 else 0
-                        origen_tasa_conversion = (origen_totales['agendados'] / origen_totales['enviados'] * 100) if origen_totales['enviados'] > 0 else 0
-                        
-                        # Indicadores de rendimiento
-                        respuesta_indicator = get_performance_indicator(origen_tasa_respuesta, "tasa_respuesta")
-                        conversion_indicator = get_performance_indicator(origen_tasa_conversion, "tasa_conversion")
-                        entrega_indicator = get_performance_indicator(origen_tasa_entrega, "tasa_entrega")
-                        
-                        st.markdown('<div class="summary-container">', unsafe_allow_html=True)
-                        st.markdown(f'''
-                        <div class="summary-title">
-                            📍 Detalle del Origen: {origen_seleccionado}
-                            <br>
-                            <small style="font-size: 0.9rem; color: #666;">
-                                {respuesta_indicator} {conversion_indicator} {entrega_indicator}
-                            </small>
-                        </div>
-                        ''', unsafe_allow_html=True)
-                        
-                        # Métricas del origen con estilo mejorado
-                        col1, col2, col3, col4, col5 = st.columns(5)
-                        with col1:
-                            st.markdown(f'''
-                            <div class="metric-enhanced">
-                                <div class="metric-value">{origen_totales['enviados']:,}</div>
-                                <div class="metric-label">📤 Enviados</div>
-                            </div>
-                            ''', unsafe_allow_html=True)
-                        with col2:
-                            st.markdown(f'''
-                            <div class="metric-enhanced">
-                                <div class="metric-value">{origen_totales['respuestas']:,}</div>
-                                <div class="metric-label">💬 Respuestas</div>
-                            </div>
-                            ''', unsafe_allow_html=True)
-                        with col3:
-                            st.markdown(f'''
-                            <div class="metric-enhanced">
-                                <div class="metric-value">{origen_totales['cualificados']:,}</div>
-                                <div class="metric-label">🎯 Cualificados</div>
-                            </div>
-                            ''', unsafe_allow_html=True)
-                        with col4:
-                            st.markdown(f'''
-                            <div class="metric-enhanced">
-                                <div class="metric-value">{origen_totales['agendados']:,}</div>
-                                <div class="metric-label">🗓️ Agendados</div>
-                            </div>
-                            ''', unsafe_allow_html=True)
-                        with col5:
-                            limites_color = "color: #dc3545;" if origen_totales['limites'] > 0 else "color: #28a745;"
-                            st.markdown(f'''
-                            <div class="metric-enhanced">
-                                <div class="metric-value" style="{limites_color}">{origen_totales['limites']:,}</div>
-                                <div class="metric-label">⚠️ Límites</div>
-                            </div>
-                            ''', unsafe_allow_html=True)
-                        
-                        st.markdown('</div>', unsafe_allow_html=True)
-                        
-                        # Mostrar actividades para este origen (Nivel 3)
-                        actividades = origen_data['tipo_actividad'].unique()
-                        
-                        if len(actividades) > 1:
-                            st.markdown('<div class="activities-container">', unsafe_allow_html=True)
+                        # Mostrar origen específico y sus actividades (Nivel 3)
+                        origen_data = jerarquia['actividades'][(cliente, origen_seleccionado)]
+                        st.markdown(
+                            html_resumen(f"📍 Detalle del Origen: {origen_seleccionado}", origenes_cliente[origen_seleccionado], con_tasas=False),
+                            unsafe_allow_html=True
+                        )
+                        if len(origen_data) > 1:
                             st.markdown('<div class="activities-title">🎯 Actividades del Origen</div>', unsafe_allow_html=True)
-                            
-                            for actividad in actividades:
-                                actividad_data = origen_data[origen_data['tipo_actividad'] == actividad].iloc[0]
-                                
-                                # Indicadores de rendimiento para la actividad
-                                respuesta_indicator = get_performance_indicator(actividad_data['tasa_respuesta'], "tasa_respuesta")
-                                conversion_indicator = get_performance_indicator(actividad_data['tasa_conversion'], "tasa_conversion")
-                                entrega_indicator = get_performance_indicator(actividad_data['tasa_entrega'], "tasa_entrega")
-                                
-                                # Mostrar cada actividad en expander con estilo mejorado
-                                expander_title = f"🎯 **{actividad}** - {actividad_data['total_enviados']:,} enviados | {actividad_data['tasa_respuesta']:.1f}% respuesta | {actividad_data['tasa_conversion']:.1f}% conversión"
-                                
-                                with st.expander(expander_title, expanded=False):
-                                    # Mostrar indicadores de rendimiento
-                                    st.markdown(f'''
-                                    <div class="context-info">
-                                        <strong>📊 Rendimiento:</strong> {respuesta_indicator} {conversion_indicator} {entrega_indicator}
-                                    </div>
-                                    ''', unsafe_allow_html=True)
-                                    
-                                    # Métricas de la actividad con estilo mejorado
-                                    col1, col2, col3, col4, col5, col6 = st.columns(6)
-                                    with col1:
-                                        st.markdown(f'''
-                                        <div class="metric-enhanced">
-                                            <div class="metric-value">{actividad_data['total_enviados']:,}</div>
-                                            <div class="metric-label">📤 Enviados</div>
-                                        </div>
-                                        ''', unsafe_allow_html=True)
-                                    with col2:
-                                        st.markdown(f'''
-                                        <div class="metric-enhanced">
-                                            <div class="metric-value" style="color: #dc3545;">{actividad_data['total_fallidos']:,}</div>
-                                            <div class="metric-label">❌ Fallidos</div>
-                                        </div>
-                                        ''', unsafe_allow_html=True)
-                                    with col3:
-                                        st.markdown(f'''
-                                        <div class="metric-enhanced">
-                                            <div class="metric-value">{actividad_data['total_respuestas']:,}</div>
-                                            <div class="metric-label">💬 Respuestas</div>
-                                        </div>
-                                        ''', unsafe_allow_html=True)
-                                    with col4:
-                                        st.markdown(f'''
-                                        <div class="metric-enhanced">
-                                            <div class="metric-value">{actividad_data['total_cualificados']:,}</div>
-                                            <div class="metric-label">🎯 Cualificados</div>
-                                        </div>
-                                        ''', unsafe_allow_html=True)
-                                    with col5:
-                                        st.markdown(f'''
-                                        <div class="metric-enhanced">
-                                            <div class="metric-value" style="color: #28a745;">{actividad_data['total_agendados']:,}</div>
-                                            <div class="metric-label">🗓️ Agendados</div>
-                                        </div>
-                                        ''', unsafe_allow_html=True)
-                                    with col6:
-                                        limites_color = "color: #dc3545;" if actividad_data['limites_alcanzados'] > 0 else "color: #28a745;"
-                                        st.markdown(f'''
-                                        <div class="metric-enhanced">
-                                            <div class="metric-value" style="{limites_color}">{actividad_data['limites_alcanzados']:,}</div>
-                                            <div class="metric-label">⚠️ Límites</div>
-                                        </div>
-                                        ''', unsafe_allow_html=True)
-                                    
-                                    # Divisor visual
-                                    st.markdown('<div class="visual-divider"></div>', unsafe_allow_html=True)
-                                    
-                                    # Tasas de rendimiento con estilo mejorado
-                                    col1, col2, col3 = st.columns(3)
-                                    with col1:
-                                        st.markdown(f'''
-                                        <div class="metric-enhanced">
-                                            <div class="metric-value">{actividad_data['tasa_entrega']:.1f}%</div>
-                                            <div class="metric-label">📊 Tasa Entrega</div>
-                                        </div>
-                                        ''', unsafe_allow_html=True)
-                                    with col2:
-                                        st.markdown(f'''
-                                        <div class="metric-enhanced">
-                                            <div class="metric-value">{actividad_data['tasa_respuesta']:.1f}%</div>
-                                            <div class="metric-label">📊 Tasa Respuesta</div>
-                                        </div>
-                                        ''', unsafe_allow_html=True)
-                                    with col3:
-                                        st.markdown(f'''
-                                        <div class="metric-enhanced">
-                                            <div class="metric-value">{actividad_data['tasa_conversion']:.1f}%</div>
-                                            <div class="metric-label">📊 Tasa Conversión</div>
-                                        </div>
-                                        ''', unsafe_allow_html=True)
-                            
-                            st.markdown('</div>', unsafe_allow_html=True)
-                        else:
-                            # Solo una actividad
-                            actividad_data = origen_data.iloc[0]
-                            
-                            # Indicadores de rendimiento
-                            respuesta_indicator = get_performance_indicator(actividad_data['tasa_respuesta'], "tasa_respuesta")
-                            conversion_indicator = get_performance_indicator(actividad_data['tasa_conversion'], "tasa_conversion")
-                            entrega_indicator = get_performance_indicator(actividad_data['tasa_entrega'], "tasa_entrega")
-                            
-                            st.markdown(f'''
-                            <div class="context-info">
-                                <strong>🎯 Actividad única:</strong> {actividad_data['tipo_actividad']}
-                                <br>
-                                <strong>📊 Rendimiento:</strong> {respuesta_indicator} {conversion_indicator} {entrega_indicator}
-                            </div>
-                            ''', unsafe_allow_html=True)
-                            
-                            # Tasas de rendimiento con estilo mejorado
-                            col1, col2, col3 = st.columns(3)
-                            with col1:
-                                st.markdown(f'''
-                                <div class="metric-enhanced">
-                                    <div class="metric-value">{actividad_data['tasa_entrega']:.1f}%</div>
-                                    <div class="metric-label">📊 Tasa Entrega</div>
-                                </div>
-                                ''', unsafe_allow_html=True)
-                            with col2:
-                                st.markdown(f'''
-                                <div class="metric-enhanced">
-                                    <div class="metric-value">{actividad_data['tasa_respuesta']:.1f}%</div>
-                                    <div class="metric-label">📊 Tasa Respuesta</div>
-                                </div>
-                                ''', unsafe_allow_html=True)
-                            with col3:
-                                st.markdown(f'''
-                                <div class="metric-enhanced">
-                                    <div class="metric-value">{actividad_data['tasa_conversion']:.1f}%</div>
-                                    <div class="metric-label">📊 Tasa Conversión</div>
-                                </div>
-                                ''', unsafe_allow_html=True)
+                        render_actividades(cliente, origen_seleccionado, origen_data)
                 else:
                     # Solo un origen
-                    origen_data = cliente_data
+                    origen_data = jerarquia['actividades'][(cliente, origenes[0])]
                     st.markdown(f"### 📍 Origen único: {origenes[0]}")
-                    
-                    # Mostrar actividades directamente
-                    actividades = origen_data['tipo_actividad'].unique()
-                    
-                    if len(actividades) > 1:
+                    if len(origen_data) > 1:
                         st.markdown("### 🎯 Actividades")
-                        for actividad in actividades:
-                            actividad_data = origen_data[origen_data['tipo_actividad'] == actividad].iloc[0]
-                            
-                            # Mostrar cada actividad en expander
-                            with st.expander(f"🎯 **{actividad}** - {actividad_data['total_enviados']:,} enviados | {actividad_data['tasa_respuesta']:.1f}% respuesta | {actividad_data['tasa_conversion']:.1f}% conversión", expanded=False):
-                                
-                                # Métricas de la actividad
-                                col1, col2, col3, col4, col5, col6 = st.columns(6)
-                                with col1:
-                                    st.metric("📤 Enviados", f"{actividad_data['total_enviados']:,}")
-                                with col2:
-                                    st.metric("❌ Fallidos", f"{actividad_data['total_fallidos']:,}")
-                                with col3:
-                                    st.metric("💬 Respuestas", f"{actividad_data['total_respuestas']:,}")
-                                with col4:
-                                    st.metric("🎯 Cualificados", f"{actividad_data['total_cualificados']:,}")
-                                with col5:
-                                    st.metric("🗓️ Agendados", f"{actividad_data['total_agendados']:,}")
-                                with col6:
-                                    st.metric("⚠️ Límites", f"{actividad_data['limites_alcanzados']:,}")
-                                
-                                # Tasas de rendimiento
-                                col1, col2, col3 = st.columns(3)
-                                with col1:
-                                    st.metric("📊 Tasa Entrega", f"{actividad_data['tasa_entrega']:.1f}%")
-                                with col2:
-                                    st.metric("📊 Tasa Respuesta", f"{actividad_data['tasa_respuesta']:.1f}%")
-                                with col3:
-                                    st.metric("📊 Tasa Conversión", f"{actividad_data['tasa_conversion']:.1f}%")
-                    else:
-                        # Solo una actividad
-                        actividad_data = origen_data.iloc[0]
-                        st.info(f"🎯 **Actividad única**: {actividad_data['tipo_actividad']}")
-                        
-                        # Tasas de rendimiento
-                        col1, col2, col3 = st.columns(3)
-                        with col1:
-                            st.metric("📊 Tasa Entrega", f"{actividad_data['tasa_entrega']:.1f}%")
-                        with col2:
-                            st.metric("📊 Tasa Respuesta", f"{actividad_data['tasa_respuesta']:.1f}%")
-                        with col3:
-                            st.metric("📊 Tasa Conversión", f"{actividad_data['tasa_conversion']:.1f}%")
+                    render_actividades(cliente, origenes[0], origen_data, con_indicadores=False)
     else:
         # Solo un cliente - mostrar directamente
         cliente = clientes[0]
-        cliente_data = hierarchical_data[hierarchical_data['cliente'] == cliente]
+        origenes_cliente = jerarquia['origenes'][cliente]
         
         st.markdown(f"### 👤 Cliente único: {cliente}")
         
         # Selectbox para elegir origen
-        origenes = cliente_data['origen'].unique()
+        origenes = list(origenes_cliente)
         if len(origenes) > 1:
             origen_seleccionado = st.selectbox(
                 "📍 Selecciona un origen para ver detalles:",
@@ -1254,246 +1737,77 @@ def render_hierarchical_view(df_metricas):
             )
             
             if origen_seleccionado == "📊 Ver todos los orígenes":
-                # Mostrar resumen de todos los orígenes
                 st.markdown("### 📍 Resumen por Origen")
-                for origen in origenes:
-                    origen_data = cliente_data[cliente_data['origen'] == origen]
-                    
-                    # Calcular totales por origen
-                    origen_totales = {
-                        'enviados': origen_data['total_enviados'].sum(),
-                        'respuestas': origen_data['total_respuestas'].sum(),
-                        'agendados': origen_data['total_agendados'].sum(),
-                        'limites': origen_data['limites_alcanzados'].sum()
-                    }
-                    
-                    # Calcular tasas por origen
-                    origen_tasa_respuesta = (origen_totales['respuestas'] / origen_totales['enviados'] * 100) if origen_totales['enviados'] > 0 else 0
-                    origen_tasa_conversion = (origen_totales['agendados'] / origen_totales['enviados'] * 100) if origen_totales['enviados'] > 0 else 0
-                    
-                    # Mostrar en expander
-                    with st.expander(f"📍 **{origen}** - {origen_totales['enviados']:,} enviados | {origen_tasa_respuesta:.1f}% respuesta | {origen_tasa_conversion:.1f}% conversión", expanded=False):
-                        col1, col2, col3, col4 = st.columns(4)
-                        with col1:
-                            st.metric("📤 Enviados", f"{origen_totales['enviados']:,}")
-                        with col2:
-                            st.metric("💬 Respuestas", f"{origen_totales['respuestas']:,}")
-                        with col3:
-                            st.metric("🗓️ Agendados", f"{origen_totales['agendados']:,}")
-                        with col4:
-                            st.metric("⚠️ Límites", f"{origen_totales['limites']:,}")
+                render_origenes(cliente, origenes_cliente, con_indicadores=False)
             else:
                 # Mostrar origen específico con sus actividades
-                origen_data = cliente_data[cliente_data['origen'] == origen_seleccionado]
-                
+                origen_data = jerarquia['actividades'][(cliente, origen_seleccionado)]
                 st.markdown(f"### 📍 Detalle del Origen: {origen_seleccionado}")
-                
-                # Mostrar actividades
-                actividades = origen_data['tipo_actividad'].unique()
-                
-                if len(actividades) > 1:
+                if len(origen_data) > 1:
                     st.markdown("### 🎯 Actividades del Origen")
-                    for actividad in actividades:
-                        actividad_data = origen_data[origen_data['tipo_actividad'] == actividad].iloc[0]
-                        
-                        # Mostrar cada actividad en expander
-                        with st.expander(f"🎯 **{actividad}** - {actividad_data['total_enviados']:,} enviados | {actividad_data['tasa_respuesta']:.1f}% respuesta | {actividad_data['tasa_conversion']:.1f}% conversión", expanded=False):
-                            
-                            # Métricas de la actividad
-                            col1, col2, col3, col4, col5, col6 = st.columns(6)
-                            with col1:
-                                st.metric("📤 Enviados", f"{actividad_data['total_enviados']:,}")
-                            with col2:
-                                st.metric("❌ Fallidos", f"{actividad_data['total_fallidos']:,}")
-                            with col3:
-                                st.metric("💬 Respuestas", f"{actividad_data['total_respuestas']:,}")
-                            with col4:
-                                st.metric("🎯 Cualificados", f"{actividad_data['total_cualificados']:,}")
-                            with col5:
-                                st.metric("🗓️ Agendados", f"{actividad_data['total_agendados']:,}")
-                            with col6:
-                                st.metric("⚠️ Límites", f"{actividad_data['limites_alcanzados']:,}")
-                            
-                            # Tasas de rendimiento
-                            col1, col2, col3 = st.columns(3)
-                            with col1:
-                                st.metric("📊 Tasa Entrega", f"{actividad_data['tasa_entrega']:.1f}%")
-                            with col2:
-                                st.metric("📊 Tasa Respuesta", f"{actividad_data['tasa_respuesta']:.1f}%")
-                            with col3:
-                                st.metric("📊 Tasa Conversión", f"{actividad_data['tasa_conversion']:.1f}%")
-                else:
-                    # Solo una actividad
-                    actividad_data = origen_data.iloc[0]
-                    st.info(f"🎯 **Actividad única**: {actividad_data['tipo_actividad']}")
-                    
-                    # Tasas de rendimiento
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.metric("📊 Tasa Entrega", f"{actividad_data['tasa_entrega']:.1f}%")
-                    with col2:
-                        st.metric("📊 Tasa Respuesta", f"{actividad_data['tasa_respuesta']:.1f}%")
-                    with col3:
-                        st.metric("📊 Tasa Conversión", f"{actividad_data['tasa_conversion']:.1f}%")
+                render_actividades(cliente, origen_seleccionado, origen_data, con_indicadores=False)
         else:
             # Solo un origen - mostrar actividades directamente
             st.markdown(f"### 📍 Origen único: {origenes[0]}")
-            
-            # Mostrar actividades directamente
-            actividades = cliente_data['tipo_actividad'].unique()
-            
-            if len(actividades) > 1:
+            origen_data = jerarquia['actividades'][(cliente, origenes[0])]
+            if len(origen_data) > 1:
                 st.markdown("### 🎯 Actividades")
-                for actividad in actividades:
-                    actividad_data = cliente_data[cliente_data['tipo_actividad'] == actividad].iloc[0]
-                    
-                    # Mostrar cada actividad en expander
-                    with st.expander(f"🎯 **{actividad}** - {actividad_data['total_enviados']:,} enviados | {actividad_data['tasa_respuesta']:.1f}% respuesta | {actividad_data['tasa_conversion']:.1f}% conversión", expanded=False):
-                        
-                        # Métricas de la actividad
-                        col1, col2, col3, col4, col5, col6 = st.columns(6)
-                        with col1:
-                            st.metric("📤 Enviados", f"{actividad_data['total_enviados']:,}")
-                        with col2:
-                            st.metric("❌ Fallidos", f"{actividad_data['total_fallidos']:,}")
-                        with col3:
-                            st.metric("💬 Respuestas", f"{actividad_data['total_respuestas']:,}")
-                        with col4:
-                            st.metric("🎯 Cualificados", f"{actividad_data['total_cualificados']:,}")
-                        with col5:
-                            st.metric("🗓️ Agendados", f"{actividad_data['total_agendados']:,}")
-                        with col6:
-                            st.metric("⚠️ Límites", f"{actividad_data['limites_alcanzados']:,}")
-                        
-                        # Tasas de rendimiento
-                        col1, col2, col3 = st.columns(3)
-                        with col1:
-                            st.metric("📊 Tasa Entrega", f"{actividad_data['tasa_entrega']:.1f}%")
-                        with col2:
-                            st.metric("📊 Tasa Respuesta", f"{actividad_data['tasa_respuesta']:.1f}%")
-                        with col3:
-                            st.metric("📊 Tasa Conversión", f"{actividad_data['tasa_conversion']:.1f}%")
-            else:
-                # Solo una actividad
-                actividad_data = cliente_data.iloc[0]
-                st.info(f"🎯 **Actividad única**: {actividad_data['tipo_actividad']}")
-                
-                # Tasas de rendimiento
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric("📊 Tasa Entrega", f"{actividad_data['tasa_entrega']:.1f}%")
-                with col2:
-                    st.metric("📊 Tasa Respuesta", f"{actividad_data['tasa_respuesta']:.1f}%")
-                with col3:
-                    st.metric("📊 Tasa Conversión", f"{actividad_data['tasa_conversion']:.1f}%")
+            render_actividades(cliente, origenes[0], origen_data, con_indicadores=False)
     
     st.markdown('</div>', unsafe_allow_html=True)
 
-def render_executive_summary(df_metricas):
+@st.fragment
+def render_executive_summary(contexto: ContextoMetricas):
     """Renderiza resumen ejecutivo con KPIs principales."""
     st.markdown('<div class="dashboard-section">', unsafe_allow_html=True)
     st.markdown('<h2 class="section-title">📈 Resumen Ejecutivo</h2>', unsafe_allow_html=True)
     
-    # Calcular métricas globales
-    total_enviados = df_metricas['total_enviados'].sum()
-    total_fallidos = df_metricas['total_fallidos'].sum()
-    total_respuestas = df_metricas['total_respuestas'].sum()
-    total_cualificados = df_metricas['total_cualificados'].sum()
-    total_agendados = df_metricas['total_agendados'].sum()
-    limites_alcanzados = df_metricas['limites_alcanzados'].sum()
-    
-    # Calcular tasas
-    tasa_entrega = ((total_enviados - total_fallidos) / total_enviados * 100) if total_enviados > 0 else 0
-    tasa_respuesta = (total_respuestas / total_enviados * 100) if total_enviados > 0 else 0
-    tasa_cualificacion = (total_cualificados / total_respuestas * 100) if total_respuestas > 0 else 0
-    tasa_conversion = (total_agendados / total_enviados * 100) if total_enviados > 0 else 0
-    
-    # Renderizar métricas en columnas
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.markdown(f"""
-        <div class="metric-card">
-            <div class="metric-value">{total_enviados:,}</div>
-            <div class="metric-label">📤 Contactos Alcanzados</div>
-            <div class="metric-change metric-neutral">
-                🎯 {total_enviados - total_fallidos:,} entregados
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        st.markdown(f"""
-        <div class="metric-card">
-            <div class="metric-value">{tasa_entrega:.1f}%</div>
-            <div class="metric-label">✅ Tasa de Entrega</div>
-            <div class="metric-change metric-{'positive' if tasa_entrega > 95 else 'warning' if tasa_entrega > 90 else 'negative'}">
-                {'🟢 Excelente' if tasa_entrega > 95 else '🟡 Buena' if tasa_entrega > 90 else '🔴 Mejorable'}
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown(f"""
-        <div class="metric-card">
-            <div class="metric-value">{total_respuestas:,}</div>
-            <div class="metric-label">💬 Respuestas Obtenidas</div>
-            <div class="metric-change metric-neutral">
-                📊 {total_respuestas / max(1, total_enviados) * 100:.1f}% del total
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        st.markdown(f"""
-        <div class="metric-card">
-            <div class="metric-value">{tasa_respuesta:.1f}%</div>
-            <div class="metric-label">📊 Tasa de Respuesta</div>
-            <div class="metric-change metric-{'positive' if tasa_respuesta > 10 else 'warning' if tasa_respuesta > 5 else 'negative'}">
-                {'🟢 Excelente' if tasa_respuesta > 10 else '🟡 Buena' if tasa_respuesta > 5 else '🔴 Mejorable'}
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        st.markdown(f"""
-        <div class="metric-card">
-            <div class="metric-value">{total_cualificados:,}</div>
-            <div class="metric-label">🎯 Leads Cualificados</div>
-            <div class="metric-change metric-neutral">
-                📈 {total_cualificados / max(1, total_respuestas) * 100:.1f}% de respuestas
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        st.markdown(f"""
-        <div class="metric-card">
-            <div class="metric-value">{tasa_cualificacion:.1f}%</div>
-            <div class="metric-label">⭐ Tasa de Cualificación</div>
-            <div class="metric-change metric-{'positive' if tasa_cualificacion > 30 else 'warning' if tasa_cualificacion > 20 else 'negative'}">
-                {'🟢 Excelente' if tasa_cualificacion > 30 else '🟡 Buena' if tasa_cualificacion > 20 else '🔴 Mejorable'}
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col4:
-        st.markdown(f"""
-        <div class="metric-card">
-            <div class="metric-value">{total_agendados:,}</div>
-            <div class="metric-label">🗓️ Meetings Agendados</div>
-            <div class="metric-change metric-neutral">
-                🎯 {total_agendados / max(1, total_enviados) * 100:.1f}% conversión
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        st.markdown(f"""
-        <div class="metric-card">
-            <div class="metric-value">{tasa_conversion:.1f}%</div>
-            <div class="metric-label">💰 Tasa de Conversión</div>
-            <div class="metric-change metric-{'positive' if tasa_conversion > 3 else 'warning' if tasa_conversion > 1 else 'negative'}">
-                {'🟢 Excelente' if tasa_conversion > 3 else '🟡 Buena' if tasa_conversion > 1 else '🔴 Mejorable'}
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+    # Métricas globales y tasas del contexto compartido
+    totales = contexto.totales
+    total_enviados = totales['total_enviados']
+    total_fallidos = totales['total_fallidos']
+    total_respuestas = totales['total_respuestas']
+    total_cualificados = totales['total_cualificados']
+    total_agendados = totales['total_agendados']
+    limites_alcanzados = totales['limites_alcanzados']
+    
+    tasa_entrega = totales['tasa_entrega']
+    tasa_respuesta = totales['tasa_respuesta']
+    tasa_cualificacion = totales['tasa_cualificacion']
+    tasa_conversion = totales['tasa_conversion']
+    
+    # Nivel de cada tasa (0 excelente, 1 buena, 2 mejorable) -> clase metric-* del pie
+    tasas = {
+        'tasa_entrega': tasa_entrega,
+        'tasa_respuesta': tasa_respuesta,
+        'tasa_cualificacion': tasa_cualificacion,
+        'tasa_conversion': tasa_conversion,
+    }
+    clases_cambio = np.array(['positive', 'warning', 'negative'])
+    
+    def pie_tasa(tasa: str) -> str:
+        nivel = niveles_rendimiento([tasas[tasa]], tasa)[0]
+        return f'<div class="metric-change metric-{clases_cambio[nivel]}">{TEXTOS_RENDIMIENTO[nivel]}</div>'
+    
+    def pie_neutral(texto: str) -> str:
+        return f'<div class="metric-change metric-neutral">{texto}</div>'
+    
+    # Ocho tarjetas en una rejilla de 4 columnas: contadores arriba, tasas debajo
+    tarjetas = [
+        tarjeta_html(f"{total_enviados:,}", "📤 Contactos Alcanzados",
+                     pie=pie_neutral(f"🎯 {total_enviados - total_fallidos:,} entregados"), clase="metric-card"),
+        tarjeta_html(f"{total_respuestas:,}", "💬 Respuestas Obtenidas",
+                     pie=pie_neutral(f"📊 {total_respuestas / max(1, total_enviados) * 100:.1f}% del total"), clase="metric-card"),
+        tarjeta_html(f"{total_cualificados:,}", "🎯 Leads Cualificados",
+                     pie=pie_neutral(f"📈 {total_cualificados / max(1, total_respuestas) * 100:.1f}% de respuestas"), clase="metric-card"),
+        tarjeta_html(f"{total_agendados:,}", "🗓️ Meetings Agendados",
+                     pie=pie_neutral(f"🎯 {total_agendados / max(1, total_enviados) * 100:.1f}% conversión"), clase="metric-card"),
+        tarjeta_html(f"{tasa_entrega:.1f}%", "✅ Tasa de Entrega", pie=pie_tasa('tasa_entrega'), clase="metric-card"),
+        tarjeta_html(f"{tasa_respuesta:.1f}%", "📊 Tasa de Respuesta", pie=pie_tasa('tasa_respuesta'), clase="metric-card"),
+        tarjeta_html(f"{tasa_cualificacion:.1f}%", "⭐ Tasa de Cualificación", pie=pie_tasa('tasa_cualificacion'), clase="metric-card"),
+        tarjeta_html(f"{tasa_conversion:.1f}%", "💰 Tasa de Conversión", pie=pie_tasa('tasa_conversion'), clase="metric-card"),
+    ]
+    st.markdown(rejilla_html(tarjetas, columnas=4), unsafe_allow_html=True)
     
     # Alertas importantes
     if limites_alcanzados > 0:
@@ -1506,212 +1820,274 @@ def render_executive_summary(df_metricas):
     
     st.markdown('</div>', unsafe_allow_html=True)
 
-def render_client_performance(df_metricas):
+def figura_barras_clientes(cliente_metrics: pd.DataFrame, columna: str, titulo: str, etiqueta: str, escala: str):
+    """Barras por cliente de una columna de cliente_metrics, coloreadas con la escala indicada."""
+    fig = px.bar(
+        cliente_metrics,
+        x='cliente',
+        y=columna,
+        title=titulo,
+        labels={columna: etiqueta, 'cliente': 'Cliente'},
+        color=columna,
+        color_continuous_scale=escala
+    )
+    fig.update_layout(
+        height=400,
+        showlegend=False,
+        title_font_size=16,
+        title_x=0.5
+    )
+    return fig
+
+# Tablas de desglose: búsqueda, orden y paginación se resuelven en pandas sobre el
+# agregado del contexto y al navegador solo se envía la página visible
+FILAS_POR_PAGINA = [10, 20, 50, 100]
+FILAS_POR_PAGINA_DEFECTO = int(os.getenv('DASHBOARD_FILAS_POR_PAGINA', '20'))
+
+COLUMNAS_TABLA_CLIENTES = {
+    'cliente': 'Cliente',
+    'total_enviados': 'Enviados',
+    'total_fallidos': 'Fallidos',
+    'total_respuestas': 'Respuestas',
+    'total_cualificados': 'Cualificados',
+    'total_agendados': 'Agendados',
+    'limites_alcanzados': 'Límites',
+    'tasa_entrega': 'Entrega (%)',
+    'tasa_respuesta': 'Respuesta (%)',
+    'tasa_conversion': 'Conversión (%)'
+}
+
+COLUMNAS_TABLA_ORIGENES = {
+    'origen': 'Origen',
+    'tipo_via': 'Canal',
+    'total_enviados': 'Enviados',
+    'total_fallidos': 'Fallidos',
+    'total_respuestas': 'Respuestas',
+    'total_cualificados': 'Cualificados',
+    'total_agendados': 'Agendados',
+    'limites_alcanzados': 'Límites',
+    'tasa_entrega': 'Entrega (%)',
+    'tasa_respuesta': 'Respuesta (%)',
+    'tasa_conversion': 'Conversión (%)'
+}
+
+def filtrar_tabla(df: pd.DataFrame, busqueda: str, columnas_busqueda: List[str]) -> pd.DataFrame:
+    """Filas cuyo texto en alguna de columnas_busqueda contiene busqueda (sin distinguir mayúsculas).
+    
+    En columnas categóricas se busca sobre las categorías y luego se marca por código,
+    sin convertir cada fila a texto.
+    """
+    busqueda = busqueda.strip()
+    if not busqueda:
+        return df
+    
+    mascara = np.zeros(len(df), dtype=bool)
+    for columna in columnas_busqueda:
+        valores = df[columna]
+        if isinstance(valores.dtype, pd.CategoricalDtype):
+            categorias = valores.cat.categories.astype(str)
+            coincide = categorias.str.contains(busqueda, case=False, regex=False)
+            mascara |= valores.isin(valores.cat.categories[coincide]).to_numpy()
+        else:
+            mascara |= valores.astype(str).str.contains(busqueda, case=False, regex=False).to_numpy()
+    return df[mascara]
+
+def pagina_tabla(df: pd.DataFrame, orden: str, ascendente: bool, pagina: int, filas: int) -> pd.DataFrame:
+    """Ordena df por la columna indicada y devuelve solo las filas de la página (base 1)."""
+    inicio = (pagina - 1) * filas
+    # Páginas iniciales de columnas numéricas: basta con seleccionar las primeras filas
+    # sin ordenar todo (nlargest/nsmallest no admiten texto ni category)
+    if (inicio + filas <= len(df) // 2 and pd.api.types.is_numeric_dtype(df[orden])
+            and not df[orden].hasnans):
+        seleccion = df.nsmallest if ascendente else df.nlargest
+        return seleccion(inicio + filas, orden, keep='first').iloc[inicio:]
+    ordenado = df.sort_values(orden, ascending=ascendente, kind='stable', na_position='last')
+    return ordenado.iloc[inicio:inicio + filas]
+
+def render_tabla_paginada(df: pd.DataFrame, columnas: Dict[str, str], clave: str,
+                          columnas_busqueda: List[str], orden_inicial: str = 'total_enviados'):
+    """Tabla con búsqueda, orden y paginación en el servidor.
+    
+    Los controles usan claves propias (`<clave>_buscar`, `_orden`, `_desc`, `_filas`,
+    `_pagina`); al estar dentro de un fragmento, cambiar de página solo vuelve a
+    ejecutar esa sección y st.dataframe serializa únicamente las filas visibles.
+    """
+    nombres = list(columnas)
+    clave_pagina = f"{clave}_pagina"
+    
+    def volver_al_principio():
+        # Una búsqueda u orden nuevos empiezan en la primera página
+        st.session_state[clave_pagina] = 1
+    
+    col_busqueda, col_orden, col_sentido, col_filas = st.columns([3, 2, 1, 1])
+    with col_busqueda:
+        busqueda = st.text_input(
+            "🔍 Buscar",
+            key=f"{clave}_buscar",
+            placeholder=f"Filtrar por {', '.join(columnas[c].lower() for c in columnas_busqueda)}",
+            on_change=volver_al_principio
+        )
+    with col_orden:
+        orden = st.selectbox(
+            "Ordenar por",
+            nombres,
+            index=nombres.index(orden_inicial),
+            format_func=columnas.get,
+            key=f"{clave}_orden",
+            on_change=volver_al_principio
+        )
+    with col_sentido:
+        descendente = st.toggle("Descendente", value=True, key=f"{clave}_desc", on_change=volver_al_principio)
+    with col_filas:
+        filas = st.selectbox(
+            "Filas",
+            FILAS_POR_PAGINA,
+            index=FILAS_POR_PAGINA.index(FILAS_POR_PAGINA_DEFECTO) if FILAS_POR_PAGINA_DEFECTO in FILAS_POR_PAGINA else 1,
+            key=f"{clave}_filas"
+        )
+    
+    filtrado = filtrar_tabla(df, busqueda, columnas_busqueda)
+    total = len(filtrado)
+    paginas = max(1, -(-total // filas))
+    
+    # Si el tamaño de página reduce el número de páginas, la página guardada puede
+    # quedar fuera de rango: se ajusta antes de crear el widget
+    if st.session_state.get(clave_pagina, 1) > paginas:
+        st.session_state[clave_pagina] = paginas
+    
+    ventana = pagina_tabla(filtrado, orden, not descendente, st.session_state.get(clave_pagina, 1), filas)
+    st.dataframe(
+        ventana[nombres].rename(columns=columnas),
+        use_container_width=True,
+        hide_index=True
+    )
+    
+    col_info, col_pagina = st.columns([3, 1])
+    with col_pagina:
+        pagina = st.number_input(
+            f"Página (de {paginas})",
+            min_value=1,
+            max_value=paginas,
+            step=1,
+            key=clave_pagina
+        )
+    with col_info:
+        if total:
+            inicio = (pagina - 1) * filas
+            st.caption(f"Mostrando {inicio + 1:,}–{min(inicio + filas, total):,} de {total:,} filas ({len(df):,} sin filtrar)")
+        else:
+            st.caption(f"Ninguna fila coincide con «{busqueda.strip()}»")
+
+@st.fragment
+def render_client_performance(contexto: ContextoMetricas):
     """Renderiza análisis de rendimiento por cliente."""
     st.markdown('<div class="dashboard-section">', unsafe_allow_html=True)
     st.markdown('<h2 class="section-title">👥 Rendimiento por Cliente</h2>', unsafe_allow_html=True)
     
-    # Agrupar por cliente
-    cliente_metrics = df_metricas.groupby('cliente').agg({
-        'total_enviados': 'sum',
-        'total_fallidos': 'sum',
-        'total_respuestas': 'sum',
-        'total_cualificados': 'sum',
-        'total_agendados': 'sum',
-        'limites_alcanzados': 'sum'
-    }).reset_index()
-    
-    # Calcular métricas derivadas
-    cliente_metrics['tasa_entrega'] = ((cliente_metrics['total_enviados'] - cliente_metrics['total_fallidos']) / cliente_metrics['total_enviados'] * 100).round(2)
-    cliente_metrics['tasa_respuesta'] = (cliente_metrics['total_respuestas'] / cliente_metrics['total_enviados'] * 100).round(2)
-    cliente_metrics['tasa_conversion'] = (cliente_metrics['total_agendados'] / cliente_metrics['total_enviados'] * 100).round(2)
-    
-    # Ordenar por volumen
-    cliente_metrics = cliente_metrics.sort_values('total_enviados', ascending=False)
+    # Agregado por cliente del contexto compartido, ya ordenado por volumen
+    cliente_metrics = contexto.por_cliente[['cliente'] + CONTADORES_JERARQUIA + COLUMNAS_TASAS]
     
     # Gráfico de barras comparativo
     col1, col2 = st.columns(2)
     
+    # Solo las columnas que se dibujan forman parte de la huella de cada figura
     with col1:
-        fig_volumen = px.bar(
-            cliente_metrics,
-            x='cliente',
-            y='total_enviados',
-            title="📊 Volumen de Outbound por Cliente",
-            labels={'total_enviados': 'Contactos Alcanzados', 'cliente': 'Cliente'},
-            color='total_enviados',
-            color_continuous_scale='Blues'
-        )
-        fig_volumen.update_layout(
-            height=400,
-            showlegend=False,
-            title_font_size=16,
-            title_x=0.5
+        fig_volumen = figura_cacheada(
+            figura_barras_clientes,
+            cliente_metrics[['cliente', 'total_enviados']],
+            'total_enviados',
+            "📊 Volumen de Outbound por Cliente",
+            'Contactos Alcanzados',
+            'Blues'
         )
         st.plotly_chart(fig_volumen, use_container_width=True)
     
     with col2:
-        fig_conversion = px.bar(
-            cliente_metrics,
-            x='cliente',
-            y='tasa_conversion',
-            title="💰 Tasa de Conversión por Cliente",
-            labels={'tasa_conversion': 'Tasa de Conversión (%)', 'cliente': 'Cliente'},
-            color='tasa_conversion',
-            color_continuous_scale='Greens'
-        )
-        fig_conversion.update_layout(
-            height=400,
-            showlegend=False,
-            title_font_size=16,
-            title_x=0.5
+        fig_conversion = figura_cacheada(
+            figura_barras_clientes,
+            cliente_metrics[['cliente', 'tasa_conversion']],
+            'tasa_conversion',
+            "💰 Tasa de Conversión por Cliente",
+            'Tasa de Conversión (%)',
+            'Greens'
         )
         st.plotly_chart(fig_conversion, use_container_width=True)
     
     # Tabla detallada
     st.markdown("### 📋 Tabla Comparativa Detallada")
-    
-    # Formatear tabla para mostrar
-    tabla_display = cliente_metrics.rename(columns={
-        'cliente': 'Cliente',
-        'total_enviados': 'Enviados',
-        'total_fallidos': 'Fallidos',
-        'total_respuestas': 'Respuestas',
-        'total_cualificados': 'Cualificados',
-        'total_agendados': 'Agendados',
-        'tasa_entrega': 'Entrega (%)',
-        'tasa_respuesta': 'Respuesta (%)',
-        'tasa_conversion': 'Conversión (%)'
-    })
-    
-    # Aplicar formato con colores
-    def highlight_performance(val):
-        if isinstance(val, (int, float)):
-            if 'Entrega' in str(val) or 'entrega' in str(val):
-                return 'background-color: #d4edda' if val > 95 else 'background-color: #fff3cd' if val > 90 else 'background-color: #f8d7da'
-            elif 'Respuesta' in str(val) or 'respuesta' in str(val):
-                return 'background-color: #d4edda' if val > 10 else 'background-color: #fff3cd' if val > 5 else 'background-color: #f8d7da'
-            elif 'Conversión' in str(val) or 'conversion' in str(val):
-                return 'background-color: #d4edda' if val > 3 else 'background-color: #fff3cd' if val > 1 else 'background-color: #f8d7da'
-        return ''
-    
-    st.dataframe(
-        tabla_display,
-        use_container_width=True,
-        hide_index=True
-    )
+    render_tabla_paginada(cliente_metrics, COLUMNAS_TABLA_CLIENTES, 'tabla_clientes', ['cliente'])
     
     st.markdown('</div>', unsafe_allow_html=True)
 
-def render_origin_performance(df_metricas):
+def figura_canales(via_metrics: pd.DataFrame):
+    """Tarta del volumen de envíos por tipo de vía."""
+    fig = px.pie(
+        via_metrics,
+        values='total_enviados',
+        names='tipo_via',
+        title="📊 Distribución de Volumen por Canal",
+        color_discrete_sequence=px.colors.qualitative.Set3
+    )
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    fig.update_layout(height=400, title_font_size=16, title_x=0.5)
+    return fig
+
+def figura_top_origenes(top_origenes: pd.DataFrame):
+    """Barras horizontales de tasa de conversión de los orígenes dados."""
+    fig = px.bar(
+        top_origenes,
+        x='tasa_conversion',
+        y='origen',
+        orientation='h',
+        title="🎯 Top 10 Orígenes por Conversión",
+        labels={'tasa_conversion': 'Tasa de Conversión (%)', 'origen': 'Origen'},
+        color='tasa_conversion',
+        color_continuous_scale='Viridis'
+    )
+    fig.update_layout(
+        height=400,
+        title_font_size=16,
+        title_x=0.5,
+        yaxis={'categoryorder': 'total ascending'}
+    )
+    return fig
+
+@st.fragment
+def render_origin_performance(contexto: ContextoMetricas):
     """Renderiza análisis de rendimiento por origen."""
     st.markdown('<div class="dashboard-section">', unsafe_allow_html=True)
     st.markdown('<h2 class="section-title">📍 Rendimiento por Origen</h2>', unsafe_allow_html=True)
     
-    # Agrupar por origen
-    origen_metrics = df_metricas.groupby(['origen', 'tipo_via']).agg({
-        'total_enviados': 'sum',
-        'total_fallidos': 'sum',
-        'total_respuestas': 'sum',
-        'total_cualificados': 'sum',
-        'total_agendados': 'sum',
-        'limites_alcanzados': 'sum'
-    }).reset_index()
-    
-    # Calcular métricas derivadas
-    origen_metrics['tasa_entrega'] = ((origen_metrics['total_enviados'] - origen_metrics['total_fallidos']) / origen_metrics['total_enviados'] * 100).round(2)
-    origen_metrics['tasa_respuesta'] = (origen_metrics['total_respuestas'] / origen_metrics['total_enviados'] * 100).round(2)
-    origen_metrics['tasa_conversion'] = (origen_metrics['total_agendados'] / origen_metrics['total_enviados'] * 100).round(2)
-    
-    # Ordenar por volumen
-    origen_metrics = origen_metrics.sort_values('total_enviados', ascending=False)
+    # Agregado por origen del contexto compartido, ya ordenado por volumen
+    origen_metrics = contexto.por_origen[['origen', 'tipo_via'] + CONTADORES_JERARQUIA + COLUMNAS_TASAS]
     
     # Gráfico de rendimiento por tipo de vía
     col1, col2 = st.columns(2)
     
     with col1:
-        # Agrupar por tipo de vía
-        via_metrics = origen_metrics.groupby('tipo_via').agg({
-            'total_enviados': 'sum',
-            'total_respuestas': 'sum',
-            'total_agendados': 'sum'
-        }).reset_index()
+        via_metrics = contexto.por_tipo_via
         
-        fig_via = px.pie(
-            via_metrics,
-            values='total_enviados',
-            names='tipo_via',
-            title="📊 Distribución de Volumen por Canal",
-            color_discrete_sequence=px.colors.qualitative.Set3
-        )
-        fig_via.update_traces(textposition='inside', textinfo='percent+label')
-        fig_via.update_layout(height=400, title_font_size=16, title_x=0.5)
+        fig_via = figura_cacheada(figura_canales, via_metrics[['tipo_via', 'total_enviados']])
         st.plotly_chart(fig_via, use_container_width=True)
     
     with col2:
         # Top 10 orígenes por conversión
         top_origenes = origen_metrics.head(10)
         
-        fig_top = px.bar(
-            top_origenes,
-            x='tasa_conversion',
-            y='origen',
-            orientation='h',
-            title="🎯 Top 10 Orígenes por Conversión",
-            labels={'tasa_conversion': 'Tasa de Conversión (%)', 'origen': 'Origen'},
-            color='tasa_conversion',
-            color_continuous_scale='Viridis'
-        )
-        fig_top.update_layout(
-            height=400,
-            title_font_size=16,
-            title_x=0.5,
-            yaxis={'categoryorder': 'total ascending'}
-        )
+        fig_top = figura_cacheada(figura_top_origenes, top_origenes[['origen', 'tasa_conversion']])
         st.plotly_chart(fig_top, use_container_width=True)
     
-    # Tabla detallada de orígenes
+    # Tabla detallada de orígenes: todos los orígenes, paginados
     st.markdown("### 📋 Análisis Detallado por Origen")
-    
-    # Mostrar solo top 20 para mejor visualización
-    top_20_origenes = origen_metrics.head(20)
-    
-    tabla_origenes = top_20_origenes.rename(columns={
-        'origen': 'Origen',
-        'tipo_via': 'Canal',
-        'total_enviados': 'Enviados',
-        'total_respuestas': 'Respuestas',
-        'total_agendados': 'Agendados',
-        'tasa_entrega': 'Entrega (%)',
-        'tasa_respuesta': 'Respuesta (%)',
-        'tasa_conversion': 'Conversión (%)',
-        'limites_alcanzados': 'Límites'
-    })
-    
-    st.dataframe(
-        tabla_origenes,
-        use_container_width=True,
-        hide_index=True
-    )
+    render_tabla_paginada(origen_metrics, COLUMNAS_TABLA_ORIGENES, 'tabla_origenes', ['origen', 'tipo_via'])
     
     st.markdown('</div>', unsafe_allow_html=True)
 
-def render_campaign_funnel(df_metricas):
-    """Renderiza análisis de embudo de conversión."""
-    st.markdown('<div class="dashboard-section">', unsafe_allow_html=True)
-    st.markdown('<h2 class="section-title">🎯 Embudo de Conversión</h2>', unsafe_allow_html=True)
-    
-    # Calcular métricas del embudo
-    total_enviados = df_metricas['total_enviados'].sum()
-    total_entregados = total_enviados - df_metricas['total_fallidos'].sum()
-    total_respuestas = df_metricas['total_respuestas'].sum()
-    total_cualificados = df_metricas['total_cualificados'].sum()
-    total_agendados = df_metricas['total_agendados'].sum()
-    
-    # Crear gráfico de embudo
-    fig_funnel = go.Figure(go.Funnel(
+def figura_embudo(valores: Tuple[int, int, int, int, int]):
+    """Embudo global enviados -> entregados -> respuestas -> cualificados -> agendados."""
+    fig = go.Figure(go.Funnel(
         y=["📤 Contactos Enviados", "✅ Contactos Entregados", "💬 Respuestas", "🎯 Cualificados", "🗓️ Agendados"],
-        x=[total_enviados, total_entregados, total_respuestas, total_cualificados, total_agendados],
+        x=list(valores),
         textinfo="value+percent initial+percent previous",
         marker=dict(
             color=["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd"],
@@ -1720,13 +2096,33 @@ def render_campaign_funnel(df_metricas):
         connector={"line": {"color": "royalblue", "dash": "solid", "width": 3}}
     ))
     
-    fig_funnel.update_layout(
+    fig.update_layout(
         title="📊 Embudo de Conversión - Vista Global",
         title_font_size=18,
         title_x=0.5,
         height=500,
         font=dict(size=12)
     )
+    return fig
+
+@st.fragment
+def render_campaign_funnel(contexto: ContextoMetricas):
+    """Renderiza análisis de embudo de conversión."""
+    st.markdown('<div class="dashboard-section">', unsafe_allow_html=True)
+    st.markdown('<h2 class="section-title">🎯 Embudo de Conversión</h2>', unsafe_allow_html=True)
+    
+    # Métricas del embudo del contexto compartido
+    totales = contexto.totales
+    total_enviados = totales['total_enviados']
+    total_entregados = totales['total_entregados']
+    total_respuestas = totales['total_respuestas']
+    total_cualificados = totales['total_cualificados']
+    total_agendados = totales['total_agendados']
+    
+    # Crear gráfico de embudo
+    fig_funnel = figura_cacheada(figura_embudo, (
+        total_enviados, total_entregados, total_respuestas, total_cualificados, total_agendados
+    ))
     
     st.plotly_chart(fig_funnel, use_container_width=True)
     
@@ -1759,90 +2155,76 @@ def render_campaign_funnel(df_metricas):
     
     st.markdown('</div>', unsafe_allow_html=True)
 
-def render_temporal_analysis(df_envios, df_respuestas):
-    """Renderiza análisis temporal de las campañas."""
-    st.markdown('<div class="dashboard-section">', unsafe_allow_html=True)
-    st.markdown('<h2 class="section-title">📅 Análisis Temporal</h2>', unsafe_allow_html=True)
-    
-    if df_envios.empty and df_respuestas.empty:
-        st.warning("⚠️ No hay datos temporales disponibles para el período seleccionado")
-        st.markdown('</div>', unsafe_allow_html=True)
-        return
-    
-    # Preparar datos diarios
-    daily_envios = df_envios.groupby('fecha').agg({
-        'enviados': 'sum',
-        'fallidos': 'sum'
-    }).reset_index() if not df_envios.empty else pd.DataFrame()
-    
-    daily_respuestas = df_respuestas.groupby('fecha').agg({
-        'total_respuestas': 'sum',
-        'cualificados': 'sum',
-        'agendados': 'sum'
-    }).reset_index() if not df_respuestas.empty else pd.DataFrame()
+def figura_temporal(df_serie: pd.DataFrame, periodo: str, periodo_plural: str):
+    """Envíos/fallidos y respuestas/agendados por período, en dos paneles."""
+    # Series largas: como mucho MAX_PUNTOS_SERIE puntos por trazo antes de construir la figura
+    serie = {
+        columna: reducir_serie(df_serie, columna)
+        for columna in ['enviados', 'fallidos', 'total_respuestas', 'agendados']
+    }
+    puntos = min(len(df_serie), MAX_PUNTOS_SERIE)
+    modo = 'lines+markers' if puntos <= MAX_PUNTOS_CON_MARCADORES else 'lines'
     
     # Crear gráfico temporal combinado
-    fig_temporal = make_subplots(
+    fig = make_subplots(
         rows=2, cols=1,
-        subplot_titles=('📤 Actividad de Outbound Diaria', '📥 Respuestas y Conversiones Diarias'),
+        subplot_titles=(f'📤 Actividad de Outbound {periodo}', f'📥 Respuestas y Conversiones {periodo_plural}'),
         vertical_spacing=0.12,
         specs=[[{"secondary_y": True}], [{"secondary_y": True}]]
     )
     
     # Gráfico de envíos
-    if not daily_envios.empty:
-        fig_temporal.add_trace(
-            go.Scatter(
-                x=daily_envios['fecha'],
-                y=daily_envios['enviados'],
-                mode='lines+markers',
-                name='📤 Enviados',
-                line=dict(color='#1f77b4', width=3),
-                marker=dict(size=8),
-                fill='tonexty'
-            ),
-            row=1, col=1
-        )
-        
-        fig_temporal.add_trace(
-            go.Scatter(
-                x=daily_envios['fecha'],
-                y=daily_envios['fallidos'],
-                mode='lines+markers',
-                name='❌ Fallidos',
-                line=dict(color='#d62728', width=3),
-                marker=dict(size=8)
-            ),
-            row=1, col=1
-        )
+    fig.add_trace(
+        go.Scatter(
+            x=serie['enviados'][0],
+            y=serie['enviados'][1],
+            mode=modo,
+            name='📤 Enviados',
+            line=dict(color='#1f77b4', width=3),
+            marker=dict(size=8),
+            fill='tonexty'
+        ),
+        row=1, col=1
+    )
+    
+    fig.add_trace(
+        go.Scatter(
+            x=serie['fallidos'][0],
+            y=serie['fallidos'][1],
+            mode=modo,
+            name='❌ Fallidos',
+            line=dict(color='#d62728', width=3),
+            marker=dict(size=8)
+        ),
+        row=1, col=1
+    )
     
     # Gráfico de respuestas
-    if not daily_respuestas.empty:
-        fig_temporal.add_trace(
-            go.Scatter(
-                x=daily_respuestas['fecha'],
-                y=daily_respuestas['total_respuestas'],
-                mode='lines+markers',
-                name='💬 Respuestas',
-                line=dict(color='#2ca02c', width=3),
-                marker=dict(size=8)
-            ),
-            row=2, col=1
-        )
-        
-        fig_temporal.add_trace(
-            go.Scatter(
-                x=daily_respuestas['fecha'],
-                y=daily_respuestas['agendados'],
-                mode='lines+markers',
-                name='🗓️ Agendados',
-                line=dict(color='#ff7f0e', width=3),
-                marker=dict(size=8)
-            ),
-            row=2, col=1
-        )
+    fig.add_trace(
+        go.Scatter(
+            x=serie['total_respuestas'][0],
+            y=serie['total_respuestas'][1],
+            mode=modo,
+            name='💬 Respuestas',
+            line=dict(color='#2ca02c', width=3),
+            marker=dict(size=8)
+        ),
+        row=2, col=1
+    )
+    
+    fig.add_trace(
+        go.Scatter(
+            x=serie['agendados'][0],
+            y=serie['agendados'][1],
+            mode=modo,
+            name='🗓️ Agendados',
+            line=dict(color='#ff7f0e', width=3),
+            marker=dict(size=8)
+        ),
+        row=2, col=1
+    )
     
-    fig_temporal.update_layout(
+    fig.update_layout(
         height=700,
         title_font_size=16,
         showlegend=True,
@@ -1854,26 +2236,64 @@ def render_temporal_analysis(df_envios, df_respuestas):
             x=1
         )
     )
+    return fig
+
+@st.fragment
+def render_temporal_analysis(serie_envios: pd.DataFrame, serie_respuestas: pd.DataFrame, fecha_inicio, fecha_fin):
+    """Renderiza análisis temporal de las campañas a partir de las series diarias ya cargadas."""
+    st.markdown('<div class="dashboard-section">', unsafe_allow_html=True)
+    st.markdown('<h2 class="section-title">📅 Análisis Temporal</h2>', unsafe_allow_html=True)
+    
+    # Agrupación de la serie: por defecto según la longitud del período
+    opciones = list(GRANULARIDADES_SERIE)
+    granularidad = st.radio(
+        "Agrupar por",
+        opciones,
+        index=opciones.index(granularidad_automatica(fecha_inicio, fecha_fin)),
+        format_func={'dia': 'Día', 'semana': 'Semana', 'mes': 'Mes'}.get,
+        horizontal=True,
+        key="granularidad_temporal"
+    )
+    periodo, periodo_plural = {
+        'dia': ('Diaria', 'Diarias'),
+        'semana': ('Semanal', 'Semanales'),
+        'mes': ('Mensual', 'Mensuales')
+    }[granularidad]
+    
+    # Una fila por período, agrupando en memoria las series diarias
+    df_serie = construir_serie_temporal(serie_envios, serie_respuestas, granularidad)
+    
+    if df_serie.empty:
+        st.warning("⚠️ No hay datos temporales disponibles para el período seleccionado")
+        st.markdown('</div>', unsafe_allow_html=True)
+        return
+    
+    if len(df_serie) > MAX_PUNTOS_SERIE:
+        st.caption(f"ℹ️ {len(df_serie):,} períodos reducidos a {MAX_PUNTOS_SERIE} puntos por serie conservando picos y valles.")
+    
+    # Construcción (incluida la reducción LTTB) solo cuando cambian la serie o el período
+    fig_temporal = figura_cacheada(figura_temporal, df_serie, periodo, periodo_plural)
     
     st.plotly_chart(fig_temporal, use_container_width=True)
     
     st.markdown('</div>', unsafe_allow_html=True)
 
-def render_alerts_and_insights(df_metricas):
+@st.fragment
+def render_alerts_and_insights(contexto: ContextoMetricas):
     """Renderiza alertas y insights automáticos."""
     st.markdown('<div class="dashboard-section">', unsafe_allow_html=True)
     st.markdown('<h2 class="section-title">🚨 Alertas e Insights</h2>', unsafe_allow_html=True)
     
     alerts = []
     insights = []
+    df_metricas = contexto.df_metricas
     
     # Análisis de rendimiento
-    total_enviados = df_metricas['total_enviados'].sum()
-    total_respuestas = df_metricas['total_respuestas'].sum()
-    limites_alcanzados = df_metricas['limites_alcanzados'].sum()
+    total_enviados = contexto.totales['total_enviados']
+    limites_alcanzados = contexto.totales['limites_alcanzados']
     
     if total_enviados > 0:
-        tasa_respuesta_global = (total_respuestas / total_enviados * 100)
+        tasa_respuesta_global = contexto.totales['tasa_respuesta']
         
         # Alertas por tasa de respuesta
         if tasa_respuesta_global < 3:
@@ -1909,10 +2329,9 @@ def render_alerts_and_insights(df_metricas):
     
     # Análisis de clientes
     if not df_metricas.empty and len(df_metricas) > 0:
-        cliente_performance = df_metricas.groupby('cliente').agg({
-            'tasa_conversion': 'mean',
-            'total_enviados': 'sum'
-        }).reset_index()
+        cliente_performance = contexto.por_cliente[['cliente', 'tasa_conversion_media', 'total_enviados']].rename(
+            columns={'tasa_conversion_media': 'tasa_conversion'}
+        )
         
         if not cliente_performance.empty:
             # Filtrar clientes con al menos 20 envíos
@@ -1952,9 +2371,15 @@ def main():
     # Cargar CSS personalizado
     load_professional_css()
     
-    # Verificar conexión a base de datos
-    if not test_connection():
+    # Verificar conexión a base de datos: resultado cacheado y refrescado en segundo plano
+    estado_conexion = obtener_salud_conexion().estado()
+    if not estado_conexion.disponible:
         st.error("❌ No se pudo conectar con la base de datos. Verifica la configuración.")
+        if estado_conexion.error:
+            st.caption(estado_conexion.error)
+        # Antes de parar: el sidebar con el estado y un reintento que comprueba ya
+        render_connection_status(estado_conexion)
+        render_reintento_conexion()
         st.stop()
     
     # Header profesional
@@ -1962,14 +2387,22 @@ def main():
     
     # Sidebar con filtros avanzados
     fecha_inicio, fecha_fin, cliente, origen, funnel = render_advanced_filters()
+    render_connection_status(estado_conexion)
     
     if not fecha_inicio or not fecha_fin:
         st.stop()
     
+    # Combinaciones que el índice de opciones ya sabe vacías no llegan a consultarse
+    filtros = {'cliente': cliente, 'origen': origen, 'funnel': funnel}
+    if not hay_datos_en_indice(obtener_indice_opciones(version_datos()), fecha_inicio, fecha_fin, filtros):
+        st.warning("⚠️ No se encontraron datos para los filtros seleccionados.")
+        st.stop()
+    
     # Obtener datos
     with st.spinner("🔄 Cargando datos del dashboard..."):
-        df_envios, df_respuestas, df_metricas = obtener_datos_dashboard(
-            fecha_inicio, fecha_fin, cliente, origen, funnel
+        version = version_datos(cliente)
+        serie_envios, serie_respuestas, df_metricas = obtener_datos_dashboard(
+            fecha_inicio, fecha_fin, cliente, origen, funnel, version
         )
     
     # Verificar que hay datos
@@ -1977,14 +2410,17 @@ def main():
         st.warning("⚠️ No se encontraron datos para los filtros seleccionados.")
         st.stop()
     
-    # Renderizar secciones del dashboard
-    render_executive_summary(df_metricas)
-    render_hierarchical_view(df_metricas)  # Nueva vista jerárquica
-    render_campaign_funnel(df_metricas)
-    render_client_performance(df_metricas)
-    render_origin_performance(df_metricas)
-    render_temporal_analysis(df_envios, df_respuestas)
-    render_alerts_and_insights(df_metricas)
+    # Renderizar secciones del dashboard. Cada sección es un st.fragment: sus widgets
+    # solo vuelven a ejecutar la propia sección, con los DataFrames de la última carga
+    # Totales y agregados compartidos: se calculan una vez por contenido de df_metricas
+    contexto = obtener_contexto_metricas(df_metricas)
+    render_executive_summary(contexto)
+    render_hierarchical_view(contexto)  # Nueva vista jerárquica
+    render_campaign_funnel(contexto)
+    render_client_performance(contexto)
+    render_origin_performance(contexto)
+    render_temporal_analysis(serie_envios, serie_respuestas, fecha_inicio, fecha_fin)
+    render_alerts_and_insights(contexto)
     
     # Footer profesional
     st.markdown("---")
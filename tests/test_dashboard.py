@@ -0,0 +1,218 @@
+"""
+🧪 Pruebas de los helpers puros del dashboard
+===================================================
+Cubren las funciones sin base de datos ni runtime de Streamlit.
+
+    python -m pytest tests
+"""
+
+import sys
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import streamlit_dashboard as dashboard  # noqa: E402
+from database_connection import tabla_arrow  # noqa: E402
+from partition_cache import DayPartitionCache, tramos_consecutivos  # noqa: E402
+
+
+# --- LTTB ---------------------------------------------------------------------
+
+def test_lttb_conserva_extremos_y_numero_de_puntos():
+    x = np.arange(1000)
+    y = np.sin(x / 20.0)
+    indices = dashboard.indices_lttb(x, y, 50)
+
+    assert len(indices) == 50
+    assert indices[0] == 0 and indices[-1] == 999
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_lttb_un_punto_por_tramo():
+    x = np.arange(500)
+    umbral = 20
+    indices = dashboard.indices_lttb(x, np.random.default_rng(0).random(500), umbral)
+
+    limites = np.linspace(1, 499, umbral - 1).astype(int)
+    for i, indice in enumerate(indices[1:-1]):
+        assert limites[i] <= indice < limites[i + 1]
+
+
+def test_lttb_conserva_picos():
+    y = np.zeros(1000)
+    y[637] = 100
+    assert 637 in dashboard.indices_lttb(np.arange(1000), y, 30)
+
+
+def test_lttb_sin_reduccion_si_caben_todos():
+    assert list(dashboard.indices_lttb(np.arange(10), np.arange(10), 10)) == list(range(10))
+    assert list(dashboard.indices_lttb(np.arange(10), np.arange(10), 2)) == list(range(10))
+
+
+def test_reducir_serie_corta_no_cambia():
+    df = pd.DataFrame({'fecha': pd.date_range('2026-01-01', periods=5), 'enviados': range(5)})
+    x, y = dashboard.reducir_serie(df, 'enviados', max_puntos=10)
+    assert list(y) == list(range(5))
+
+
+
+# --- Métricas -------------------------------------------------------------------
+
+def test_construir_metricas_atribuye_respuestas_una_vez():
+    clave = {'fecha': date(2026, 1, 1), 'cliente': 'acme', 'funnel': 'f1', 'tipo_via': 'email',
+             'identificador_via': 'a@x.com', 'origen': 'email - a@x.com'}
+    envios = pd.DataFrame([
+        {**clave, 'tipo_actividad': 'mensaje', 'enviados': 10, 'fallidos': 1, 'limite_alcanzado': 0},
+        {**clave, 'tipo_actividad': 'conexion', 'enviados': 10, 'fallidos': 0, 'limite_alcanzado': 0},
+    ])
+    respuestas = pd.DataFrame([
+        {**clave, 'total_respuestas': 4, 'cualificados': 2, 'interesados': 1, 'agendados': 1},
+    ])
+    metricas = dashboard.construir_metricas(envios, respuestas).set_index('tipo_actividad')
+
+    # Empate en enviados: la actividad principal es la primera en orden alfabético
+    assert metricas.loc['conexion', 'total_respuestas'] == 4
+    assert metricas.loc['mensaje', 'total_respuestas'] == 0
+    assert metricas['total_enviados'].sum() == 20
+
+
+# --- Serie temporal -------------------------------------------------------------
+
+def test_serie_temporal_por_semana():
+    fechas = pd.date_range('2026-08-01', '2026-08-16')  # sábado a domingo
+    envios = pd.DataFrame({'fecha': fechas, 'enviados': 1, 'fallidos': 0})
+    respuestas = pd.DataFrame({'fecha': fechas, 'total_respuestas': 1, 'cualificados': 0, 'agendados': 0})
+    serie = dashboard.construir_serie_temporal(envios, respuestas, 'semana')
+
+    assert list(serie['fecha']) == list(pd.to_datetime(['2026-07-27', '2026-08-03', '2026-08-10']))
+    assert list(serie['enviados']) == [2, 7, 7]
+
+
+# --- Particiones diarias ------------------------------------------------------
+
+def test_tramos_consecutivos_detecta_huecos():
+    dias = [date(2026, 1, 1), date(2026, 1, 2), date(2026, 1, 5), date(2026, 1, 7), date(2026, 1, 8)]
+    assert tramos_consecutivos(dias) == [
+        (date(2026, 1, 1), date(2026, 1, 2)),
+        (date(2026, 1, 5), date(2026, 1, 5)),
+        (date(2026, 1, 7), date(2026, 1, 8)),
+    ]
+    assert tramos_consecutivos([]) == []
+
+
+def _df_dias(*dias):
+    return pd.DataFrame({'fecha': pd.to_datetime(list(dias)), 'enviados': range(len(dias))})
+
+
+def test_particiones_solo_faltan_dias_nuevos_o_cambiados():
+    cache = DayPartitionCache()
+    versiones = {date(2026, 1, 1): 'a', date(2026, 1, 3): 'b'}
+    cache.guardar('k', date(2026, 1, 1), date(2026, 1, 3), _df_dias('2026-01-01', '2026-01-03'), versiones)
+
+    # El día 2 no tiene datos, pero queda guardado vacío
+    assert cache.dias_pendientes('k', date(2026, 1, 1), date(2026, 1, 4), versiones) == [date(2026, 1, 4)]
+    cambiadas = {**versiones, date(2026, 1, 3): 'c'}
+    assert cache.dias_pendientes('k', date(2026, 1, 1), date(2026, 1, 3), cambiadas) == [date(2026, 1, 3)]
+    assert cache.dias_pendientes('otra', date(2026, 1, 1), date(2026, 1, 2)) == [date(2026, 1, 1), date(2026, 1, 2)]
+
+    leido = cache.leer('k', date(2026, 1, 1), date(2026, 1, 3))
+    assert list(leido['enviados']) == [0, 1]
+
+
+def test_particiones_leer_incompleto_devuelve_none():
+    cache = DayPartitionCache(max_particiones=2)
+    cache.guardar('k', date(2026, 1, 1), date(2026, 1, 3), _df_dias('2026-01-01', '2026-01-02', '2026-01-03'))
+    assert cache.leer('k', date(2026, 1, 1), date(2026, 1, 3)) is None
+    assert cache.leer('k', date(2026, 1, 2), date(2026, 1, 3)) is not None
+
+
+# --- Tablas paginadas -----------------------------------------------------------
+
+def test_filtrar_y_paginar_tabla():
+    df = pd.DataFrame({
+        'origen': pd.Categorical(['Email - A', 'linkedin - b', 'email - c', 'web']),
+        'total_enviados': [5, 40, 30, 1],
+    })
+    filtrado = dashboard.filtrar_tabla(df, ' EMAIL ', ['origen'])
+    assert list(filtrado['origen']) == ['Email - A', 'email - c']
+
+    numeros = pd.DataFrame({'n': np.random.default_rng(1).random(100), 'texto': [f"t{i:03d}" for i in range(100)]})
+    for ascendente in (True, False):
+        esperado = numeros.sort_values('n', ascending=ascendente, kind='stable')
+        assert dashboard.pagina_tabla(numeros, 'n', ascendente, 2, 10).equals(esperado.iloc[10:20])
+    assert list(dashboard.pagina_tabla(numeros, 'texto', False, 1, 2)['texto']) == ['t099', 't098']
+
+
+# --- Arrow -> pandas ------------------------------------------------------------
+
+def test_tabla_arrow_tipos():
+    pa = pytest.importorskip('pyarrow')
+    filas = [
+        (date(2026, 1, 1), 'acme', Decimal(3), Decimal('1.50'), 'x'),
+        (date(2026, 1, 2), None, Decimal(4), None, 'y'),
+    ]
+    tabla = tabla_arrow(['fecha', 'cliente', 'enviados', 'tasa', 'texto'], filas, diccionario=['cliente'])
+
+    assert pa.types.is_date32(tabla.schema.field('fecha').type)
+    assert pa.types.is_dictionary(tabla.schema.field('cliente').type)
+    assert tabla.schema.field('enviados').type == pa.int64()
+    assert pa.types.is_decimal(tabla.schema.field('tasa').type)
+
+    df = tabla.to_pandas()
+    assert isinstance(df['cliente'].dtype, pd.CategoricalDtype)
+    assert df['cliente'].isna().tolist() == [False, True]
+    assert df['enviados'].dtype == np.int64
+    assert df['fecha'].tolist() == [date(2026, 1, 1), date(2026, 1, 2)]
+
+
+def test_tabla_arrow_vacia_conserva_columnas():
+    pytest.importorskip('pyarrow')
+    df = tabla_arrow(['cliente', 'enviados'], [], diccionario=['cliente']).to_pandas()
+    assert list(df.columns) == ['cliente', 'enviados']
+    assert df.empty
+
+
+def test_compresion_ipc_solo_codecs_validos():
+    pytest.importorskip('pyarrow')
+    from result_cache import _compresion_ipc
+
+    assert _compresion_ipc('LZ4') == 'lz4'
+    assert _compresion_ipc('none') is None
+    # gzip existe como códec de pyarrow pero IpcWriteOptions lo rechaza
+    assert _compresion_ipc('gzip') is None
+
+
+# --- Caché de figuras -----------------------------------------------------------
+
+def test_cache_figuras_acotada_por_bytes():
+    go = pytest.importorskip('plotly.graph_objects')
+    from figure_cache import FigureCache, tamano_figura
+
+    def linea(n):
+        return go.Figure(go.Scatter(x=list(range(n)), y=list(range(n))))
+
+    cache = FigureCache(max_bytes=int(tamano_figura(linea(1000)) * 2.5))
+    for n in (1000, 1001, 1002):
+        cache.figura(linea, n)
+
+    assert cache.bytes <= cache.max_bytes
+    cache.figura(linea, 1002)
+    cache.figura(linea, 1000)
+    assert (cache.aciertos, cache.fallos) == (1, 4)
+
+
+# --- Índice de opciones ---------------------------------------------------------
+
+def test_ventana_indice_opciones_compartida_con_la_query():
+    query, params = dashboard.construir_consulta_opciones()
+    desde = dashboard.inicio_indice_opciones()
+
+    assert '%(desde)s' in query and params == {'desde': desde}
+    assert dashboard.indice_cubre_rango(desde)
+    assert not dashboard.indice_cubre_rango(desde - timedelta(days=1))